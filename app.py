@@ -6,18 +6,32 @@ import time
 import datetime
 import logging
 import traceback
+import socket
+import threading
 from pathlib import Path
-from urllib.parse import unquote
-import torch
+from urllib.parse import unquote, quote
 import numpy as np
-from pydub import AudioSegment
 import json
+import hashlib
 from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import whisper
-import google.generativeai as genai
-import opencc  # 在文件開頭添加 OpenCC 的導入
+from jobs import JobQueue, Stage, ThroughputEstimate, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+from audio import load_audio, load_audio_file, PcmFile, probe_audio, ProbeError, SAMPLE_RATE
+from transcriber import TranscriberPool, transcribe_audio, decode_options, DECODE_PROFILES, DEFAULT_DECODE_PROFILE
+from cache import TranscriptCache, hash_audio, HASH_CHUNK_SIZE
+from models import ModelRegistry, AVAILABLE_MODELS, PRECISIONS, PRECISION_FP32
+from backends import create_backends, resolve_backend
+from text_rules import proper_nouns
+from progress import ProgressHub
+from store import JobStore
+from search_index import SearchIndex
+from uploads import UploadManager, UploadError, file_sha256, write_hash
+from batch import BatchScheduler, order_files, BATCH_ORDERS
+from resources import get_converter
+from vocabulary import VocabularyPrompts, prompt_version
+from subtitles import EXPORT_FORMATS, build_record, write_record, read_record, render, segments_path
+from concurrent.futures import ThreadPoolExecutor
 
 # 設置日誌記錄
 logging.basicConfig(
@@ -39,8 +53,45 @@ os.environ['LC_ALL'] = 'zh_TW.UTF-8'
 # 設置常量
 UPLOAD_FOLDER = 'uploads'
 TRANSCRIPTS_FOLDER = 'transcripts'
+CACHE_FOLDER = 'cache'
+CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', '1024')) * 1024 * 1024
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'ogg', 'flac'}
 MAX_CONTENT_LENGTH = 40 * 1024 * 1024  # 40MB
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_MB', '4096')) * 1024 * 1024  # 分塊上傳的單檔上限
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 建議的分塊大小（前端依此切分）
+MAX_AUDIO_SECONDS = float(os.getenv('MAX_AUDIO_SECONDS', '0'))  # 可接受的音頻長度上限（秒，0 為不限制）
+LONG_AUDIO_SECONDS = float(os.getenv('LONG_AUDIO_SECONDS', '0'))  # 超過此長度的任務排在一般任務之後（秒，0 為不區分）
+MEMMAP_AUDIO_SECONDS = float(os.getenv('MEMMAP_AUDIO_SECONDS', '1800'))  # 超過此長度的音頻解碼到磁碟並以 memmap 分段讀取（秒，0 為停用）
+AUDIO_TEMP_FOLDER = os.getenv('AUDIO_TEMP_FOLDER', os.path.join('data', 'tmp'))  # 長錄音解碼後的暫存目錄（應位於磁碟而非 tmpfs）
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '2'))  # 推論（Whisper）階段的工作執行緒數量
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', '1'))  # 解碼階段的工作執行緒數量
+POSTPROCESS_WORKERS = int(os.getenv('POSTPROCESS_WORKERS', '2'))  # 文字改善階段的工作執行緒數量（多為網路等待）
+STAGE_QUEUE_SIZE = int(os.getenv('STAGE_QUEUE_SIZE', '2'))  # 階段之間佇列的容量（限制解碼後音頻佔用的記憶體）
+TRANSCRIBE_PROCESSES = int(os.getenv('TRANSCRIBE_PROCESSES', '1'))  # 平行轉錄行程數（每個行程各載入一份模型）
+DEFAULT_WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'medium')  # 未指定模型時使用（較大的模型準確度較高）
+MAX_LOADED_MODELS = int(os.getenv('WHISPER_MAX_LOADED_MODELS', '2'))  # 同時保留在記憶體中的模型數量
+WHISPER_MEMORY_BUDGET_MB = int(os.getenv('WHISPER_MEMORY_BUDGET_MB', '0')) or None  # 已載入模型的估計記憶體上限
+WHISPER_DECODE_PROFILE = os.getenv('WHISPER_DECODE_PROFILE', DEFAULT_DECODE_PROFILE)  # 未指定時使用的解碼設定檔（fast/balanced/accurate）
+VOCABULARY_PROMPT = os.getenv('VOCABULARY_PROMPT', '1') == '1'  # 以系列詞彙表與專有名詞建立 Whisper 的 initial_prompt
+WHISPER_PRECISION = os.getenv('WHISPER_PRECISION', PRECISION_FP32)  # 模型精度：fp32 或 int8（CPU 動態量化，較快、較省記憶體）
+WHISPER_CACHE_DIR = os.getenv('WHISPER_CACHE_DIR', os.path.join('data', 'models'))  # 量化後模型的快取目錄
+TORCH_THREADS = int(os.getenv('TORCH_THREADS', '0')) or None  # torch 運算子內執行緒數（0 為 CPU 核心數）
+TORCH_INTEROP_THREADS = int(os.getenv('TORCH_INTEROP_THREADS', '0')) or None  # torch 運算子間執行緒數（0 為預設值）
+WHISPER_PREWARM = [name for name in os.getenv('WHISPER_PREWARM', '').split(',') if name]  # 啟動後背景預先載入的模型
+SERVER_PORT = 5000
+SERVER_DEBUG = os.getenv('SERVER_DEBUG', '1') == '1'  # 以除錯模式（含自動重新載入）啟動伺服器
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '4'))  # 同時送往 Gemini 的請求數
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))  # Gemini 每分鐘請求上限
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv('PROGRESS_HEARTBEAT_SECONDS', '15'))  # 進度連線的心跳間隔
+PROGRESS_IDLE_TIMEOUT_SECONDS = float(os.getenv('PROGRESS_IDLE_TIMEOUT_SECONDS', '600'))  # 沒有新進度時關閉連線的秒數
+PROGRESS_TTL_SECONDS = float(os.getenv('PROGRESS_TTL_SECONDS', '600'))  # 任務結束後保留進度的秒數
+POSTPROCESS_BACKEND = os.getenv('POSTPROCESS_BACKEND', 'gemini')  # 預設的文字改善後端（gemini/rules/local_llm）
+LOCAL_LLM_URL = os.getenv('LOCAL_LLM_URL', '')  # 本地 LLM 的 chat completions 網址，例如 http://localhost:11434/v1/chat/completions
+LOCAL_LLM_MODEL = os.getenv('LOCAL_LLM_MODEL', 'qwen2.5:7b')
+TRANSCRIBE_LANGUAGE = 'zh'
+DATABASE_PATH = os.getenv('DATABASE_PATH', os.path.join('data', 'app.db'))  # 任務與轉錄稿資料庫
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', os.path.join('data', 'search.db'))  # 轉錄稿全文檢索索引
+POSTPROCESS_VERSION = '2'  # 修改後處理規則時遞增，讓快取的改善文字失效
 
 app = Flask(__name__, 
     static_folder='frontend/static',  # 設定靜態檔案資料夾
@@ -50,28 +101,98 @@ app = Flask(__name__,
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5500"],
-        "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Range", "X-Content-Range"],
+        "methods": ["GET", "POST", "PATCH", "DELETE", "HEAD", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "Upload-Offset"],
+        "expose_headers": ["Content-Range", "X-Content-Range", "Upload-Offset", "Upload-Length", "Location"],
         "supports_credentials": True
     }
 })
 
-# 初始化 Gemini API
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+# 文字改善後端（Gemini 只在實際使用時才初始化）
+correction_backends = create_backends(
+    gemini_api_key=os.getenv('GOOGLE_API_KEY'),
+    gemini_concurrency=GEMINI_CONCURRENCY,
+    gemini_requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+    local_llm_url=LOCAL_LLM_URL,
+    local_llm_model=LOCAL_LLM_MODEL
+)
+
+# Whisper 模型在第一次使用時才載入，啟動時不再阻塞
+if WHISPER_PRECISION not in PRECISIONS:
+    logger.warning(f"不支援的模型精度 {WHISPER_PRECISION}，改用 {PRECISION_FP32}")
+    WHISPER_PRECISION = PRECISION_FP32
+
+model_registry = ModelRegistry(
+    max_models=MAX_LOADED_MODELS,
+    memory_budget_mb=WHISPER_MEMORY_BUDGET_MB,
+    precision=WHISPER_PRECISION,
+    cache_dir=WHISPER_CACHE_DIR,
+    torch_threads=TORCH_THREADS,
+    interop_threads=TORCH_INTEROP_THREADS
+)
+
+if WHISPER_DECODE_PROFILE not in DECODE_PROFILES:
+    logger.warning(f"不支援的解碼設定檔 {WHISPER_DECODE_PROFILE}，改用 {DEFAULT_DECODE_PROFILE}")
+    WHISPER_DECODE_PROFILE = DEFAULT_DECODE_PROFILE
+
+def model_cache_key(model_name, profile=DEFAULT_DECODE_PROFILE, prompt=''):
+    """快取鍵中的模型名稱：int8、不同解碼設定檔與詞彙提示的轉錄結果各有差異，分開快取"""
+    key = model_name
+    if WHISPER_PRECISION != PRECISION_FP32:
+        key = f'{key}-{WHISPER_PRECISION}'
+    if profile != DEFAULT_DECODE_PROFILE:
+        key = f'{key}-{profile}'
+    if prompt:
+        key = f'{key}-p{prompt_version(prompt)}'
+    return key
+
+# 各系列的詞彙提示（依系列快取，詞彙表或專有名詞詞典修改後重新建立）
+vocabulary_prompts = VocabularyPrompts(proper_nouns)
+
+# 多於一個行程時，音頻片段改由行程池平行轉錄（只保留最近使用模型的行程池）
+transcriber_pools = {}
+transcriber_pools_lock = threading.Lock()
+
+def get_transcriber_pool(model_name):
+    if TRANSCRIBE_PROCESSES <= 1:
+        return None
+    with transcriber_pools_lock:
+        pool = transcriber_pools.get(model_name)
+        if pool is None:
+            for old_pool in transcriber_pools.values():
+                old_pool.close()
+            transcriber_pools.clear()
+            pool = transcriber_pools[model_name] = TranscriberPool(
+                model_name, TRANSCRIBE_PROCESSES, precision=WHISPER_PRECISION, cache_dir=WHISPER_CACHE_DIR
+            )
+        return pool
+
+# 可續傳的分塊上傳（上傳狀態保存在磁碟上，重新啟動後仍可續傳）
+upload_manager = UploadManager(UPLOAD_FOLDER, UPLOAD_MAX_BYTES)
+
+# 以音頻內容為鍵的轉錄結果快取
+transcript_cache = TranscriptCache(CACHE_FOLDER, CACHE_MAX_BYTES)
+
+# 任務進度的發布/訂閱中心（只保存進行中與剛結束的任務）
+progress_hub = ProgressHub(finished_ttl=PROGRESS_TTL_SECONDS)
 
-# 載入 Whisper 模型（使用較大的模型以提高準確度）
-try:
-    logger.info("正在載入 Whisper 模型...")
-    model = whisper.load_model("medium")
-    logger.info("Whisper 模型載入成功")
-except Exception as e:
-    logger.error(f"載入 Whisper 模型失敗: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise
+# 任務、耗時與轉錄稿資訊的持久化儲存
+job_store = JobStore(DATABASE_PATH)
 
-# 儲存轉錄進度的字典
-transcription_progress = {}
+# 轉錄稿全文檢索索引（新轉錄稿寫入後立即加入，啟動時同步既有文件）
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+# 語音識別速度的估計值，用於推估排隊任務的等待時間
+inference_throughput = ThroughputEstimate()
+
+# 任務狀態對應到前端使用的進度狀態
+PROGRESS_STATUS = {
+    JOB_QUEUED: 'queued',
+    JOB_RUNNING: 'processing',
+    JOB_DONE: 'completed',
+    JOB_FAILED: 'error',
+    JOB_CANCELLED: 'cancelled'
+}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -86,40 +207,6 @@ def normalize_filename(filename):
     safe_filename = re.sub(r'\s+', '_', safe_filename.strip())
     return safe_filename
 
-def preprocess_audio(file_path):
-    """預處理音頻文件"""
-    try:
-        logger.info(f"開始預處理音頻文件: {file_path}")
-        
-        # 讀取音頻文件
-        audio = AudioSegment.from_file(file_path)
-        logger.info(f"音頻文件信息: 格式={file_path.split('.')[-1].upper()}, 通道數={audio.channels}, 採樣率={audio.frame_rate}")
-        
-        # 獲取音頻基礎信息
-        sample_rate = audio.frame_rate  # 正確屬性
-        channels = audio.channels       # 正確屬性
-        
-        # 轉換為單聲道
-        if audio.channels > 1:
-            logger.info("轉換為單聲道")
-            audio = audio.set_channels(1)
-        
-        # 設置採樣率為 16kHz（Whisper 模型的標準要求）
-        if audio.frame_rate != 16000:
-            logger.info(f"調整採樣率從 {audio.frame_rate} 到 16000")
-            audio = audio.set_frame_rate(16000)
-        
-        # 導出為臨時 WAV 文件
-        temp_path = file_path + '.temp.wav'
-        audio.export(temp_path, format='wav')
-        logger.info(f"音頻預處理完成，臨時文件保存為: {temp_path}")
-        
-        return temp_path
-    except Exception as e:
-        logger.error(f"音頻預處理失敗: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise
-
 @app.route('/')
 def index():
     return send_from_directory('frontend', 'index.html')
@@ -148,31 +235,516 @@ def api_upload():
         # 確保上傳目錄存在
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         
-        # 保存檔案
+        # 保存檔案，寫入時同步計算雜湊
         file_path = os.path.join(UPLOAD_FOLDER, original_filename)
-        file.save(file_path)
+        digest = hashlib.sha256()
+        with open(file_path, 'wb') as f:
+            for block in iter(lambda: file.stream.read(HASH_CHUNK_SIZE), b''):
+                f.write(block)
+                digest.update(block)
+        write_hash(file_path, digest.hexdigest())
         
         return jsonify({
             'message': '檔案上傳成功',
-            'filename': original_filename
+            'filename': original_filename,
+            'sha256': digest.hexdigest(),
+            'cached': transcript_cache.get_alias(digest.hexdigest()) is not None
         })
     except Exception as e:
         logger.error(f"檔案上傳失敗: {str(e)}")
         return jsonify({'error': '檔案上傳失敗'}), 500
 
+def upload_response(status, code=200):
+    response = jsonify(status)
+    response.status_code = code
+    response.headers['Upload-Offset'] = str(status['offset'])
+    response.headers['Upload-Length'] = str(status['size'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.errorhandler(UploadError)
+def handle_upload_error(e):
+    response = jsonify({'error': str(e), 'offset': e.offset})
+    response.status_code = e.status
+    if e.offset is not None:
+        response.headers['Upload-Offset'] = str(e.offset)
+    return response
+
+@app.route('/api/uploads', methods=['POST'])
+def api_create_upload():
+    """建立分塊上傳，之後以 PATCH 依序送出各分塊"""
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': '不支援的檔案格式'}), 400
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': '檔案大小無效'}), 400
+
+    status = upload_manager.create(normalize_filename(filename), size)
+    status['chunk_size'] = UPLOAD_CHUNK_SIZE
+    response = upload_response(status, 201)
+    response.headers['Location'] = f"/api/uploads/{status['upload_id']}"
+    return response
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'HEAD'])
+def api_upload_status(upload_id):
+    """查詢已接收的位元組數，連線中斷後從此位置續傳"""
+    return upload_response(upload_manager.status(upload_id))
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def api_upload_chunk(upload_id):
+    """送出一個分塊：Upload-Offset 標頭為分塊起始位置，內容為原始位元組"""
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': '缺少 Upload-Offset 標頭'}), 400
+
+    # 直接讀取請求串流寫入磁碟，不經 Werkzeug 緩衝
+    status = upload_manager.append(upload_id, offset, request.stream, request.content_length)
+    if status.get('completed'):
+        status['cached'] = transcript_cache.get_alias(status['sha256']) is not None
+    return upload_response(status)
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def api_cancel_upload(upload_id):
+    upload_manager.cancel(upload_id)
+    return '', 204
+
 @app.route('/api/progress/<task_id>')
 def get_progress(task_id):
+    # 瀏覽器自動重連時會帶上 Last-Event-ID，從斷線處續傳
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    if progress_hub.get(task_id) is None:
+        # 進度已清理或伺服器重新啟動過，改由資料庫回報最終狀態
+        stored_job = job_store.get_job(task_id)
+        if stored_job is None:
+            final_data = {'status': 'error', 'progress': 0, 'message': '找不到此任務'}
+        else:
+            final_data = {
+                'status': PROGRESS_STATUS[stored_job['state']],
+                'progress': 100 if stored_job['state'] == JOB_DONE else 0,
+                'message': stored_job['error'] or ''
+            }
+            if stored_job['state'] == JOB_DONE:
+                final_data['transcript_url'] = f'/api/jobs/{task_id}/transcript'
+                if stored_job['transcript_path'] and os.path.exists(segments_path(stored_job['transcript_path'])):
+                    final_data['export_urls'] = {name: f'/api/jobs/{task_id}/export/{name}' for name in EXPORT_FORMATS}
+        return Response(f"data: {json.dumps(final_data)}\n\n", mimetype='text/event-stream')
+
     def generate():
-        while True:
-            if task_id in transcription_progress:
-                progress_data = transcription_progress[task_id]
-                yield f"data: {json.dumps(progress_data)}\n\n"
-                
-                if progress_data['status'] in ['completed', 'error']:
-                    break
-            time.sleep(0.5)  # 每0.5秒檢查一次進度
-            
-    return Response(generate(), mimetype='text/event-stream')
+        # 等待期間不佔 CPU，只有狀態改變或心跳到期時才送出資料
+        for item in progress_hub.subscribe(
+            task_id,
+            last_event_id=last_event_id,
+            heartbeat=PROGRESS_HEARTBEAT_SECONDS,
+            idle_timeout=PROGRESS_IDLE_TIMEOUT_SECONDS
+        ):
+            if item is None:
+                yield ": heartbeat\n\n"
+                continue
+            event_id, event, data = item
+            # 進度快照使用預設的 message 事件，其他事件帶上名稱
+            event_line = '' if event == 'progress' else f"event: {event}\n"
+            yield f"id: {event_id}\n{event_line}data: {json.dumps(data)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+def inference_parallelism():
+    """實際可同時轉錄的任務數
+
+    同一個模型的推論由模型的鎖串行化，推論階段多出的工作執行緒只是持有解碼後的音頻等待，
+    因此沒有行程池時每個已載入的模型只算一個；使用行程池時各行程平行轉錄同一任務的片段，
+    量測到的每個任務速度已包含行程數的效果，任務之間仍視為依序處理。
+    """
+    if TRANSCRIBE_PROCESSES > 1:
+        return 1
+    return max(1, min(TRANSCRIBE_WORKERS, len(model_registry.loaded())))
+
+def queue_eta(job_id):
+    """排隊任務開始處理前的預估等待秒數（以前面任務的音頻長度與近期的語音識別速度推估，尚無資料時為 None）"""
+    eta = inference_throughput.eta(job_queue.cost_ahead(job_id), inference_parallelism())
+    return round(eta) if eta is not None else None
+
+def publish_queue_positions():
+    """佇列變動後更新仍在排隊的任務的排隊位置與預估等待時間"""
+    for queued_job in job_queue.jobs():
+        position = job_queue.position(queued_job.id)
+        if position:
+            progress_hub.update(queued_job.id, {'position': position, 'eta_seconds': queue_eta(queued_job.id)})
+
+def admit_audio(file_path):
+    """讀取音頻標頭並檢查是否接受轉錄，損壞或過長的文件在解碼前就拒絕
+
+    Returns:
+        tuple: (probe, 錯誤內容, HTTP 狀態碼)；接受時錯誤內容為 None
+    """
+    try:
+        probe = probe_audio(file_path)
+    except ProbeError as e:
+        logger.error(f"無法讀取音頻 {file_path}: {str(e)}")
+        return None, {'error': f'Unreadable audio: {str(e)}'}, 422
+    duration = probe['duration']
+    if MAX_AUDIO_SECONDS and duration and duration > MAX_AUDIO_SECONDS:
+        return probe, {
+            'error': f'Audio too long: {duration:.0f}s exceeds {MAX_AUDIO_SECONDS:.0f}s',
+            'duration': duration,
+            'max_seconds': MAX_AUDIO_SECONDS
+        }, 413
+    return probe, None, 200
+
+def is_long_audio(duration):
+    return bool(LONG_AUDIO_SECONDS and duration and duration > LONG_AUDIO_SECONDS)
+
+def write_transcript(base_name, text):
+    """寫入轉錄稿，檔名重複時依序加上 _1、_2 ...
+
+    已使用的檔名由資料庫查出，再以獨佔模式建立文件，
+    避免覆寫資料庫之外既有的文件。
+
+    Returns:
+        str: 轉錄稿路徑
+    """
+    Path(TRANSCRIPTS_FOLDER).mkdir(parents=True, exist_ok=True)
+    used_paths = job_store.transcript_names(base_name)
+    counter = 0
+    while True:
+        output_filename = f"{base_name}.md" if counter == 0 else f"{base_name}_{counter}.md"
+        output_path = os.path.join(TRANSCRIPTS_FOLDER, output_filename)
+        counter += 1
+        if output_path in used_paths:
+            continue
+        try:
+            with open(output_path, 'x', encoding='utf-8') as f:
+                f.write(text)
+            return output_path
+        except FileExistsError:
+            continue
+
+def decode_audio(job, file_path):
+    """解碼音頻；已知長度超過 MEMMAP_AUDIO_SECONDS 的長錄音解碼到磁碟，避免整段 PCM 留在記憶體中"""
+    if MEMMAP_AUDIO_SECONDS and job.cost and job.cost > MEMMAP_AUDIO_SECONDS:
+        return load_audio_file(file_path, folder=AUDIO_TEMP_FOLDER)
+    return load_audio(file_path)
+
+def decode_stage(job, payload):
+    """流水線第一階段：查詢快取，需要轉錄時解碼音頻
+
+    Args:
+        job (Job): 佇列中的任務
+        payload: 第一階段沒有輸入
+
+    Returns:
+        dict: 交給後續階段的任務內容
+    """
+    task_id = job.id
+    filename = job.filename
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    model_name = job.params.get('model', DEFAULT_WHISPER_MODEL)
+    profile = job.params.get('profile', WHISPER_DECODE_PROFILE)
+    series = job.params.get('series') or vocabulary_prompts.detect_series(filename)
+    initial_prompt = vocabulary_prompts.prompt(series) if VOCABULARY_PROMPT else ''
+    backend = resolve_backend(correction_backends, job.params.get('backend', POSTPROCESS_BACKEND))
+    # 改善後的文字依後處理規則版本、專有名詞詞典內容與後端分開快取
+    postprocess_version = f'{POSTPROCESS_VERSION}:{proper_nouns.version}:{backend.name}'
+
+    logger.info(f"開始處理文件: {filename}（系列: {series or '無'}）")
+    publish_queue_positions()
+    batch_scheduler.job_started(task_id)
+    progress_hub.update(task_id, {
+        'status': 'processing',
+        'progress': 0,
+        'message': '正在初始化...'
+    })
+
+    context = {
+        'file_path': file_path,
+        'model_name': model_name,
+        'profile': profile,
+        'initial_prompt': initial_prompt,
+        'cache_model': model_cache_key(model_name, profile, initial_prompt),
+        'backend': backend,
+        'postprocess_version': postprocess_version,
+        'audio': None,
+        'result': None,
+        'improved_text': None
+    }
+
+    # 先以上傳文件的雜湊查詢快取，重複上傳時連解碼都可以省略
+    audio = None
+    file_hash = file_sha256(file_path)
+    audio_hash = transcript_cache.get_alias(file_hash)
+    if audio_hash is None:
+        # 解碼音頻為 16kHz 單聲道 float32 陣列
+        progress_hub.update(task_id, {
+            'progress': 20,
+            'message': '正在處理音頻文件...'
+        })
+        stage_started = time.perf_counter()
+        audio = decode_audio(job, file_path)
+        job_store.record_timing(task_id, 'decode', time.perf_counter() - stage_started)
+        audio_hash = hash_audio(audio)
+        transcript_cache.put_alias(file_hash, audio_hash)
+        job.raise_if_cancelled()
+    context['audio_hash'] = audio_hash
+    job_store.update_job(task_id, audio_hash=audio_hash)
+    if audio is not None:
+        job_store.update_job(task_id, audio_seconds=len(audio) / SAMPLE_RATE)
+
+    context['improved_text'] = transcript_cache.get_text(audio_hash, context['cache_model'], TRANSCRIBE_LANGUAGE, postprocess_version)
+    if context['improved_text'] is not None:
+        logger.info(f"轉錄快取命中: {filename}")
+        job_store.update_job(task_id, cache_status='hit')
+        progress_hub.update(task_id, {
+            'progress': 90,
+            'cache': 'hit',
+            'message': '已找到快取的轉錄結果'
+        })
+        return context
+
+    context['result'] = transcript_cache.get_segments(audio_hash, context['cache_model'], TRANSCRIBE_LANGUAGE)
+    if context['result'] is not None:
+        logger.info(f"重用快取的 Whisper 結果: {filename}")
+        job_store.update_job(task_id, cache_status='segments')
+        progress_hub.update(task_id, {
+            'progress': 70,
+            'cache': 'segments',
+            'message': '已找到快取的語音識別結果'
+        })
+        return context
+
+    if audio is None:
+        stage_started = time.perf_counter()
+        audio = decode_audio(job, file_path)
+        job_store.record_timing(task_id, 'decode', time.perf_counter() - stage_started)
+        job_store.update_job(task_id, audio_seconds=len(audio) / SAMPLE_RATE)
+    job_store.update_job(task_id, cache_status='miss')
+    progress_hub.update(task_id, {
+        'progress': 30,
+        'cache': 'miss',
+        'message': '音頻處理完成，等待語音識別...'
+    })
+    context['audio'] = audio
+    return context
+
+def inference_stage(job, context):
+    """流水線第二階段：以 Whisper 轉錄（快取命中時直接略過）"""
+    if context['improved_text'] is not None or context['result'] is not None:
+        return context
+
+    task_id = job.id
+    model_name = context['model_name']
+    audio = context.pop('audio')
+    context['audio'] = None
+
+    # 執行轉錄
+    progress_hub.update(task_id, {
+        'progress': 40,
+        'message': '正在進行語音識別...'
+    })
+
+    # 在靜音處切分後分段轉錄（本行程的模型不支援多執行緒同時解碼）
+    profile = context['profile']
+    logger.info(f"開始 Whisper 轉錄（模型: {model_name}，解碼設定檔: {profile}）")
+    logger.info(f"音頻張量形狀: {audio.shape}")
+    segment_converter = get_converter('s2t')
+    decode_started = time.perf_counter()
+
+    def report_chunk(chunk_result, decoded_seconds, total_seconds):
+        """每個片段解碼完成後推送其 segments，並以已解碼秒數更新進度"""
+        elapsed = time.perf_counter() - decode_started
+        # 音頻吞吐量：每秒處理的音頻秒數（即時率的倒數）
+        throughput = decoded_seconds / max(elapsed, 1e-6)
+        fraction = decoded_seconds / total_seconds if total_seconds else 1.0
+        for segment in chunk_result['segments']:
+            progress_hub.publish(task_id, 'segment', {
+                'start': segment['start'],
+                'end': segment['end'],
+                'text': segment_converter.convert(segment['text']),
+                'decoded_seconds': round(decoded_seconds, 1),
+                'total_seconds': round(total_seconds, 1),
+                'throughput': round(throughput, 2)
+            })
+        progress_hub.update(task_id, {
+            'progress': 40 + int(40 * fraction),
+            'decoded_seconds': round(decoded_seconds, 1),
+            'total_seconds': round(total_seconds, 1),
+            'throughput': round(throughput, 2),
+            'message': f'正在進行語音識別...（{decoded_seconds:.0f}/{total_seconds:.0f} 秒，{throughput:.1f} 倍速）'
+        })
+
+    pool = get_transcriber_pool(model_name)
+    loaded = model_registry.get(model_name) if pool is None else None
+    try:
+        result = transcribe_audio(
+            audio,
+            model=loaded.model if loaded else None,
+            model_lock=loaded.lock if loaded else None,
+            pool=pool,
+            cancel_check=job.raise_if_cancelled,
+            on_chunk=report_chunk,
+            language=TRANSCRIBE_LANGUAGE,
+            initial_prompt=context['initial_prompt'] or None,
+            **decode_options(profile)
+        )
+    finally:
+        if isinstance(audio, PcmFile):
+            # 轉錄結束（含失敗或取消）後立即刪除長錄音的暫存文件
+            audio.close()
+    stats = result['decode_stats']
+    logger.info(
+        f"Whisper 轉錄完成（任務 {task_id}，解碼設定檔 {profile}）：解碼 {stats['decodes']} 次，"
+        f"溫度回退重新解碼 {stats['fallbacks']} 次，耗時 {stats['fallback_seconds']:.1f} 秒"
+    )
+    job_store.record_timing(task_id, 'transcribe', time.perf_counter() - decode_started)
+    inference_throughput.observe(len(audio) / SAMPLE_RATE, time.perf_counter() - decode_started)
+    job_store.record_timing(task_id, 'fallback_decode', stats['fallback_seconds'])
+    transcript_cache.put_segments(context['audio_hash'], context['cache_model'], TRANSCRIBE_LANGUAGE, result)
+    context['result'] = result
+    return context
+
+def postprocess_stage(job, context):
+    """流水線第三階段：改善文字品質並保存結果
+
+    Returns:
+        str: 轉錄結果的輸出路徑
+    """
+    task_id = job.id
+    filename = job.filename
+    backend = context['backend']
+    audio_hash = context['audio_hash']
+    improved_text = context['improved_text']
+
+    if improved_text is None:
+        text = context['result'].get('text', '')
+
+        # 確保文本為繁體中文
+        converter = get_converter('s2t')  # 簡體轉繁體（共用的轉換器）
+        text = converter.convert(text)
+
+        # 使用選定的後端改善文字品質
+        progress_hub.update(task_id, {
+            'progress': 80,
+            'message': '正在改善文字品質...'
+        })
+
+        logger.info(f"使用 {backend.name} 後端改善文字品質")
+        stage_started = time.perf_counter()
+        improved_text = backend.improve(text)
+        job_store.record_timing(task_id, 'postprocess', time.perf_counter() - stage_started)
+        job.raise_if_cancelled()
+
+        # 最終確保輸出為繁體中文
+        improved_text = converter.convert(improved_text)
+        transcript_cache.put_text(audio_hash, context['cache_model'], TRANSCRIBE_LANGUAGE, context['postprocess_version'], improved_text)
+
+    # 保存結果
+    progress_hub.update(task_id, {
+        'progress': 90,
+        'message': '正在保存結果...'
+    })
+
+    # 生成输出文件名
+    safe_filename = normalize_filename(filename)
+    base_name = os.path.splitext(safe_filename)[0]
+    output_path = write_transcript(base_name, improved_text)
+    job_store.add_transcript(
+        output_path, task_id, filename, base_name, improved_text,
+        audio_hash=audio_hash, model=context['cache_model'], backend=backend.name
+    )
+    job_store.update_job(task_id, transcript_path=output_path)
+    try:
+        search_index.add(output_path, improved_text)
+    except Exception as e:
+        logger.error(f"更新搜尋索引失敗: {str(e)}")
+
+    # 保留 Whisper 的時間軸：把改善後的文字對回各 segment，存在轉錄稿旁，供匯出字幕
+    export_urls = {}
+    result = context['result']
+    if result is None:
+        result = transcript_cache.get_segments(audio_hash, context['cache_model'], TRANSCRIBE_LANGUAGE)
+    if result and result.get('segments'):
+        try:
+            stage_started = time.perf_counter()
+            record = build_record(result['segments'], improved_text, TRANSCRIBE_LANGUAGE, get_converter('s2t'))
+            write_record(segments_path(output_path), record)
+            job_store.record_timing(task_id, 'align', time.perf_counter() - stage_started)
+            export_urls = {name: f'/api/jobs/{task_id}/export/{name}' for name in EXPORT_FORMATS}
+        except Exception as e:
+            logger.error(f"保存時間軸失敗: {str(e)}")
+
+    # 全文留在磁碟上，前端再依網址取得，進度中心不保存大段文字
+    progress_hub.update(task_id, {
+        'status': 'completed',
+        'progress': 100,
+        'message': '轉錄完成！',
+        'transcript_url': f'/api/jobs/{task_id}/transcript',
+        'export_urls': export_urls
+    })
+    return output_path
+
+def on_job_change(job):
+    """任務加入佇列或狀態改變時寫入資料庫，失敗或取消時通知前端"""
+    job_store.add_job(job)
+    job_store.update_job(
+        job.id,
+        state=job.state,
+        error=job.error,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+    if job.state == JOB_CANCELLED:
+        progress_hub.update(job.id, {
+            'status': 'cancelled',
+            'progress': 0,
+            'message': '任務已取消'
+        })
+    elif job.state == JOB_FAILED:
+        logger.error(f"轉錄過程中發生錯誤: {job.error}")
+        progress_hub.update(job.id, {
+            'status': 'error',
+            'progress': 0,
+            'message': f'發生錯誤：{job.error}'
+        })
+
+# 轉錄任務佇列：解碼、推論、後處理三個階段各有自己的工作執行緒，
+# 同時處理不同任務的不同階段（工作執行緒在第一個任務提交時啟動；結束的任務只保存在資料庫）
+job_queue = JobQueue(
+    stages=[
+        Stage('decode', decode_stage, workers=DECODE_WORKERS),
+        Stage('inference', inference_stage, workers=TRANSCRIBE_WORKERS, queue_size=STAGE_QUEUE_SIZE),
+        Stage('postprocess', postprocess_stage, workers=POSTPROCESS_WORKERS, queue_size=STAGE_QUEUE_SIZE),
+    ],
+    on_change=on_job_change,
+    forget_finished=True
+)
+
+# 批次排程：依序送出任務並彙總批次進度
+batch_scheduler = BatchScheduler(job_queue, progress_hub)
+
+def resume_unfinished_jobs():
+    """重新啟動後把上次未完成的任務重新加入佇列（執行到一半的任務從頭開始，已有的快取仍可重用）"""
+    for stored_job in job_store.unfinished_jobs((JOB_QUEUED, JOB_RUNNING)):
+        job = job_queue.submit(
+            stored_job['filename'],
+            stored_job['params'],
+            job_id=stored_job['id'],
+            created_at=stored_job['created_at'],
+            cost=stored_job['audio_seconds'],
+            defer=is_long_audio(stored_job['audio_seconds'])
+        )
+        progress_hub.create(job.id, {
+            'status': 'queued',
+            'progress': 0,
+            'position': job_queue.position(job.id),
+            'message': '伺服器重新啟動，任務已重新加入佇列...'
+        })
+        logger.info(f"已恢復未完成的任務: {job.id} ({job.filename})")
 
 @app.route('/api/transcribe', methods=['POST'])
 def api_transcribe():
@@ -183,340 +755,254 @@ def api_transcribe():
         
         filename = data['filename']
         file_path = os.path.join(UPLOAD_FOLDER, filename)
-        task_id = os.path.splitext(filename)[0]
+        model_name = data.get('model') or DEFAULT_WHISPER_MODEL
+        backend_name = data.get('backend') or POSTPROCESS_BACKEND
+        profile = data.get('profile') or WHISPER_DECODE_PROFILE
         
         if not os.path.exists(file_path):
             logger.error(f"找不到文件: {file_path}")
             return jsonify({'error': 'File not found'}), 404
+
+        if model_name not in AVAILABLE_MODELS:
+            return jsonify({'error': f'Unsupported model: {model_name}'}), 400
+
+        if backend_name not in correction_backends:
+            return jsonify({'error': f'Unsupported backend: {backend_name}'}), 400
+
+        if profile not in DECODE_PROFILES:
+            return jsonify({'error': f'Unsupported profile: {profile}'}), 400
+
+        probe, error, status = admit_audio(file_path)
+        if error is not None:
+            return jsonify(error), status
         
-        logger.info(f"開始處理文件: {filename}")
-        transcription_progress[task_id] = {
-            'status': 'processing',
+        params = {'model': model_name, 'backend': backend_name, 'profile': profile}
+        if data.get('series'):
+            # 指定系列時使用該系列的詞彙提示，否則依檔名判斷
+            params['series'] = str(data['series'])
+        duration = probe['duration']
+        job = job_queue.submit(filename, params, cost=duration, defer=is_long_audio(duration))
+        job_store.update_job(job.id, probe=probe, audio_seconds=duration)
+        eta = queue_eta(job.id)
+        progress_hub.create(job.id, {
+            'status': 'queued',
             'progress': 0,
-            'message': '正在初始化...'
-        }
+            'position': job_queue.position(job.id),
+            'eta_seconds': eta,
+            'message': '已加入佇列，等待處理...'
+        })
         
-        # 預處理音頻
-        try:
-            logger.info("開始音頻預處理")
-            transcription_progress[task_id].update({
-                'progress': 20,
-                'message': '正在處理音頻文件...'
-            })
-            
-            processed_file = preprocess_audio(file_path)
-            logger.info("音頻預處理完成")
-            
-            # 執行轉錄
-            transcription_progress[task_id].update({
-                'progress': 40,
-                'message': '正在進行語音識別...'
-            })
-            
-            # 使用 Whisper 進行轉錄
-            logger.info("開始 Whisper 轉錄")
-            audio_tensor = whisper.load_audio(processed_file)
-            logger.info(f"音頻張量形狀: {audio_tensor.shape}")
-            result = model.transcribe(audio_tensor, language="zh")
-            logger.info("Whisper 轉錄完成")
-            
-            text = result.get('text', '')
-            
-            # 確保文本為繁體中文
-            converter = opencc.OpenCC('s2t')  # 簡體轉繁體
-            text = converter.convert(text)
-            
-            # 使用 Gemini 改善文字品質
-            transcription_progress[task_id].update({
-                'progress': 80,
-                'message': '正在改善文字品質...'
-            })
-            
-            improved_text = improve_text_quality(text)
-            
-            # 保存結果
-            transcription_progress[task_id].update({
-                'progress': 90,
-                'message': '正在保存結果...'
-            })
-            
-            # 最終確保輸出為繁體中文
-            converter = opencc.OpenCC('s2t')  # 簡體轉繁體
-            improved_text = converter.convert(improved_text)
-            
-            # 生成输出文件名
-            safe_filename = normalize_filename(filename)
-            base_name = os.path.splitext(safe_filename)[0]
-            output_filename = f"{base_name}.md"
-            output_path = os.path.join(TRANSCRIPTS_FOLDER, output_filename)
-
-            # 處理重複文件名
-            counter = 1
-            while os.path.exists(output_path):
-                output_filename = f"{base_name}_{counter}.md"
-                output_path = os.path.join(TRANSCRIPTS_FOLDER, output_filename)
-                counter += 1
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(improved_text)
-            
-            # 清理臨時文件
-            if os.path.exists(processed_file):
-                os.remove(processed_file)
-            
-            transcription_progress[task_id].update({
-                'status': 'completed',
-                'progress': 100,
-                'message': '轉錄完成！',
-                'text': improved_text
-            })
-            
-            return jsonify({'task_id': task_id})
-            
-        except Exception as e:
-            logger.error(f"轉錄過程中發生錯誤: {str(e)}")
-            logger.error(traceback.format_exc())
-            transcription_progress[task_id].update({
-                'status': 'error',
-                'progress': 0,
-                'message': f'發生錯誤：{str(e)}'
-            })
-            return jsonify({'error': str(e)}), 500
+        return jsonify({
+            'task_id': job.id,
+            'status': job.state,
+            'position': job_queue.position(job.id),
+            'duration': duration,
+            'eta_seconds': eta
+        }), 202
             
     except Exception as e:
         logger.error(f"API 處理過程中發生錯誤: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-# 定義專有名詞對照表
-PROPER_NOUNS = {
-    "觀西花園": "關係花園",
-    "關西花園": "關係花園",
-    "慧青": "慧卿",
-    "關西聊天室": "關係聊天室",
-    "心靈補夢網": "心靈捕夢網",
-    "從關西切入": "從關係切入"
-}
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """以一個批次排程多個已上傳的檔案，進度可由 /api/progress/<batch_id> 取得"""
+    data = request.get_json() or {}
+    files = data.get('files') or []
+    order = data.get('order') or 'shortest'
+    model_name = data.get('model') or DEFAULT_WHISPER_MODEL
+    backend_name = data.get('backend') or POSTPROCESS_BACKEND
+    profile = data.get('profile') or WHISPER_DECODE_PROFILE
 
-# 定義上下文相關詞彙替換（基於上下文的複雜替換）
-CONTEXT_SPECIFIC_TERMS = [
-    {
-        "pattern": "關照",  # 比對模式
-        "replacement": "觀照",  # 替換詞
-        "context_before": ["心靈", "靈性", "自己", "內在", "意識"],  # 前文關鍵詞
-        "context_distance": 20,  # 關鍵詞與目標詞的最大距離（字元數）
-        "exceptions": ["關照家人", "關照朋友", "關照他人"]  # 例外情況，這些短語不替換
-    }
-]
+    if not files or not isinstance(files, list):
+        return jsonify({'error': 'No files provided'}), 400
+    if order not in BATCH_ORDERS:
+        return jsonify({'error': f'Unsupported order: {order}'}), 400
+    if model_name not in AVAILABLE_MODELS:
+        return jsonify({'error': f'Unsupported model: {model_name}'}), 400
+    if backend_name not in correction_backends:
+        return jsonify({'error': f'Unsupported backend: {backend_name}'}), 400
+    if profile not in DECODE_PROFILES:
+        return jsonify({'error': f'Unsupported profile: {profile}'}), 400
 
-def improve_text_quality(text, max_retries=3, chunk_size=1500):
-    """使用 Gemini 改善文字品質
-    
-    Args:
-        text (str): 要改善的文字
-        max_retries (int): API 調用失敗時的最大重試次數
-        chunk_size (int): 每個文本塊的最大字符數
-    
-    Returns:
-        str: 改善後的文字
-    """
-    def split_text(text, chunk_size):
-        """將文本分割成較小的塊，確保不會切斷句子"""
-        # 首先按句號分割
-        sentences = text.split('。')
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for sentence in sentences:
-            # 確保句子結尾有句號
-            sentence = sentence.strip() + '。' if sentence.strip() else ''
-            sentence_size = len(sentence)
-            
-            if current_size + sentence_size > chunk_size and current_chunk:
-                # 當前塊已滿，保存並開始新的塊
-                chunks.append(''.join(current_chunk))
-                current_chunk = [sentence]
-                current_size = sentence_size
-            else:
-                current_chunk.append(sentence)
-                current_size += sentence_size
-        
-        # 添加最後一個塊
-        if current_chunk:
-            chunks.append(''.join(current_chunk))
-            
-        return chunks
+    paths = {filename: os.path.join(UPLOAD_FOLDER, filename) for filename in files}
+    missing = [filename for filename, path in paths.items() if not os.path.exists(path)]
+    if missing:
+        return jsonify({'error': 'File not found', 'files': missing}), 404
 
+    # 只讀取容器標頭取得長度，不解碼；任何一個文件無法接受時整個批次都不排程
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        admissions = dict(zip(paths, executor.map(admit_audio, paths.values())))
+    for filename, (probe, error, status) in admissions.items():
+        if error is not None:
+            return jsonify(dict(error, file=filename)), status
+    probes = {filename: probe for filename, (probe, _, _) in admissions.items()}
+    durations = {filename: probe['duration'] for filename, probe in probes.items()}
+
+    ordered = order_files(list(paths), durations, order, data.get('priorities'))
+    batch = batch_scheduler.submit(
+        [
+            {
+                'filename': filename,
+                'path': paths[filename],
+                'duration': durations[filename],
+                'defer': is_long_audio(durations[filename])
+            }
+            for filename in ordered
+        ],
+        dict({'model': model_name, 'backend': backend_name, 'profile': profile},
+             **({'series': str(data['series'])} if data.get('series') else {}))
+    )
+    for item in batch.items:
+        job_store.update_job(item['job_id'], probe=probes[item['filename']], audio_seconds=durations[item['filename']])
+    return jsonify({
+        'batch_id': batch.id,
+        'status': 'queued',
+        'tasks': [
+            {'filename': item['filename'], 'task_id': item['job_id'], 'duration': item['duration']}
+            for item in batch.items
+        ]
+    }), 202
+
+@app.route('/api/batch/<batch_id>')
+def api_get_batch(batch_id):
+    summary = batch_scheduler.get(batch_id)
+    if summary is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(summary)
+
+@app.route('/api/metrics')
+def api_metrics():
+    """流水線各階段的佇列深度與使用率"""
+    return jsonify({'pipeline': job_queue.metrics()})
+
+@app.route('/api/models')
+def api_models():
+    return jsonify({
+        'available': list(AVAILABLE_MODELS),
+        'default': DEFAULT_WHISPER_MODEL,
+        'precision': WHISPER_PRECISION,
+        'profiles': {name: dict(options, temperature=list(options['temperature'])) for name, options in DECODE_PROFILES.items()},
+        'default_profile': WHISPER_DECODE_PROFILE,
+        'loaded': model_registry.loaded()
+    })
+
+@app.route('/api/jobs')
+def api_list_jobs():
     try:
-        logger.info("開始改善文字品質")
-        
-        # 初始化繁簡轉換器
-        converter = opencc.OpenCC('s2t')  # 簡體轉繁體
-        
-        # 如果文本為空，直接返回
-        if not text.strip():
-            logger.warning("收到空文本，直接返回")
-            return text
-            
-        # 分割文本為較小的塊
-        text_chunks = split_text(text, chunk_size)
-        improved_chunks = []
-        
-        # 配置模型
-        model = genai.GenerativeModel('gemini-pro')
-        
-        # 處理每個文本塊
-        for i, chunk in enumerate(text_chunks):
-            logger.info(f"處理第 {i+1}/{len(text_chunks)} 個文本塊")
-            
-            for attempt in range(max_retries):
-                try:
-                    # 設置提示詞
-                    prompt = f"""
-                    作為一個文字校對專家，請幫我修正以下繁體中文文本。你需要：
-
-                    1. 基本要求：
-                       - 修正所有錯別字
-                       - 改善文字的通順度
-                       - 保持原意不變
-                       - 維持繁體中文輸出
-                       
-                    2. 特別注意：
-                       - "觀西花園" 應該是 "關係花園"
-                       - "關西花園" 應該是 "關係花園"
-                       - "慧青" 應該是 "慧卿"
-                       - "關西聊天室" 應該是 "關係聊天室"
-                       - "心靈補夢網" 應該是 "心靈捕夢網"
-                       - 這些是特定名詞，請務必正確使用
-
-                    3. 格式要求：
-                       - 根據語意適當添加標點符號（逗號、句號、分號等）
-                       - 按照內容邏輯分段，每段表達一個完整的思想
-                       - 使用適當的段落間距來提高可讀性
-                       - 重要觀點可以使用破折號來強調
-                       - 對話或引述內容使用引號標示
-
-                    以下是需要校正的文本：
-                    {chunk}
-
-                    請注意：
-                    1. 保持原文的語氣和風格
-                    2. 分段時要考慮上下文的連貫性
-                    3. 標點符號的使用要自然，不要過度
-                    4. 確保所有專有名詞的正確性
-                    5. 段落長度要適中，避免過長或過短
-                    """
-                    
-                    # 生成回應
-                    response = model.generate_content(prompt)
-                    
-                    if response.text:
-                        # 確保輸出為繁體中文
-                        response_text = converter.convert(response.text)
-                        
-                        # 檢查並修正特定名詞
-                        for wrong, correct in PROPER_NOUNS.items():
-                            response_text = response_text.replace(wrong, correct)
-                        
-                        # 處理上下文相關詞彙替換
-                        for term in CONTEXT_SPECIFIC_TERMS:
-                            pattern = term['pattern']
-                            replacement = term['replacement']
-                            context_before = term['context_before']
-                            context_distance = term['context_distance']
-                            exceptions = term['exceptions']
-                            
-                            # 搜尋模式
-                            for match in re.finditer(pattern, response_text):
-                                start = match.start()
-                                end = match.end()
-                                
-                                # 檢查前文關鍵詞
-                                has_context = False
-                                for keyword in context_before:
-                                    if keyword in response_text[max(0, start - context_distance):start]:
-                                        has_context = True
-                                        break
-                                
-                                # 檢查例外情況
-                                is_exception = False
-                                for exception in exceptions:
-                                    if exception in response_text[max(0, start - context_distance):end + context_distance]:
-                                        is_exception = True
-                                        break
-                                
-                                # 執行替換
-                                if has_context and not is_exception:
-                                    response_text = response_text[:start] + replacement + response_text[end:]
-                        
-                        improved_chunks.append(response_text)
-                        break  # 成功處理，跳出重試循環
-                    else:
-                        logger.warning(f"文本塊 {i+1} 的 API 回應為空，嘗試重試 ({attempt + 1}/{max_retries})")
-                
-                except Exception as e:
-                    logger.error(f"處理文本塊 {i+1} 時發生錯誤: {str(e)}")
-                    if attempt == max_retries - 1:  # 最後一次嘗試
-                        logger.error("已達到最大重試次數，使用原始文本")
-                        improved_chunks.append(chunk)
-                    time.sleep(1)  # 等待一秒後重試
-        
-        # 合併所有改善後的文本塊
-        improved_text = ''.join(improved_chunks)
-        
-        # 最後的清理和確保繁體輸出
-        improved_text = re.sub(r'\n{3,}', '\n\n', improved_text)  # 移除過多的空行
-        improved_text = improved_text.strip()
-        
-        # 最終確保輸出為繁體中文
-        improved_text = converter.convert(improved_text)
-        
-        # 檢查並修正特定名詞
-        for wrong, correct in PROPER_NOUNS.items():
-            improved_text = improved_text.replace(wrong, correct)
-        
-        # 處理上下文相關詞彙替換
-        for term in CONTEXT_SPECIFIC_TERMS:
-            pattern = term['pattern']
-            replacement = term['replacement']
-            context_before = term['context_before']
-            context_distance = term['context_distance']
-            exceptions = term['exceptions']
-            
-            # 搜尋模式
-            for match in re.finditer(pattern, improved_text):
-                start = match.start()
-                end = match.end()
-                
-                # 檢查前文關鍵詞
-                has_context = False
-                for keyword in context_before:
-                    if keyword in improved_text[max(0, start - context_distance):start]:
-                        has_context = True
-                        break
-                
-                # 檢查例外情況
-                is_exception = False
-                for exception in exceptions:
-                    if exception in improved_text[max(0, start - context_distance):end + context_distance]:
-                        is_exception = True
-                        break
-                
-                # 執行替換
-                if has_context and not is_exception:
-                    improved_text = improved_text[:start] + replacement + improved_text[end:]
-        
-        logger.info("文字品質改善完成")
-        return improved_text
-        
-    except Exception as e:
-        logger.error(f"改善文字品質時發生錯誤: {str(e)}")
-        logger.error(traceback.format_exc())
-        return text  # 如果發生錯誤，返回原始文字
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    jobs = job_store.list_jobs(
+        state=request.args.get('state'),
+        filename=request.args.get('filename'),
+        limit=limit
+    )
+    for job_data in jobs:
+        job_data['position'] = job_queue.position(job_data['id'])
+        job_data['eta_seconds'] = queue_eta(job_data['id'])
+    return jsonify({'jobs': jobs})
+
+@app.route('/api/jobs/<job_id>')
+def api_get_job(job_id):
+    job_data = job_store.get_job(job_id)
+    if job_data is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job_data['position'] = job_queue.position(job_id)
+    job_data['eta_seconds'] = queue_eta(job_id)
+    return jsonify(job_data)
+
+@app.route('/api/jobs/<job_id>/transcript')
+def api_get_transcript(job_id):
+    job_data = job_store.get_job(job_id)
+    if job_data is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job_data['transcript_path']:
+        return jsonify({'error': 'Transcript not ready'}), 409
+    try:
+        with open(job_data['transcript_path'], 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return jsonify({'error': 'Transcript file missing'}), 410
+    return jsonify({'id': job_id, 'path': job_data['transcript_path'], 'text': text})
+
+@app.route('/api/jobs/<job_id>/export/<export_format>')
+def api_export_transcript(job_id, export_format):
+    """以保存的時間軸記錄輸出 SRT、VTT 或 JSON（不需重新轉錄）"""
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    job_data = job_store.get_job(job_id)
+    if job_data is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job_data['transcript_path']:
+        return jsonify({'error': 'Transcript not ready'}), 409
+    try:
+        record = read_record(segments_path(job_data['transcript_path']))
+    except (OSError, ValueError):
+        return jsonify({'error': 'Timestamps not available for this transcript'}), 404
+
+    download_name = os.path.splitext(os.path.basename(job_data['transcript_path']))[0] + f'.{export_format}'
+    return Response(
+        render(record, export_format),
+        headers={
+            'Content-Type': EXPORT_FORMATS[export_format],
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(download_name)}"
+        }
+    )
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    start = time.perf_counter()
+    results = search_index.search(query, limit)
+    return jsonify({
+        'query': query,
+        'results': results,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_job(job_id):
+    if job_queue.get(job_id) is None:
+        if job_store.get_job(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'error': '任務已結束，無法取消'}), 409
+    if not job_queue.cancel(job_id):
+        return jsonify({'error': '任務已結束，無法取消'}), 409
+    job_data = job_store.get_job(job_id)
+    if job_data['state'] == JOB_CANCELLED:
+        publish_queue_positions()
+    return jsonify(job_data)
+
+def wait_for_server(port, timeout=30):
+    """等待本機伺服器開始監聽指定連接埠"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
 
 if __name__ == '__main__':
     # 確保上傳目錄存在
     Path(UPLOAD_FOLDER).mkdir(parents=True, exist_ok=True)
+    # 以下只在實際服務的行程執行一次：除錯模式下重新載入器的父行程不服務請求，只有子行程會設定 WERKZEUG_RUN_MAIN
+    serving_process = not SERVER_DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if serving_process:
+        # 恢復上次未完成的任務
+        resume_unfinished_jobs()
+        # 在背景同步搜尋索引（只重新索引新增或修改過的轉錄稿）
+        threading.Thread(target=search_index.sync, args=(TRANSCRIPTS_FOLDER,), name='search-index-sync', daemon=True).start()
+    # 伺服器開始監聽後再於背景預先載入模型
+    if WHISPER_PREWARM and serving_process:
+        model_registry.prewarm(WHISPER_PREWARM, wait_until=lambda: wait_for_server(SERVER_PORT))
     # 監聽所有網絡接口
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=SERVER_PORT, debug=SERVER_DEBUG)
@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import logging
+import tempfile
+import traceback
+import subprocess
+import numpy as np
+from pydub import AudioSegment
+
+logger = logging.getLogger(__name__)
+
+# Whisper 模型要求的採樣率
+SAMPLE_RATE = 16000
+
+# 每次從 ffmpeg 管線讀取的位元組數
+READ_CHUNK_SIZE = 1 << 20
+
+
+def _decode_command(file_path, sr):
+    """解碼、混音為單聲道並重新採樣，輸出 float32 PCM 到 stdout 的 ffmpeg 指令"""
+    return [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-threads', '0',
+        '-i', file_path,
+        '-vn',
+        '-f', 'f32le',
+        '-acodec', 'pcm_f32le',
+        '-ac', '1',
+        '-ar', str(sr),
+        '-'
+    ]
+
+
+def _raise_decode_error(stderr_file):
+    stderr_file.seek(0)
+    error_message = stderr_file.read().decode('utf-8', errors='replace').strip()
+    raise RuntimeError(f"ffmpeg 解碼失敗: {error_message}")
+
+
+def load_audio(file_path, sr=SAMPLE_RATE):
+    """以單一 ffmpeg 管線將音頻直接解碼為單聲道 float32 陣列
+
+    ffmpeg 同時完成解碼、混音與重新採樣，輸出的 PCM 直接串流進
+    bytearray，再以 np.frombuffer 建立零複製的視圖，不經過臨時 WAV 文件。
+
+    Args:
+        file_path (str): 音頻文件路徑
+        sr (int): 目標採樣率
+
+    Returns:
+        np.ndarray: 範圍在 [-1, 1] 的 float32 單聲道音頻
+    """
+    cmd = _decode_command(file_path, sr)
+    logger.info(f"開始解碼音頻文件: {file_path}")
+
+    # stderr 寫到臨時文件，避免錯誤訊息塞滿管線造成死結
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = process.stdout.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                buffer += chunk
+        finally:
+            process.stdout.close()
+            return_code = process.wait()
+
+        if return_code != 0:
+            _raise_decode_error(stderr_file)
+
+    # float32 每個樣本 4 個位元組，截掉不完整的尾端
+    usable = len(buffer) - len(buffer) % 4
+    audio = np.frombuffer(buffer, dtype=np.float32, count=usable // 4)
+    logger.info(f"音頻解碼完成，共 {audio.shape[0]} 個樣本（{audio.shape[0] / sr:.1f} 秒）")
+    return audio
+
+
+class PcmFile:
+    """解碼到磁碟暫存文件的 float32 單聲道音頻
+
+    支援 len() 與切片，可代替 np.ndarray 傳給切分、雜湊與轉錄。
+    每次切片只以 np.memmap 映射該片段（copy-on-write，可寫入但不會改動文件），
+    片段不再使用時即解除映射，因此常駐記憶體只與片段長度有關，與錄音總長無關。
+    """
+
+    def __init__(self, file, samples, sr=SAMPLE_RATE):
+        """
+        Args:
+            file: 以二進位讀寫模式開啟的暫存文件（關閉時自動刪除）
+            samples (int): 樣本數
+            sr (int): 採樣率
+        """
+        self._file = file
+        self.samples = samples
+        self.sr = sr
+
+    def __len__(self):
+        return self.samples
+
+    @property
+    def shape(self):
+        return (self.samples,)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError('PcmFile 只支援連續的切片')
+        start, stop, _ = index.indices(self.samples)
+        if stop <= start:
+            return np.empty(0, dtype=np.float32)
+        return np.memmap(self._file, dtype=np.float32, mode='c', offset=start * 4, shape=(stop - start,))
+
+    def close(self):
+        """關閉並刪除暫存文件"""
+        self._file.close()
+
+
+def load_audio_file(file_path, sr=SAMPLE_RATE, folder=None):
+    """將音頻解碼到磁碟上的暫存文件，適用於數小時的長錄音
+
+    ffmpeg 的輸出直接寫入暫存文件，解碼過程不在記憶體中保留完整的 PCM；
+    之後以 PcmFile 依需要映射片段。暫存文件在 PcmFile 關閉或被回收時刪除。
+
+    Args:
+        file_path (str): 音頻文件路徑
+        sr (int): 目標採樣率
+        folder (str): 暫存文件目錄（應位於磁碟而非 tmpfs），None 時使用系統暫存目錄
+
+    Returns:
+        PcmFile: 範圍在 [-1, 1] 的 float32 單聲道音頻
+    """
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    cmd = _decode_command(file_path, sr)
+    logger.info(f"開始解碼音頻文件（暫存於磁碟）: {file_path}")
+
+    pcm_file = tempfile.TemporaryFile(dir=folder)
+    try:
+        with tempfile.TemporaryFile() as stderr_file:
+            return_code = subprocess.call(cmd, stdout=pcm_file, stderr=stderr_file)
+            if return_code != 0:
+                _raise_decode_error(stderr_file)
+        # float32 每個樣本 4 個位元組，忽略不完整的尾端
+        samples = os.fstat(pcm_file.fileno()).st_size // 4
+    except BaseException:
+        pcm_file.close()
+        raise
+
+    logger.info(f"音頻解碼完成，共 {samples} 個樣本（{samples / sr:.1f} 秒）")
+    return PcmFile(pcm_file, samples, sr)
+
+
+# ffmpeg -i 輸出中的長度與音訊串流資訊（沒有 ffprobe 時使用）
+_DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+_AUDIO_STREAM_PATTERN = re.compile(r'Stream #\d+:\d+.*?: Audio: (\w+)[^,]*(?:, (\d+) Hz)?(?:, ([\w.()]+))?')
+_BITRATE_PATTERN = re.compile(r'bitrate: (\d+) kb/s')
+
+# 常見的聲道配置名稱對應的聲道數
+_CHANNEL_LAYOUTS = {'mono': 1, 'stereo': 2, '2.1': 3, 'quad': 4, '5.0': 5, '5.1': 6, '5.1(side)': 6, '7.1': 8}
+
+# 讀取標頭的逾時秒數（只讀取標頭，正常情況下數十毫秒內完成）
+PROBE_TIMEOUT = 10
+
+
+class ProbeError(RuntimeError):
+    """文件無法辨識為音頻（損壞、不是音頻或沒有音訊串流）"""
+
+
+def _probe_with_ffprobe(file_path):
+    cmd = [
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', '-select_streams', 'a:0', file_path
+    ]
+    completed = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT)
+    if completed.returncode != 0:
+        raise ProbeError(completed.stderr.decode('utf-8', errors='replace').strip() or '無法讀取音頻標頭')
+    info = json.loads(completed.stdout.decode('utf-8'))
+    streams = info.get('streams') or []
+    if not streams:
+        raise ProbeError('文件中沒有音訊串流')
+    stream = streams[0]
+    container = info.get('format') or {}
+    duration = stream.get('duration') or container.get('duration')
+    bit_rate = stream.get('bit_rate') or container.get('bit_rate')
+    return {
+        'duration': float(duration) if duration not in (None, 'N/A') else None,
+        'codec': stream.get('codec_name'),
+        'channels': stream.get('channels'),
+        'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+        'bit_rate': int(bit_rate) if bit_rate not in (None, 'N/A') else None,
+        'format': container.get('format_name')
+    }
+
+
+def _probe_with_ffmpeg(file_path):
+    # 沒有指定輸出時 ffmpeg 只讀取標頭並以非零狀態結束，資訊寫到 stderr
+    cmd = ['ffmpeg', '-nostdin', '-hide_banner', '-i', file_path]
+    completed = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT)
+    output = completed.stderr.decode('utf-8', errors='replace')
+    stream = _AUDIO_STREAM_PATTERN.search(output)
+    if stream is None:
+        message = output.strip().splitlines()[-1] if output.strip() else '無法讀取音頻標頭'
+        raise ProbeError(message)
+    duration = _DURATION_PATTERN.search(output)
+    bit_rate = _BITRATE_PATTERN.search(output)
+    codec, sample_rate, layout = stream.groups()
+    channels = _CHANNEL_LAYOUTS.get(layout)
+    if channels is None and layout:
+        match = re.match(r'(\d+) channels', layout)
+        channels = int(match.group(1)) if match else None
+    return {
+        'duration': (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)))
+        if duration else None,
+        'codec': codec,
+        'channels': channels,
+        'sample_rate': int(sample_rate) if sample_rate else None,
+        'bit_rate': int(bit_rate.group(1)) * 1000 if bit_rate else None,
+        'format': None
+    }
+
+
+def probe_audio(file_path):
+    """讀取音頻的長度、編碼、聲道數與採樣率，只解析容器標頭不解碼
+
+    優先使用 ffprobe；沒有安裝 ffprobe 時改為解析 ffmpeg -i 的輸出。
+    損壞或不是音頻的文件在讀取標頭時就會失敗，不必等到完整解碼。
+
+    Returns:
+        dict: duration（秒，未知為 None）、codec、channels、sample_rate、bit_rate、format
+
+    Raises:
+        ProbeError: 文件無法辨識為音頻
+    """
+    if not os.path.isfile(file_path):
+        raise ProbeError(f'找不到文件: {file_path}')
+    try:
+        try:
+            return _probe_with_ffprobe(file_path)
+        except FileNotFoundError:
+            return _probe_with_ffmpeg(file_path)
+    except subprocess.TimeoutExpired:
+        raise ProbeError('讀取音頻標頭逾時')
+    except (OSError, ValueError) as e:
+        raise ProbeError(f'讀取音頻標頭失敗: {str(e)}')
+
+
+def preprocess_audio(file_path):
+    """預處理音頻文件（舊流程：pydub 解碼後輸出臨時 WAV）
+
+    保留供基準測試比較使用，轉錄流程請改用 load_audio。
+    """
+    try:
+        logger.info(f"開始預處理音頻文件: {file_path}")
+
+        # 讀取音頻文件
+        audio = AudioSegment.from_file(file_path)
+        logger.info(f"音頻文件信息: 格式={file_path.split('.')[-1].upper()}, 通道數={audio.channels}, 採樣率={audio.frame_rate}")
+
+        # 轉換為單聲道
+        if audio.channels > 1:
+            logger.info("轉換為單聲道")
+            audio = audio.set_channels(1)
+
+        # 設置採樣率為 16kHz（Whisper 模型的標準要求）
+        if audio.frame_rate != SAMPLE_RATE:
+            logger.info(f"調整採樣率從 {audio.frame_rate} 到 {SAMPLE_RATE}")
+            audio = audio.set_frame_rate(SAMPLE_RATE)
+
+        # 導出為臨時 WAV 文件
+        temp_path = file_path + '.temp.wav'
+        audio.export(temp_path, format='wav')
+        logger.info(f"音頻預處理完成，臨時文件保存為: {temp_path}")
+
+        return temp_path
+    except Exception as e:
+        logger.error(f"音頻預處理失敗: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise
@@ -0,0 +1,127 @@
+import time
+import logging
+from types import SimpleNamespace
+
+from postprocess import TokenBucket, improve_text_quality
+from resources import get_gemini_model, get_http_session
+
+logger = logging.getLogger(__name__)
+
+
+class CorrectionBackend:
+    """文字改善（後處理）階段的後端介面"""
+
+    name = None
+
+    def available(self):
+        """後端目前是否可用（例如金鑰是否已設定、服務是否可連線）"""
+        return True
+
+    def improve(self, text):
+        """改善轉錄文字
+
+        Args:
+            text (str): Whisper 轉錄的繁體中文文字
+
+        Returns:
+            str: 改善後的文字
+        """
+        raise NotImplementedError
+
+
+class RuleBasedBackend(CorrectionBackend):
+    """完全離線的規則式校正：專有名詞、上下文詞彙替換與 fix_transcripts 的格式整理"""
+
+    name = 'rules'
+
+    def improve(self, text):
+        from fix_transcripts import fix_text
+
+        start = time.perf_counter()
+        # fix_text 已包含專有名詞與上下文詞彙替換，不必再先套用 apply_term_corrections
+        improved_text = fix_text(text)
+        logger.info(f"規則式文字校正完成，耗時 {(time.perf_counter() - start) * 1000:.1f} 毫秒")
+        return improved_text
+
+
+class GeminiBackend(CorrectionBackend):
+    """使用 Gemini 並行校正各文本塊"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model_name='gemini-pro', max_concurrency=4, requests_per_minute=60):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        # 所有任務共用同一個限流器，避免並行請求超過 API 配額
+        self.rate_limiter = TokenBucket(requests_per_minute / 60)
+
+    def available(self):
+        # 沒有金鑰時 google-auth 會先探測 Compute Engine metadata 數秒後才失敗
+        return bool(self.api_key)
+
+    def improve(self, text):
+        return improve_text_quality(
+            text,
+            get_gemini_model(self.api_key, self.model_name),
+            max_concurrency=self.max_concurrency,
+            rate_limiter=self.rate_limiter
+        )
+
+
+class LocalLLMBackend(CorrectionBackend):
+    """透過 HTTP 呼叫本地 LLM 伺服器（OpenAI 相容的 chat completions 介面，如 Ollama、llama.cpp）"""
+
+    name = 'local_llm'
+
+    def __init__(self, url, model_name, max_concurrency=2, timeout=120):
+        self.url = url
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+
+    def available(self):
+        return bool(self.url)
+
+    def generate_content(self, prompt):
+        """與 genai.GenerativeModel.generate_content 相同的呼叫方式，讓 improve_text_quality 可直接使用"""
+        response = get_http_session().post(self.url, json={
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0.2,
+            'stream': False
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return SimpleNamespace(text=data['choices'][0]['message']['content'])
+
+    def improve(self, text):
+        return improve_text_quality(text, self, max_concurrency=self.max_concurrency)
+
+
+def create_backends(gemini_api_key=None, gemini_concurrency=4, gemini_requests_per_minute=60,
+                    local_llm_url=None, local_llm_model=None):
+    """建立所有可選的後處理後端
+
+    Returns:
+        dict: 後端名稱對應的後端實例
+    """
+    backends = [
+        RuleBasedBackend(),
+        GeminiBackend(
+            api_key=gemini_api_key,
+            max_concurrency=gemini_concurrency,
+            requests_per_minute=gemini_requests_per_minute
+        ),
+        LocalLLMBackend(local_llm_url, local_llm_model),
+    ]
+    return {backend.name: backend for backend in backends}
+
+
+def resolve_backend(backends, name, fallback='rules'):
+    """取得指定的後端；不可用時改用離線的規則式後端"""
+    backend = backends[name]
+    if not backend.available():
+        logger.warning(f"後處理後端 {name} 目前不可用，改用 {fallback}")
+        backend = backends[fallback]
+    return backend
@@ -0,0 +1,212 @@
+import time
+import uuid
+import logging
+import threading
+
+from progress import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# 批次內檔案的排序方式
+ORDER_SHORTEST = 'shortest'
+ORDER_PRIORITY = 'priority'
+ORDER_GIVEN = 'given'
+BATCH_ORDERS = (ORDER_SHORTEST, ORDER_PRIORITY, ORDER_GIVEN)
+
+# 記憶體中最多保留的批次數（結束最久的先移除）
+MAX_BATCHES = 100
+
+
+class Batch:
+    """一組一起排程的轉錄任務"""
+
+    def __init__(self, items):
+        """
+        Args:
+            items (list): 依執行順序排列的 dict，包含 filename、duration 與 job_id
+        """
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.created_at = time.time()
+        self.started_at = None
+        self.total_seconds = sum(item['duration'] for item in items)
+        self.states = {}
+
+
+def order_files(files, durations, order=ORDER_SHORTEST, priorities=None):
+    """決定批次內檔案的執行順序
+
+    Args:
+        files (list): 檔名列表
+        durations (dict): 檔名對應音頻秒數（未知為 None）
+        order (str): shortest（最短的先做）、priority（priority 值小的先做）或 given（保持原順序）
+        priorities (dict): 檔名對應優先順序，order 為 priority 時使用
+
+    Returns:
+        list: 排序後的檔名
+    """
+    if order == ORDER_SHORTEST:
+        # 長度未知的檔案排在最後
+        return sorted(files, key=lambda name: (durations.get(name) is None, durations.get(name) or 0))
+    if order == ORDER_PRIORITY:
+        priorities = priorities or {}
+        return sorted(files, key=lambda name: (priorities.get(name, 0), durations.get(name) or 0))
+    return list(files)
+
+
+class BatchScheduler:
+    """批次轉錄排程
+
+    - 批次內的任務依排序依次送入同一個 JobQueue，由流水線的解碼階段先行解碼下一個檔案，與前一個檔案的推論重疊；
+    - 監聽各任務的進度，以音頻長度加權彙總成批次進度與預估剩餘時間，發布到批次 ID 的進度頻道。
+    """
+
+    def __init__(self, job_queue, progress_hub):
+        """
+        Args:
+            job_queue (JobQueue): 轉錄任務佇列
+            progress_hub (ProgressHub): 進度中心
+        """
+        self.job_queue = job_queue
+        self.progress_hub = progress_hub
+        self._batches = {}
+        self._batch_of_job = {}
+        self._lock = threading.Lock()
+        progress_hub.add_listener(self._on_progress)
+
+    def submit(self, items, params):
+        """建立批次並依序送出任務
+
+        Args:
+            items (list): 依執行順序排列的 dict，包含 filename、path、duration（秒）
+                與可省略的 defer（長任務，排在一般任務之後）
+            params (dict): 每個任務共用的參數（model、backend）
+
+        Returns:
+            Batch: 新建立的批次
+        """
+        batch_items = []
+        for item in items:
+            batch_items.append({
+                'filename': item['filename'],
+                'path': item['path'],
+                'duration': item['duration'] or 0.0,
+                'defer': item.get('defer', False),
+                'job_id': None
+            })
+        batch = Batch(batch_items)
+        with self._lock:
+            self._batches[batch.id] = batch
+            while len(self._batches) > MAX_BATCHES:
+                del self._batches[next(iter(self._batches))]
+
+        for item in batch.items:
+            # 先登記任務所屬的批次再送出，解碼階段可能在 submit 返回前就開始處理並回報進度
+            item['job_id'] = uuid.uuid4().hex
+            with self._lock:
+                self._batch_of_job[item['job_id']] = batch.id
+            job = self.job_queue.submit(
+                item['filename'],
+                dict(params, batch_id=batch.id),
+                job_id=item['job_id'],
+                cost=item['duration'] or None,
+                defer=item['defer']
+            )
+            self.progress_hub.create(job.id, {
+                'status': 'queued',
+                'progress': 0,
+                'position': self.job_queue.position(job.id),
+                'message': '已加入佇列，等待處理...'
+            })
+
+        self.progress_hub.create(batch.id, self._summary(batch))
+        logger.info(f"批次 {batch.id} 已排程：{len(batch.items)} 個檔案，共 {batch.total_seconds:.0f} 秒音頻")
+        return batch
+
+    def get(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+        if batch is None:
+            return None
+        return self._summary(batch)
+
+    def job_started(self, job_id):
+        """任務開始執行時呼叫：記錄批次開始時間，作為推估剩餘時間的基準"""
+        with self._lock:
+            batch = self._batches.get(self._batch_of_job.get(job_id))
+            if batch is not None and batch.started_at is None:
+                batch.started_at = time.time()
+
+    def _on_progress(self, task_id, state):
+        with self._lock:
+            batch = self._batches.get(self._batch_of_job.get(task_id))
+            if batch is None:
+                return
+            batch.states[task_id] = state
+        summary = self._summary(batch)
+        if summary['status'] in FINISHED_STATUSES:
+            with self._lock:
+                for item in batch.items:
+                    self._batch_of_job.pop(item['job_id'], None)
+        self.progress_hub.update(batch.id, summary)
+
+    def _summary(self, batch):
+        """以音頻長度加權計算批次進度與預估剩餘時間"""
+        with self._lock:
+            states = {job_id: dict(state) for job_id, state in batch.states.items()}
+
+        counts = {'queued': 0, 'processing': 0, 'completed': 0, 'error': 0, 'cancelled': 0}
+        done_seconds = 0.0
+        files = []
+        for item in batch.items:
+            state = states.get(item['job_id'], {})
+            status = state.get('status', 'queued')
+            counts[status] = counts.get(status, 0) + 1
+            if status in FINISHED_STATUSES:
+                fraction = 1.0
+            else:
+                fraction = min(1.0, max(0.0, float(state.get('progress', 0)) / 100))
+            done_seconds += fraction * item['duration']
+            files.append({
+                'task_id': item['job_id'],
+                'filename': item['filename'],
+                'duration': round(item['duration'], 1),
+                'status': status,
+                'progress': state.get('progress', 0)
+            })
+
+        finished = counts['completed'] + counts['error'] + counts['cancelled']
+        if finished == len(batch.items):
+            if counts['cancelled'] == len(batch.items):
+                status = 'cancelled'
+            elif counts['completed'] == 0:
+                # 沒有任何檔案成功（全部失敗，或部分失敗其餘取消）
+                status = 'error'
+            else:
+                status = 'completed'
+        elif counts['queued'] == len(batch.items):
+            status = 'queued'
+        else:
+            status = 'processing'
+
+        # 以目前的音頻吞吐量推估剩餘時間
+        eta_seconds = None
+        throughput = None
+        if batch.started_at is not None and done_seconds > 0:
+            elapsed = time.time() - batch.started_at
+            throughput = done_seconds / max(elapsed, 1e-6)
+            eta_seconds = round(max(0.0, batch.total_seconds - done_seconds) / throughput, 1)
+
+        total = batch.total_seconds
+        return {
+            'batch_id': batch.id,
+            'status': status,
+            'progress': int(100 * done_seconds / total) if total else int(100 * finished / len(batch.items)),
+            'message': f'批次進度：{finished}/{len(batch.items)} 個檔案完成',
+            'counts': counts,
+            'total_seconds': round(total, 1),
+            'done_seconds': round(done_seconds, 1),
+            'throughput': round(throughput, 2) if throughput else None,
+            'eta_seconds': eta_seconds,
+            'files': files
+        }
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""上下文相關詞彙替換的擴展性基準測試
+
+比較舊的逐一重建字串做法與 ContextRuleEngine 在不同文本長度下的耗時；
+文本長度加倍時，新引擎的耗時應大致加倍（線性），舊做法則接近四倍。
+
+用法：
+    python benchmarks/bench_context_rules.py [--max-size 1000000] [--skip-legacy-above 250000]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from text_rules import CONTEXT_SPECIFIC_TERMS, context_rules
+
+PARAGRAPH = "我們回到自己的內在，好好關照這份感受。今天的節目到這裡告一段落，謝謝大家收聽。也記得關照家人。我們下次再見，祝福每一位朋友都平安順利。"
+
+
+def legacy_apply(text):
+    """舊版 improve_text_quality 內的替換迴圈（每次匹配都重建整個字串）"""
+    for term in CONTEXT_SPECIFIC_TERMS:
+        pattern = term['pattern']
+        replacement = term['replacement']
+        context_before = term['context_before']
+        context_distance = term['context_distance']
+        exceptions = term['exceptions']
+
+        for match in re.finditer(pattern, text):
+            start = match.start()
+            end = match.end()
+
+            has_context = False
+            for keyword in context_before:
+                if keyword in text[max(0, start - context_distance):start]:
+                    has_context = True
+                    break
+
+            is_exception = False
+            for exception in exceptions:
+                if exception in text[max(0, start - context_distance):end + context_distance]:
+                    is_exception = True
+                    break
+
+            if has_context and not is_exception:
+                text = text[:start] + replacement + text[end:]
+    return text
+
+
+def timed(func, text):
+    start = time.perf_counter()
+    func(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上下文替換擴展性基準測試')
+    parser.add_argument('--max-size', type=int, default=1000000, help='最大文本長度（字元）')
+    parser.add_argument('--skip-legacy-above', type=int, default=250000, help='超過此長度不再執行舊做法')
+    args = parser.parse_args()
+
+    sizes = []
+    size = args.max_size
+    while size >= 50000:
+        sizes.append(size)
+        size //= 2
+    sizes.reverse()
+
+    print(f"{'長度':>10} {'引擎(秒)':>10} {'舊做法(秒)':>12}")
+    for size in sizes:
+        text = (PARAGRAPH * (size // len(PARAGRAPH) + 1))[:size]
+        engine_time = timed(context_rules.apply, text)
+        if size <= args.skip_legacy_above:
+            legacy = f"{timed(legacy_apply, text):>12.3f}"
+        else:
+            legacy = f"{'(略過)':>12}"
+        print(f"{size:>10} {engine_time:>10.3f} {legacy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""比較每個文件的繁簡轉換開銷：每次新建 OpenCC 與共用的 trie 轉換器
+
+舊做法：每個文件（以及每次轉錄中的多個步驟）各自建立 opencc.OpenCC('s2t')，
+每次都重新讀取並解析字典文件，再以 opencc-python-reimplemented 的切句與子字串比對轉換。
+新做法：resources.get_converter('s2t') 在行程內只建立一次 trie，之後整段文字單次掃描。
+
+同時檢查兩者的轉換結果是否一致。預設使用 transcripts 目錄下的轉錄稿，
+並另外以 t2s 轉成簡體後再測一次（接近 Whisper 的原始輸出）。
+
+用法：
+    python benchmarks/bench_converters.py [--dir transcripts] [--repeat 3]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import opencc
+
+from resources import TrieConverter
+
+
+def legacy_convert(texts):
+    """每個文件都新建轉換器（舊版 fix_text 的做法）"""
+    return [opencc.OpenCC('s2t').convert(text) for text in texts]
+
+
+def shared_convert(texts):
+    """行程內共用一個 trie 轉換器（建立時間也計入）"""
+    converter = TrieConverter('s2t')
+    return [converter.convert(text) for text in texts]
+
+
+def best_time(func, texts, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(texts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較繁簡轉換的每文件開銷')
+    parser.add_argument('--dir', default=os.path.join(ROOT_DIR, 'transcripts'), help='轉錄稿目錄')
+    parser.add_argument('--repeat', type=int, default=3, help='每種做法重複次數（取最佳值）')
+    args = parser.parse_args()
+
+    paths = sorted(
+        glob.glob(os.path.join(args.dir, '**', '*.md'), recursive=True)
+        + glob.glob(os.path.join(args.dir, '**', '*.txt'), recursive=True)
+    )
+    if not paths:
+        print(f"{args.dir} 中沒有轉錄稿")
+        return
+    traditional = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            traditional.append(f.read())
+    t2s = opencc.OpenCC('t2s')
+    simplified = [t2s.convert(text) for text in traditional]
+
+    start = time.perf_counter()
+    opencc.OpenCC('s2t')
+    construct_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    TrieConverter('s2t')
+    trie_ms = (time.perf_counter() - start) * 1000
+    print(f"建立 OpenCC('s2t'): {construct_ms:.1f} 毫秒；建立 trie 轉換器（每個行程一次）: {trie_ms:.1f} 毫秒")
+    print()
+
+    print(f"{'文本':<6} {'文件數':>6} {'字數':>9} {'舊(秒)':>8} {'新(秒)':>8} {'每文件舊(毫秒)':>14} {'每文件新(毫秒)':>14} {'結果一致':>8}")
+    for name, texts in (('繁體', traditional), ('簡體', simplified)):
+        legacy_time, legacy_result = best_time(legacy_convert, texts, args.repeat)
+        shared_time, shared_result = best_time(shared_convert, texts, args.repeat)
+        print(
+            f"{name:<6} {len(texts):>6} {sum(len(text) for text in texts):>9} "
+            f"{legacy_time:>8.3f} {shared_time:>8.3f} "
+            f"{legacy_time / len(texts) * 1000:>14.2f} {shared_time / len(texts) * 1000:>14.2f} "
+            f"{str(legacy_result == shared_result):>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""比較音頻解碼流程的耗時與記憶體峰值
+
+舊流程：pydub 解碼 → 單聲道/重新採樣 → 臨時 WAV → whisper.load_audio 再解碼一次
+新流程：audio.load_audio 單一 ffmpeg 管線直接輸出 float32 陣列
+
+每個流程都在獨立子行程中執行，峰值 RSS 才不會互相影響。
+
+用法：
+    python benchmarks/bench_decode.py uploads/example.mp3 [--repeat 3]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from memory import peak_rss_mb
+
+MODES = ('legacy', 'stream')
+
+
+def run_worker(mode, file_path):
+    """在子行程中執行單一流程並輸出 JSON 結果"""
+    import whisper  # 兩種流程都先載入，讓基準 RSS 一致
+    from audio import load_audio, preprocess_audio
+
+    start = time.perf_counter()
+    if mode == 'legacy':
+        temp_path = preprocess_audio(file_path)
+        try:
+            samples = whisper.load_audio(temp_path)
+        finally:
+            os.remove(temp_path)
+    else:
+        samples = load_audio(file_path)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'mode': mode,
+        'samples': int(samples.shape[0]),
+        'wall_seconds': elapsed,
+        'peak_rss_mb': peak_rss_mb(include_children=True)
+    }))
+
+
+def run_mode(mode, file_path):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--worker', mode, file_path],
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較音頻解碼流程的效能')
+    parser.add_argument('files', nargs='+', help='要測試的音頻文件')
+    parser.add_argument('--repeat', type=int, default=3, help='每個流程重複次數')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.files[0])
+        return
+
+    print(f"{'文件':<40} {'流程':<8} {'耗時(秒)':>10} {'峰值RSS(MB)':>12}")
+    for file_path in args.files:
+        for mode in MODES:
+            results = [run_mode(mode, file_path) for _ in range(args.repeat)]
+            best_wall = min(r['wall_seconds'] for r in results)
+            peak = max(r['peak_rss_mb'] for r in results)
+            print(f"{os.path.basename(file_path):<40} {mode:<8} {best_wall:>10.2f} {peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
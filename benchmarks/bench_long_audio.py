@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""比較長錄音在記憶體中解碼與解碼到磁碟（memmap）兩種模式的峰值記憶體
+
+每種模式與長度在獨立子行程中執行，依序進行轉錄前後與音頻有關的步驟：
+解碼、計算音頻雜湊、在靜音處切分，再逐一取出每個片段（相當於送進模型的視窗）。
+Whisper 模型本身佔用的記憶體與錄音長度無關，這裡不載入模型。
+
+未指定音頻時以 ffmpeg 產生 10 分鐘、1 小時與 3 小時的測試錄音（每 20 秒穿插 1 秒靜音），
+存放在 --dir 目錄中，之後重複執行會沿用。
+
+用法：
+    python benchmarks/bench_long_audio.py [--durations 600 3600 10800] [--dir data/bench]
+    python benchmarks/bench_long_audio.py --files uploads/long1.mp3 uploads/long2.mp3
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from memory import peak_rss_mb
+
+MODES = ('memory', 'memmap')
+
+
+def generate_audio(path, seconds):
+    """產生測試錄音：440Hz 正弦波，每 20 秒有 1 秒靜音，讓切分可以找到切點"""
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-af', "volume='if(lt(mod(t,20),19),1,0)':eval=frame",
+        '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '64k', path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def run_worker(mode, file_path, temp_dir):
+    """在子行程中以指定模式處理一個文件，輸出 JSON 結果"""
+    import numpy as np
+    from audio import load_audio, load_audio_file, SAMPLE_RATE
+    from cache import hash_audio
+    from segmentation import split_audio
+
+    baseline_mb = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'memmap':
+        audio = load_audio_file(file_path, folder=temp_dir)
+    else:
+        audio = load_audio(file_path)
+    decode_seconds = time.perf_counter() - start
+    decode_peak_mb = peak_rss_mb()
+
+    hash_audio(audio)
+    chunks = split_audio(audio, SAMPLE_RATE)
+    checksum = 0.0
+    for chunk in chunks:
+        window = audio[chunk['start']:chunk['end']]
+        # 模型會以此視窗計算 log-mel 頻譜，這裡只讀取整個視窗
+        checksum += float(np.abs(window).sum())
+    total_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'mode': mode,
+        'file': file_path,
+        'audio_seconds': len(audio) / SAMPLE_RATE,
+        'chunks': len(chunks),
+        'checksum': checksum,
+        'decode_seconds': decode_seconds,
+        'total_seconds': total_seconds,
+        'baseline_mb': baseline_mb,
+        'decode_peak_mb': decode_peak_mb,
+        'peak_rss_mb': peak_rss_mb()
+    }))
+
+
+def run_mode(mode, file_path, temp_dir):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--worker', mode, '--files', file_path, '--temp-dir', temp_dir]
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較長錄音兩種解碼模式的峰值記憶體')
+    parser.add_argument('--files', nargs='+', help='要測試的錄音（未指定時自動產生）')
+    parser.add_argument('--durations', nargs='+', type=int, default=[600, 3600, 10800], help='自動產生的錄音長度（秒）')
+    parser.add_argument('--dir', default=os.path.join(ROOT_DIR, 'data', 'bench'), help='自動產生的錄音存放目錄')
+    parser.add_argument('--temp-dir', default=os.path.join(ROOT_DIR, 'data', 'tmp'), help='memmap 模式的暫存目錄')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.files[0], args.temp_dir)
+        return
+
+    files = args.files
+    if not files:
+        os.makedirs(args.dir, exist_ok=True)
+        files = []
+        for seconds in args.durations:
+            path = os.path.join(args.dir, f'long_{seconds}s.mp3')
+            if not os.path.exists(path):
+                print(f"正在產生 {seconds} 秒的測試錄音: {path}")
+                generate_audio(path, seconds)
+            files.append(path)
+
+    print(f"{'文件':<24} {'長度(分)':>8} {'模式':<7} {'片段':>5} {'解碼(秒)':>9} {'總耗時(秒)':>10} {'解碼後峰值(MB)':>14} {'峰值RSS(MB)':>12}")
+    for file_path in files:
+        runs = {mode: run_mode(mode, file_path, args.temp_dir) for mode in MODES}
+        for mode, run in runs.items():
+            print(
+                f"{os.path.basename(file_path):<24} {run['audio_seconds'] / 60:>8.1f} {mode:<7} {run['chunks']:>5} "
+                f"{run['decode_seconds']:>9.1f} {run['total_seconds']:>10.1f} "
+                f"{run['decode_peak_mb']:>14.0f} {run['peak_rss_mb']:>12.0f}"
+            )
+        if runs['memory']['checksum'] != runs['memmap']['checksum']:
+            print(f"警告：{os.path.basename(file_path)} 兩種模式讀到的音頻不一致")
+
+
+if __name__ == '__main__':
+    main()
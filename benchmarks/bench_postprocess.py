@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""比較文字改善階段依序與並行送出的耗時
+
+使用 FakeGenerativeModel 模擬固定延遲的 LLM，不需要網路或 API 金鑰。
+
+用法：
+    python benchmarks/bench_postprocess.py [--chunks 30] [--latency 0.5] [--concurrency 8]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from postprocess import FakeGenerativeModel, TokenBucket, improve_text_quality
+
+SENTENCE = "今天我們在關西聊天室裡聊到心靈補夢網的故事，也談到如何關照自己的內在"
+
+
+def build_transcript(num_chunks, chunk_size):
+    """產生恰好可切成 num_chunks 個文本塊的合成逐字稿"""
+    sentence = SENTENCE + '。'
+    per_chunk = max(1, chunk_size // len(sentence))
+    return sentence * (per_chunk * num_chunks)
+
+
+def run(text, chunk_size, latency, concurrency, rate, failure_rate):
+    model = FakeGenerativeModel(latency=latency, failure_rate=failure_rate, seed=0)
+    limiter = TokenBucket(rate) if rate else None
+    start = time.perf_counter()
+    improve_text_quality(text, model, chunk_size=chunk_size, max_concurrency=concurrency, rate_limiter=limiter)
+    return time.perf_counter() - start, model.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文字改善並行化基準測試')
+    parser.add_argument('--chunks', type=int, default=30, help='文本塊數量')
+    parser.add_argument('--chunk-size', type=int, default=1500, help='每個文本塊的字數')
+    parser.add_argument('--latency', type=float, default=0.5, help='模擬的單次請求延遲（秒）')
+    parser.add_argument('--concurrency', type=int, default=8, help='並行請求數')
+    parser.add_argument('--rate', type=float, default=0, help='每秒請求上限（0 表示不限）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='模擬的請求失敗率')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    text = build_transcript(args.chunks, args.chunk_size)
+
+    serial_time, serial_calls = run(text, args.chunk_size, args.latency, 1, args.rate, args.failure_rate)
+    parallel_time, parallel_calls = run(text, args.chunk_size, args.latency, args.concurrency, args.rate, args.failure_rate)
+
+    print(f"文本長度: {len(text)} 字，延遲 {args.latency} 秒/請求")
+    print(f"依序處理: {serial_time:.2f} 秒（{serial_calls} 次請求）")
+    print(f"並行處理（{args.concurrency}）: {parallel_time:.2f} 秒（{parallel_calls} 次請求）")
+    print(f"加速比: {serial_time / parallel_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""比較 fp32 與 int8（動態量化）Whisper 模型的速度與準確度
+
+每種精度在獨立子行程中執行，torch 執行緒設定與峰值 RSS 才不會互相影響。
+準確度以字錯誤率（CER）表示：有參考稿時與參考稿比較，否則與 fp32 的輸出比較。
+比較前兩邊都轉為繁體並去除空白與標點。
+
+參考稿放在 --reference-dir 目錄中，檔名與音頻相同、副檔名為 .txt 或 .md。
+
+用法：
+    python benchmarks/bench_quantize.py uploads/ref1.mp3 uploads/ref2.mp3 --model medium \
+        --reference-dir references --threads 8
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from memory import peak_rss_mb
+
+from models import PRECISIONS, PRECISION_FP32
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    import opencc
+    return _NON_WORD.sub('', opencc.OpenCC('s2t').convert(text))
+
+
+def edit_distance(a, b):
+    """字元層級的編輯距離（只保留兩列，記憶體為 O(len(b))）"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+
+def cer(hypothesis, reference):
+    reference = normalize(reference)
+    if not reference:
+        return None
+    return edit_distance(normalize(hypothesis), reference) / len(reference)
+
+
+def run_worker(precision, args):
+    """在子行程中載入指定精度的模型並轉錄所有文件，輸出 JSON 結果"""
+    from audio import load_audio, SAMPLE_RATE
+    from models import configure_torch_threads, load_whisper_model
+
+    configure_torch_threads(args.threads, args.interop_threads)
+    start = time.perf_counter()
+    model = load_whisper_model(args.model, precision, cache_dir=args.cache_dir)
+    load_seconds = time.perf_counter() - start
+
+    files = []
+    for file_path in args.files:
+        audio = load_audio(file_path)
+        start = time.perf_counter()
+        result = model.transcribe(audio, language=args.language, fp16=False)
+        files.append({
+            'file': file_path,
+            'audio_seconds': len(audio) / SAMPLE_RATE,
+            'wall_seconds': time.perf_counter() - start,
+            'text': result.get('text', '')
+        })
+
+    print(json.dumps({
+        'precision': precision,
+        'load_seconds': load_seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'files': files
+    }, ensure_ascii=False))
+
+
+def run_precision(precision, argv):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--worker', precision] + argv,
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def read_reference(reference_dir, file_path):
+    if not reference_dir:
+        return None
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    for extension in ('.txt', '.md'):
+        path = os.path.join(reference_dir, base_name + extension)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read()
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較 fp32 與 int8 Whisper 模型的速度與準確度')
+    parser.add_argument('files', nargs='+', help='參考錄音')
+    parser.add_argument('--model', default='medium', help='Whisper 模型名稱')
+    parser.add_argument('--language', default='zh', help='轉錄語言')
+    parser.add_argument('--reference-dir', help='參考稿目錄（.txt 或 .md，檔名與音頻相同）')
+    parser.add_argument('--cache-dir', default=os.path.join(ROOT_DIR, 'data', 'models'), help='量化模型的快取目錄')
+    parser.add_argument('--threads', type=int, default=0, help='torch 運算子內執行緒數（0 為預設值）')
+    parser.add_argument('--interop-threads', type=int, default=0, help='torch 運算子間執行緒數（0 為預設值）')
+    parser.add_argument('--worker', choices=PRECISIONS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args)
+        return
+
+    argv = args.files + [
+        '--model', args.model, '--language', args.language, '--cache-dir', args.cache_dir,
+        '--threads', str(args.threads), '--interop-threads', str(args.interop_threads)
+    ]
+    runs = {precision: run_precision(precision, argv) for precision in PRECISIONS}
+    baseline = {item['file']: item for item in runs[PRECISION_FP32]['files']}
+
+    print(f"{'精度':<6} {'載入(秒)':>9} {'峰值RSS(MB)':>12}")
+    for precision, run in runs.items():
+        print(f"{precision:<6} {run['load_seconds']:>9.1f} {run['peak_rss_mb']:>12.0f}")
+    print()
+
+    print(f"{'文件':<32} {'精度':<6} {'耗時(秒)':>9} {'即時率':>7} {'加速':>6} {'CER':>7} {'比較對象':<8}")
+    for file_path in args.files:
+        reference = read_reference(args.reference_dir, file_path)
+        for precision, run in runs.items():
+            item = next(entry for entry in run['files'] if entry['file'] == file_path)
+            base = baseline[file_path]
+            if reference is not None:
+                error_rate, target = cer(item['text'], reference), '參考稿'
+            elif precision != PRECISION_FP32:
+                error_rate, target = cer(item['text'], base['text']), 'fp32'
+            else:
+                error_rate, target = None, ''
+            error_text = f'{error_rate:.2%}' if error_rate is not None else '-'
+            print(
+                f"{os.path.basename(file_path):<32} {precision:<6} {item['wall_seconds']:>9.1f} "
+                f"{item['wall_seconds'] / max(item['audio_seconds'], 1e-6):>7.2f} "
+                f"{base['wall_seconds'] / max(item['wall_seconds'], 1e-6):>5.2f}x "
+                f"{error_text:>7} {target:<8}"
+            )
+
+
+if __name__ == '__main__':
+    main()
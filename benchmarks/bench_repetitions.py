@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""重複短語與重複句子移除的基準測試
+
+以充滿 Whisper 幻覺迴圈式重複的合成逐字稿，比較 fix_text 舊版的
+逐詞正規表示式與逐對 text.replace 做法，和單次掃描的 collapse_repetitions。
+
+用法：
+    python benchmarks/bench_repetitions.py [--size 500000] [--skip-legacy]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from text_rules import collapse_repetitions
+
+PHRASES = [
+    "我們回到自己的內在", "好好觀照這份感受", "今天的節目到這裡告一段落", "謝謝大家收聽",
+    "關係聊天室", "心靈捕夢網", "每一段關係都是一面鏡子", "先照顧好自己", "再去照顧別人",
+    "這是一個練習", "慢慢來沒有關係", "你可以試著問自己",
+]
+
+
+def build_transcript(size, seed=0):
+    """產生指定長度的合成逐字稿，混合一般句子、空白分隔的重複短語與相鄰重複的句子"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    serial = 0
+    while length < size:
+        serial += 1
+        phrase = rng.choice(PHRASES) + chr(0x4e00 + serial % 500)  # 加上不同的字讓詞組種類變多
+        kind = rng.random()
+        if kind < 0.3:
+            part = ' '.join([phrase] * rng.randint(3, 8)) + '。'  # 重複短語
+        elif kind < 0.5:
+            part = (phrase + '。') * rng.randint(2, 4)  # 重複句子
+        else:
+            part = phrase + '，' + rng.choice(PHRASES) + '。'
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size]
+
+
+def legacy_collapse(text):
+    """舊版 fix_text 的兩個步驟：每個不同詞組編譯一次正規表示式，再逐對替換重複句子"""
+    words = re.findall(r'[一-鿿]+', text)
+    for word in set(words):
+        if len(word) >= 3:
+            pattern = f"({word})" + r"(\s*\1){2,}"
+            text = re.sub(pattern, r"\1", text)
+
+    sentences = re.split(r'[。！？]', text)
+    for i in range(len(sentences) - 1):
+        if sentences[i] and sentences[i] == sentences[i+1]:
+            text = text.replace(f"{sentences[i]}。{sentences[i]}。", f"{sentences[i]}。")
+    return text
+
+
+def timed(func, text):
+    start = time.perf_counter()
+    result = func(text)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重複移除基準測試')
+    parser.add_argument('--size', type=int, default=500000, help='合成逐字稿長度（字元）')
+    parser.add_argument('--skip-legacy', action='store_true', help='不執行舊做法')
+    args = parser.parse_args()
+
+    text = build_transcript(args.size)
+    print(f"文本長度: {len(text)} 字")
+
+    new_time, new_result = timed(collapse_repetitions, text)
+    print(f"單次掃描: {new_time:.3f} 秒，輸出 {len(new_result)} 字")
+
+    if not args.skip_legacy:
+        legacy_time, legacy_result = timed(legacy_collapse, text)
+        print(f"舊做法: {legacy_time:.3f} 秒，輸出 {len(legacy_result)} 字")
+        print(f"加速比: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
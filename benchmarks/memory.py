@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""基準測試共用的記憶體量測"""
+
+import sys
+
+
+def peak_rss_mb(include_children=False):
+    """返回本行程的峰值常駐記憶體（MB）
+
+    Args:
+        include_children (bool): 同時考慮已結束子行程（如 ffmpeg）的峰值，取兩者中較大者
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows 沒有 resource 模組，改用 psutil（不含子行程）
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+    return peak
@@ -0,0 +1,156 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 計算文件雜湊時每次讀取的位元組數
+HASH_CHUNK_SIZE = 1 << 20
+
+# 快取的 Whisper 片段只保留這些欄位（tokens 體積大且用不到）
+SEGMENT_FIELDS = ('id', 'start', 'end', 'text', 'temperature', 'avg_logprob', 'compression_ratio', 'no_speech_prob')
+
+
+def hash_file(file_path):
+    """計算文件內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_audio(audio):
+    """計算解碼後 PCM 的 SHA-256（同一段音頻換了容器或標籤仍會得到相同的值）
+
+    逐段餵入雜湊，audio 可以是 np.ndarray 或 audio.PcmFile，
+    後者每次只映射一段，長錄音也不需要把整段 PCM 讀進記憶體。
+    """
+    digest = hashlib.sha256()
+    block_samples = HASH_CHUNK_SIZE // 4
+    for start in range(0, len(audio), block_samples):
+        digest.update(memoryview(audio[start:start + block_samples]).cast('B'))
+    return digest.hexdigest()
+
+
+def _key(*parts):
+    return hashlib.sha256(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class TranscriptCache:
+    """以內容雜湊為鍵的轉錄結果快取
+
+    Whisper 原始片段與改善後的文字分開存放：
+    - 片段鍵 = 音頻雜湊 + 模型名稱 + 語言
+    - 文字鍵 = 音頻雜湊 + 模型名稱 + 語言 + 後處理版本
+    因此只改後處理規則時仍可重用昂貴的 Whisper 結果。
+    另外記錄上傳文件雜湊到音頻雜湊的對應，重複上傳時不必再解碼即可命中。
+
+    磁碟總大小超過上限時，依最近使用時間淘汰最舊的項目（LRU）。
+    """
+
+    def __init__(self, directory, max_bytes):
+        """
+        Args:
+            directory (str): 快取目錄
+            max_bytes (int): 快取佔用磁碟的上限
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+        self._total_bytes = 0
+
+    def _load_index(self):
+        """掃描快取目錄，依修改時間建立 LRU 索引（只在第一次使用時執行）"""
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and not name.startswith('.'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._total_bytes = sum(self._index.values())
+        logger.info(f"轉錄快取已載入：{len(self._index)} 個項目，共 {self._total_bytes / (1024 * 1024):.1f} MB")
+
+    def _read(self, name):
+        with self._lock:
+            self._load_index()
+            if name not in self._index:
+                return None
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = f.read()
+            except OSError:
+                self._total_bytes -= self._index.pop(name)
+                return None
+            # 更新最近使用時間
+            self._index.move_to_end(name)
+            os.utime(path, None)
+            return data
+
+    def _write(self, name, data):
+        with self._lock:
+            self._load_index()
+            encoded = data.encode('utf-8')
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encoded)
+            os.replace(temp_path, os.path.join(self.directory, name))
+
+            self._total_bytes -= self._index.pop(name, 0)
+            self._index[name] = len(encoded)
+            self._total_bytes += len(encoded)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            logger.info(f"快取空間不足，已淘汰: {name}")
+
+    def get_alias(self, file_hash):
+        """查詢上傳文件雜湊對應的音頻雜湊"""
+        return self._read(f'{file_hash}.alias')
+
+    def put_alias(self, file_hash, audio_hash):
+        self._write(f'{file_hash}.alias', audio_hash)
+
+    def get_segments(self, audio_hash, model_name, language):
+        """讀取快取的 Whisper 轉錄結果（text、segments）"""
+        data = self._read(f'{_key(audio_hash, model_name, language)}.segments.json')
+        return json.loads(data) if data is not None else None
+
+    def put_segments(self, audio_hash, model_name, language, result):
+        record = {
+            'text': result.get('text', ''),
+            'language': result.get('language'),
+            'segments': [
+                {field: segment[field] for field in SEGMENT_FIELDS if field in segment}
+                for segment in result.get('segments', [])
+            ]
+        }
+        self._write(
+            f'{_key(audio_hash, model_name, language)}.segments.json',
+            json.dumps(record, ensure_ascii=False)
+        )
+
+    def get_text(self, audio_hash, model_name, language, postprocess_version):
+        """讀取快取的改善後文字"""
+        return self._read(f'{_key(audio_hash, model_name, language, postprocess_version)}.text.md')
+
+    def put_text(self, audio_hash, model_name, language, postprocess_version, text):
+        self._write(f'{_key(audio_hash, model_name, language, postprocess_version)}.text.md', text)
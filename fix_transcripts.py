@@ -4,45 +4,31 @@
 import os
 import re
 import glob
+import json
+import hashlib
 import logging
 import argparse
+import tempfile
 from pathlib import Path
-import opencc  # 繁簡轉換工具
-import time
+from concurrent.futures import ProcessPoolExecutor
+
+from text_rules import CONTEXT_SPECIFIC_TERMS, DictionaryReplacer, proper_nouns, context_rules, collapse_repetitions
+from resources import get_converter
 
-# 設置日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('fix_transcripts.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# 定義專有名詞對照表
-PROPER_NOUNS = {
-    "觀西花園": "關係花園",
-    "關西花園": "關係花園",
-    "慧青": "慧卿",
-    "惠青": "慧卿",
-    "關西聊天室": "關係聊天室",
+# 修改 fix_text 的處理邏輯時遞增，讓增量處理清單失效
+FIX_TEXT_VERSION = '4'
+
+# 只在批次修正既有轉錄稿時（fix_file）套用的替換：這些轉錄稿中的「關西」都是「關係」的誤識別；
+# 線上轉錄（rules 後端同樣使用 fix_text）可能出現真正的「關西」，因此不放進 fix_text 與共用的專有名詞詞典
+BATCH_ONLY_TERMS = {
     "關西": "關係",
-    "心靈補夢網": "心靈捕夢網",
-    "從關西切入": "從關係切入"
 }
+batch_only_terms = DictionaryReplacer(BATCH_ONLY_TERMS)
 
-# 定義上下文相關詞彙替換（基於上下文的複雜替換）
-CONTEXT_SPECIFIC_TERMS = [
-    {
-        "pattern": r"關照",  # 比對模式
-        "replacement": "觀照",  # 替換詞
-        "context_before": ["心靈", "靈性", "自己", "內在", "意識"],  # 前文關鍵詞
-        "context_distance": 20,  # 關鍵詞與目標詞的最大距離（字元數）
-        "exceptions": ["關照家人", "關照朋友", "關照他人"]  # 例外情況，這些短語不替換
-    }
-]
+# 增量處理清單的文件名稱（存放在處理的目錄中）
+MANIFEST_FILENAME = '.fix_transcripts_manifest.json'
 
 def fix_text(text):
     """修正文本內容
@@ -53,59 +39,14 @@ def fix_text(text):
     Returns:
         str: 修正後的文本
     """
-    # 初始化繁簡轉換器
-    converter = opencc.OpenCC('s2t')  # 簡體轉繁體
+    # 確保文本為繁體中文（共用的轉換器，每個行程只讀取一次字典）
+    text = get_converter('s2t').convert(text)
     
-    # 確保文本為繁體中文
-    text = converter.convert(text)
+    # 1. 處理專有名詞替換（單次掃描、最長匹配優先）
+    text = proper_nouns.replace(text)
     
-    # 1. 處理專有名詞替換
-    for wrong, correct in PROPER_NOUNS.items():
-        text = text.replace(wrong, correct)
-    
-    # 2. 處理上下文相關詞彙替換
-    for term in CONTEXT_SPECIFIC_TERMS:
-        pattern = term["pattern"]
-        replacement = term["replacement"]
-        context_before = term["context_before"]
-        context_distance = term["context_distance"]
-        exceptions = term.get("exceptions", [])
-        
-        # 檢查例外情況
-        for exception in exceptions:
-            if exception in text:
-                # 暫時替換例外情況，避免被後續規則影響
-                temp_placeholder = f"__PLACEHOLDER_{int(time.time())}__"
-                text = text.replace(exception, temp_placeholder)
-        
-        # 尋找所有匹配項
-        matches = list(re.finditer(pattern, text))
-        
-        # 從後向前替換，以避免替換後位置變動影響
-        for match in reversed(matches):
-            start_idx = match.start()
-            # 檢查前文是否包含上下文關鍵詞
-            context_start = max(0, start_idx - context_distance)
-            previous_context = text[context_start:start_idx]
-            
-            # 如果前文包含任一上下文關鍵詞，則進行替換
-            if any(keyword in previous_context for keyword in context_before):
-                # 檢查是否屬於例外情況
-                is_exception = False
-                for exception in exceptions:
-                    if start_idx + len(pattern) <= len(text):
-                        potential_match = text[start_idx:start_idx + len(exception)]
-                        if exception.startswith(pattern) and potential_match == exception:
-                            is_exception = True
-                            break
-                
-                if not is_exception:
-                    text = text[:start_idx] + replacement + text[start_idx + len(pattern):]
-        
-        # 還原例外情況的佔位符
-        for exception in exceptions:
-            temp_placeholder = f"__PLACEHOLDER_{int(time.time())}__"
-            text = text.replace(temp_placeholder, exception)
+    # 2. 處理上下文相關詞彙替換（單次掃描）
+    text = context_rules.apply(text)
     
     # 3. 修正標點符號和格式
     # 移除連續重複的句號
@@ -119,18 +60,8 @@ def fix_text(text):
     text = re.sub(r'([\u4e00-\u9fff])([a-zA-Z0-9])', r'\1 \2', text)
     text = re.sub(r'([a-zA-Z0-9])([\u4e00-\u9fff])', r'\1 \2', text)
     
-    # 修正連續重複的片段（超過3個相同詞組重複）
-    words = re.findall(r'[\u4e00-\u9fff]+', text)  # 找出所有中文詞組
-    for word in set(words):
-        if len(word) >= 3:  # 只檢查長度大於等於3的詞組
-            pattern = f"({word})" + r"(\s*\1){2,}"  # 匹配連續重複3次以上的詞組
-            text = re.sub(pattern, r"\1", text)
-    
-    # 去除重複短句
-    sentences = re.split(r'[。！？]', text)
-    for i in range(len(sentences) - 1):
-        if sentences[i] and sentences[i] == sentences[i+1]:
-            text = text.replace(f"{sentences[i]}。{sentences[i]}。", f"{sentences[i]}。")
+    # 修正連續重複的片段（超過3個相同詞組重複）並去除重複短句（單次掃描）
+    text = collapse_repetitions(text)
     
     # 4. 結構化文本（依據標點符號和邏輯分段）
     
@@ -212,6 +143,49 @@ def fix_text(text):
     
     return formatted_text
 
+def compute_hash(content):
+    """計算文本內容的 SHA-256"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def rules_version():
+    """目前修正規則的版本：fix_text 版本、專有名詞詞典與上下文規則任一改變都會不同"""
+    context_hash = compute_hash(json.dumps(CONTEXT_SPECIFIC_TERMS, ensure_ascii=False, sort_keys=True))[:12]
+    return f"{FIX_TEXT_VERSION}:{proper_nouns.version}:{context_hash}"
+
+def atomic_write(file_path, content):
+    """先寫入同目錄的臨時文件再改名，中斷時不會留下寫到一半的文件"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.md')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def fix_file(file_path):
+    """讀取、修正並（有變化時）寫回單個文件
+
+    Args:
+        file_path (str): 文件路徑
+
+    Returns:
+        tuple: (內容是否有變化, 處理後內容的雜湊)
+    """
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        content = f.read()
+
+    # fix_text 已先替換較長的系列詞彙（如「關西聊天室」），剩下的才套用批次專用的替換
+    fixed_content = batch_only_terms.replace(fix_text(content))
+
+    # 如果內容有變化，才寫回文件
+    if content != fixed_content:
+        atomic_write(file_path, fixed_content)
+        return True, compute_hash(fixed_content)
+    return False, compute_hash(content)
+
 def process_file(file_path):
     """處理單個文件
     
@@ -222,33 +196,56 @@ def process_file(file_path):
         bool: 處理是否成功
     """
     try:
-        # 讀取文件內容
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 修正文本
-        fixed_content = fix_text(content)
-        
-        # 如果內容有變化，才寫回文件
-        if content != fixed_content:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(fixed_content)
+        changed, _ = fix_file(file_path)
+        if changed:
             logger.info(f"已修正文件: {file_path}")
-            return True
         else:
             logger.info(f"文件無需修正: {file_path}")
-            return False
+        return changed
     
     except Exception as e:
         logger.error(f"處理文件時出錯 {file_path}: {str(e)}")
         return False
 
-def process_directory(directory, recursive=True):
+def _fix_file_worker(file_path):
+    """行程池中執行的任務，錯誤以結果返回，由主行程統一記錄"""
+    try:
+        changed, content_hash = fix_file(file_path)
+        return file_path, changed, content_hash, None
+    except Exception as e:
+        return file_path, False, None, str(e)
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_unchanged(file_path, entry, version):
+    """依清單判斷文件自上次處理後是否未變更
+
+    先比對修改時間與大小（不需讀取文件），不同時再比對內容雜湊。
+    """
+    if not entry or entry.get('rules') != version:
+        return False
+    stat = os.stat(file_path)
+    if entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+        return True
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        return compute_hash(f.read()) == entry.get('hash')
+
+def process_directory(directory, recursive=True, jobs=1, force=False):
     """處理整個目錄下的所有 .md 文件
     
+    以行程池並行處理；目錄中的清單文件記錄每個文件處理後的內容雜湊與規則版本，
+    下次執行時跳過內容與規則都沒有變化的文件。
+
     Args:
         directory (str): 目錄路徑
         recursive (bool): 是否遞歸處理子目錄
+        jobs (int): 並行行程數
+        force (bool): 忽略清單，重新處理所有文件
         
     Returns:
         tuple: (成功數, 總數)
@@ -262,18 +259,67 @@ def process_directory(directory, recursive=True):
     total_count = len(files)
     
     logger.info(f"找到 {total_count} 個 .md 文件需要處理")
-    
-    for file_path in files:
-        if process_file(file_path):
-            success_count += 1
+
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    manifest = {} if force else load_manifest(manifest_path)
+    version = rules_version()
+
+    def relative(file_path):
+        return os.path.relpath(file_path, directory).replace(os.sep, '/')
+
+    pending = [path for path in files if not is_unchanged(path, manifest.get(relative(path)), version)]
+    logger.info(f"其中 {total_count - len(pending)} 個文件自上次處理後未變更，已略過")
+
+    if jobs > 1 and len(pending) > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(_fix_file_worker, pending, chunksize=max(1, len(pending) // (jobs * 4)))
+    else:
+        executor = None
+        results = map(_fix_file_worker, pending)
+
+    try:
+        for file_path, changed, content_hash, error in results:
+            if error is not None:
+                logger.error(f"處理文件時出錯 {file_path}: {error}")
+                manifest.pop(relative(file_path), None)
+                continue
+            if changed:
+                success_count += 1
+                logger.info(f"已修正文件: {file_path}")
+            stat = os.stat(file_path)
+            manifest[relative(file_path)] = {
+                'hash': content_hash,
+                'rules': version,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size
+            }
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        # 只保留仍存在的文件，並以原子方式寫入清單
+        existing = {relative(path) for path in files}
+        manifest = {key: value for key, value in manifest.items() if key in existing}
+        atomic_write(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2))
     
     return success_count, total_count
 
 def main():
+    # 設置日誌（只在命令列執行時設定，被其他模組匯入時沿用呼叫端的設定）
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('fix_transcripts.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
     parser = argparse.ArgumentParser(description='修正轉錄文件中的錯誤')
     parser.add_argument('--dir', type=str, default='transcripts', help='需要處理的目錄')
     parser.add_argument('--file', type=str, help='單個需要處理的文件')
     parser.add_argument('--no-recursive', action='store_true', help='不遞歸處理子目錄')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='並行處理的行程數')
+    parser.add_argument('--force', action='store_true', help='忽略增量清單，重新處理所有文件')
     
     args = parser.parse_args()
     
@@ -292,7 +338,7 @@ def main():
         # 處理目錄
         dir_path = os.path.join(base_dir, args.dir)
         if os.path.exists(dir_path) and os.path.isdir(dir_path):
-            success, total = process_directory(dir_path, not args.no_recursive)
+            success, total = process_directory(dir_path, not args.no_recursive, args.jobs, args.force)
             logger.info(f"處理完成! 成功: {success}/{total}")
         else:
             logger.error(f"目錄不存在: {dir_path}")
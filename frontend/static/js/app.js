@@ -5,6 +5,7 @@ function App() {
     const [isLoading, setIsLoading] = React.useState(false);
     const [progress, setProgress] = React.useState(0);
     const [progressMessage, setProgressMessage] = React.useState('');
+    const [partialSegments, setPartialSegments] = React.useState([]);
     const progressEventSource = React.useRef(null);
 
     // 監控進度狀態變化
@@ -20,11 +21,6 @@ function App() {
         setProgressMessage('');
 
         for (const file of uploadedFiles) {
-            if (file.size > 40 * 1024 * 1024) {
-                setError('檔案大小不能超過 40MB');
-                return;
-            }
-
             if (!file.type.match('audio.*')) {
                 setError('請上傳音頻檔案');
                 return;
@@ -35,6 +31,11 @@ function App() {
     };
 
     const uploadFiles = async (files) => {
+        // 多個檔案時以一個批次排程，由伺服器決定順序並彙總進度
+        if (files.length > 1) {
+            await transcribeBatch(files);
+            return;
+        }
         for (const file of files) {
             try {
                 setIsLoading(true);
@@ -42,30 +43,136 @@ function App() {
                 setProgress(0);
                 setProgressMessage('正在上傳檔案...');
 
-                const formData = new FormData();
-                formData.append('file', file);
-
                 // 保留原始檔名，包括中文字符
                 const originalFilename = file.name;
-                formData.append('original_filename', originalFilename);
+                const data = await uploadInChunks(file);
+                await transcribeFile(data.filename, originalFilename);
+            } catch (err) {
+                console.error('Upload error:', err);
+                setError(err.message || '上傳過程中發生錯誤');
+                setIsLoading(false);
+            }
+        }
+    };
+
+    // 分塊上傳：每塊失敗時向伺服器查詢已接收的位置後續傳
+    const uploadInChunks = async (file) => {
+        const createResponse = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        let status = await createResponse.json();
+        if (!createResponse.ok) {
+            throw new Error(status.error || '上傳失敗');
+        }
 
-                const response = await fetch('/api/upload', {
-                    method: 'POST',
-                    body: formData,
+        const uploadUrl = `/api/uploads/${status.upload_id}`;
+        const chunkSize = status.chunk_size;
+        let offset = status.offset;
+        let retries = 0;
+        while (offset < file.size) {
+            try {
+                const response = await fetch(uploadUrl, {
+                    method: 'PATCH',
+                    headers: {
+                        'Content-Type': 'application/offset+octet-stream',
+                        'Upload-Offset': String(offset),
+                    },
+                    body: file.slice(offset, offset + chunkSize),
                 });
+                status = await response.json();
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(status.error || '上傳失敗');
+                }
+                offset = Number(status.offset);
+                retries = 0;
+                setProgressMessage(`正在上傳檔案...（${Math.floor(offset * 100 / file.size)}%）`);
+            } catch (err) {
+                if (++retries > 5) {
+                    throw err;
+                }
+                console.warn('Chunk upload failed, resuming:', err);
+                await new Promise((resolve) => setTimeout(resolve, 1000 * retries));
+                const head = await fetch(uploadUrl, { method: 'HEAD' });
+                offset = Number(head.headers.get('Upload-Offset'));
+            }
+        }
+        return status;
+    };
+
+    const transcribeBatch = async (files) => {
+        try {
+            setIsLoading(true);
+            setError('');
+            setProgress(0);
+            setTranscribedText('');
 
-                const data = await response.json();
-                if (response.ok) {
-                    await transcribeFile(data.filename, originalFilename);
-                } else {
-                    setError(data.error || '上傳失敗');
+            const filenames = [];
+            for (const [index, file] of files.entries()) {
+                setProgressMessage(`正在上傳第 ${index + 1}/${files.length} 個檔案...`);
+                const data = await uploadInChunks(file);
+                filenames.push(data.filename);
+            }
+
+            const response = await fetch('/api/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ files: filenames, order: 'shortest' }),
+            });
+            const batch = await response.json();
+            if (!response.ok) {
+                throw new Error(batch.error || '批次建立失敗');
+            }
+
+            if (progressEventSource.current) {
+                progressEventSource.current.close();
+            }
+            const eventSource = new EventSource(`/api/progress/${batch.batch_id}`);
+            progressEventSource.current = eventSource;
+
+            eventSource.onmessage = async (event) => {
+                const summary = JSON.parse(event.data);
+                setProgress(Number(summary.progress) || 0);
+                const eta = summary.eta_seconds ? `，預計剩餘 ${Math.ceil(summary.eta_seconds / 60)} 分鐘` : '';
+                setProgressMessage(`${summary.message}${eta}`);
+
+                // 批次結束：completed（至少一個檔案成功）、error（沒有檔案成功）或 cancelled
+                if (summary.status === 'completed' || summary.status === 'error' || summary.status === 'cancelled') {
+                    eventSource.close();
+                    if (summary.status === 'error') {
+                        setError('批次中沒有檔案轉錄成功，各檔案狀態如下');
+                    }
+                    // 依批次順序取回每個檔案的轉錄稿
+                    const sections = [];
+                    for (const file of summary.files) {
+                        if (file.status !== 'completed') {
+                            sections.push(`## ${file.filename}\n\n（${file.status === 'error' ? '轉錄失敗' : '已取消'}）`);
+                            continue;
+                        }
+                        const transcript = await (await fetch(`/api/jobs/${file.task_id}/transcript`)).json();
+                        sections.push(`## ${file.filename}\n\n${transcript.text || ''}`);
+                    }
+                    setTranscribedText(sections.join('\n\n'));
                     setIsLoading(false);
                 }
-            } catch (err) {
-                console.error('Upload error:', err);
-                setError('上傳過程中發生錯誤');
+            };
+
+            eventSource.onerror = (err) => {
+                if (eventSource.readyState === EventSource.CONNECTING) {
+                    console.warn('EventSource reconnecting:', err);
+                    return;
+                }
+                eventSource.close();
+                setError('進度更新連接已斷開，請重新嘗試');
                 setIsLoading(false);
-            }
+            };
+        } catch (err) {
+            console.error('Batch error:', err);
+            setError(err.message || '批次轉錄過程中發生錯誤');
+            setIsLoading(false);
+            setProgress(0);
+            setProgressMessage('');
         }
     };
 
@@ -96,6 +203,19 @@ function App() {
                 // 開始監聽進度
                 const eventSource = new EventSource(`/api/progress/${data.task_id}`);
                 progressEventSource.current = eventSource;
+                setPartialSegments([]);
+
+                // 語音識別過程中逐段推送的部分結果（平行轉錄時可能亂序，依開始時間排序）
+                eventSource.addEventListener('segment', (event) => {
+                    try {
+                        const segment = JSON.parse(event.data);
+                        setPartialSegments((segments) =>
+                            [...segments, segment].sort((a, b) => a.start - b.start)
+                        );
+                    } catch (err) {
+                        console.error('Error parsing segment:', err);
+                    }
+                });
 
                 eventSource.onmessage = (event) => {
                     try {
@@ -111,16 +231,33 @@ function App() {
                                 setProgress(progressValue);
                             }
                             
-                            if (progress.message) {
+                            if (progress.status === 'queued' && progress.position) {
+                                setProgressMessage(`已加入佇列，排在第 ${progress.position} 位...`);
+                            } else if (progress.message) {
                                 setProgressMessage(progress.message);
                             }
 
                             if (progress.status === 'completed') {
                                 eventSource.close();
-                                setTranscribedText(progress.text || '');
+                                // 全文存在伺服器磁碟上，完成後再另外取得
+                                fetch(progress.transcript_url)
+                                    .then((res) => res.json())
+                                    .then((transcript) => {
+                                        setTranscribedText(transcript.text || '');
+                                        setPartialSegments([]);
+                                    })
+                                    .catch((err) => {
+                                        console.error('Error fetching transcript:', err);
+                                        setError('無法取得轉錄結果');
+                                    });
                                 setIsLoading(false);
                                 setProgress(100);
                                 setProgressMessage('轉錄完成！');
+                            } else if (progress.status === 'cancelled') {
+                                eventSource.close();
+                                setIsLoading(false);
+                                setProgress(0);
+                                setProgressMessage(progress.message || '任務已取消');
                             } else if (progress.status === 'error') {
                                 eventSource.close();
                                 setError(progress.message || '轉錄過程中發生錯誤');
@@ -136,6 +273,11 @@ function App() {
                 };
 
                 eventSource.onerror = (err) => {
+                    // 連線中斷時瀏覽器會帶著 Last-Event-ID 自動重連，伺服器從斷線處續傳
+                    if (eventSource.readyState === EventSource.CONNECTING) {
+                        console.warn('EventSource reconnecting:', err);
+                        return;
+                    }
                     console.error('EventSource error:', err);
                     eventSource.close();
                     setError('進度更新連接已斷開，請重新嘗試');
@@ -175,13 +317,14 @@ function App() {
                 <div className="mb-4">
                     <input
                         type="file"
+                        multiple
                         onChange={handleFileChange}
                         accept=".mp3,.wav,.m4a,.ogg,.flac"
                         className="block w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-blue-50 file:text-blue-700 hover:file:bg-blue-100"
                         disabled={isLoading}
                     />
                     <p className="text-sm text-gray-500 mt-1">
-                        支援的格式：MP3, WAV, M4A, OGG, FLAC（最大 40MB）
+                        支援的格式：MP3, WAV, M4A, OGG, FLAC（支援大型檔案，連線中斷時自動續傳）
                     </p>
                 </div>
 
@@ -221,6 +364,15 @@ function App() {
                     </div>
                 )}
 
+                {isLoading && partialSegments.length > 0 && (
+                    <div className="mt-8">
+                        <h2 className="text-2xl font-bold mb-4">即時轉錄（尚未校正）：</h2>
+                        <div className="bg-gray-50 p-4 rounded-lg whitespace-pre-wrap text-gray-600">
+                            {partialSegments.map((segment) => segment.text).join('')}
+                        </div>
+                    </div>
+                )}
+
                 {transcribedText && (
                     <div className="mt-8">
                         <h2 className="text-2xl font-bold mb-4">轉錄結果：</h2>
@@ -0,0 +1,333 @@
+import time
+import uuid
+import logging
+import queue
+import threading
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 任務狀態
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """任務在執行途中被取消"""
+
+
+class Job:
+    """一個排隊等待轉錄的任務"""
+
+    def __init__(self, filename, params=None, job_id=None, created_at=None, cost=None, deferred=False):
+        self.id = job_id or uuid.uuid4().hex
+        self.filename = filename
+        self.params = params or {}
+        self.cost = cost  # 估計的工作量（音頻秒數），未知為 None
+        self.deferred = deferred  # 排在一般任務之後的長任務
+        self.state = JOB_QUEUED
+        self.error = None
+        self.result = None
+        self.created_at = created_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    def raise_if_cancelled(self):
+        """在各處理階段之間呼叫，若已要求取消則中止任務"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+
+class Stage:
+    """流水線中的一個處理階段
+
+    handler 接收 (job, 上一階段的輸出)，返回值交給下一階段；最後一個階段的返回值為任務結果。
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=1):
+        """
+        Args:
+            name (str): 階段名稱（用於執行緒名稱與指標）
+            handler (callable): 處理函數，接收 (Job, payload)
+            workers (int): 此階段的工作執行緒數量
+            queue_size (int): 此階段輸入佇列的容量（第一個階段使用任務佇列，不受此限）
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.queue = None
+        self.busy = 0
+        self.blocked = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+
+class JobQueue:
+    """轉錄任務佇列，以多個階段組成的流水線執行
+
+    HTTP 請求只負責把任務放進佇列並立即返回任務 ID，
+    實際的預處理、轉錄與文字改善都由背景工作執行緒完成。
+    各階段有自己的工作執行緒，階段之間以有容量上限的佇列連接：
+    下一階段忙碌時上一階段會等待（背壓），同時在不同階段的任務可以重疊執行。
+    """
+
+    def __init__(self, handler=None, num_workers=1, on_change=None, forget_finished=False, stages=None):
+        """
+        Args:
+            handler (callable): 只有單一階段時處理整個任務的函數，接收 Job 物件
+            num_workers (int): 單一階段時的工作執行緒數量
+            on_change (callable): 任務加入佇列或狀態改變後呼叫，接收 Job 物件（如寫入資料庫）
+            forget_finished (bool): 任務結束後不再保留在記憶體中（由 on_change 負責保存）
+            stages (list): 依序執行的 Stage；提供時忽略 handler 與 num_workers
+        """
+        if stages is None:
+            stages = [Stage('transcribe', lambda job, payload: handler(job), num_workers)]
+        self.stages = stages
+        for stage in self.stages[1:]:
+            stage.queue = queue.Queue(maxsize=stage.queue_size)
+        self.on_change = on_change
+        self.forget_finished = forget_finished
+        self._jobs = {}
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._started_at = None
+
+    def start(self):
+        """啟動各階段的工作執行緒（重複呼叫不會重複啟動）"""
+        with self._cond:
+            if self._workers:
+                return
+            self._started_at = time.monotonic()
+            for index, stage in enumerate(self.stages):
+                for i in range(stage.workers):
+                    worker = threading.Thread(
+                        target=self._worker_loop,
+                        args=(index,),
+                        name=f'{stage.name}-worker-{i + 1}',
+                        daemon=True
+                    )
+                    worker.start()
+                    self._workers.append(worker)
+        logger.info("已啟動轉錄流水線：" + "，".join(f"{stage.name} {stage.workers} 個執行緒" for stage in self.stages))
+
+    def metrics(self):
+        """各階段的佇列深度、忙碌執行緒數與使用率
+
+        使用率為啟動以來處理時間占（執行緒數 × 運行時間）的比例；
+        blocked 為處理完成但因下一階段佇列已滿而等待的執行緒數。
+        """
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        result = []
+        for index, stage in enumerate(self.stages):
+            with stage.lock:
+                busy_seconds = stage.busy_seconds
+                data = {
+                    'name': stage.name,
+                    'workers': stage.workers,
+                    'busy': stage.busy,
+                    'blocked': stage.blocked,
+                    'processed': stage.processed,
+                    'failed': stage.failed,
+                }
+            if index == 0:
+                with self._cond:
+                    data['queue_depth'] = len(self._pending)
+                data['queue_capacity'] = None
+            else:
+                data['queue_depth'] = stage.queue.qsize()
+                data['queue_capacity'] = stage.queue_size
+            data['utilization'] = round(busy_seconds / (stage.workers * uptime), 3) if uptime else 0.0
+            result.append(data)
+        return result
+
+    def _notify_change(self, job):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                logger.error(f"記錄任務狀態失敗 {job.id}: {str(e)}")
+        if self.forget_finished and job.state in FINISHED_STATES:
+            with self._cond:
+                self._jobs.pop(job.id, None)
+
+    def submit(self, filename, params=None, job_id=None, created_at=None, cost=None, defer=False):
+        """將新任務加入佇列
+
+        Args:
+            filename (str): 上傳目錄中的檔名
+            params (dict): 任務參數
+            job_id (str): 沿用的任務 ID（重新啟動後恢復未完成的任務時使用）
+            created_at (float): 沿用的建立時間
+            cost (float): 估計的工作量（音頻秒數），用於推估等待時間
+            defer (bool): 長任務排在佇列最後；一般任務會排到已排隊的長任務之前，不必等待它們
+
+        Returns:
+            Job: 新建立的任務
+        """
+        self.start()
+        job = Job(filename, params, job_id=job_id, created_at=created_at, cost=cost, deferred=defer)
+        with self._cond:
+            self._jobs[job.id] = job
+            if defer:
+                self._pending.append(job)
+            else:
+                index = next((i for i, queued in enumerate(self._pending) if queued.deferred), len(self._pending))
+                self._pending.insert(index, job)
+            self._cond.notify()
+        logger.info(f"任務已加入佇列: {job.id} ({filename})，目前排隊數: {len(self._pending)}")
+        self._notify_change(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def position(self, job_id):
+        """返回任務在佇列中的位置（從 1 開始），不在排隊中則返回 0"""
+        with self._cond:
+            for index, job in enumerate(self._pending):
+                if job.id == job_id:
+                    return index + 1
+        return 0
+
+    def cost_ahead(self, job_id):
+        """排在任務之前（含執行中）的任務的估計工作量總和，工作量未知的任務不計入
+
+        Returns:
+            float: 音頻秒數；任務不在佇列中時為 None
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != JOB_QUEUED:
+                return None
+            total = sum(other.cost or 0.0 for other in self._jobs.values() if other.state == JOB_RUNNING)
+            for queued in self._pending:
+                if queued.id == job_id:
+                    break
+                total += queued.cost or 0.0
+            return total
+
+    def cancel(self, job_id):
+        """取消任務
+
+        排隊中的任務會直接移出佇列；執行中的任務則在下一個處理階段之間中止。
+
+        Returns:
+            bool: 是否成功要求取消
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return False
+            job._cancel_event.set()
+            if job.state == JOB_QUEUED:
+                self._pending.remove(job)
+                job.state = JOB_CANCELLED
+                job.finished_at = time.time()
+        logger.info(f"已要求取消任務: {job_id}")
+        if job.state == JOB_CANCELLED:
+            self._notify_change(job)
+        return True
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        self._notify_change(job)
+
+    def _next_job(self, index):
+        """取得此階段要處理的下一個任務與上一階段的輸出"""
+        if index > 0:
+            return self.stages[index].queue.get()
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            job = self._pending.popleft()
+            job.state = JOB_RUNNING
+            job.started_at = time.time()
+        self._notify_change(job)
+        return job, None
+
+    def _worker_loop(self, index):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while True:
+            job, payload = self._next_job(index)
+
+            with stage.lock:
+                stage.busy += 1
+            started = time.perf_counter()
+            try:
+                job.raise_if_cancelled()
+                output = stage.handler(job, payload)
+            except JobCancelled:
+                logger.info(f"任務已取消: {job.id}")
+                self._finish(job, JOB_CANCELLED)
+                continue
+            except Exception as e:
+                logger.error(f"任務執行失敗 {job.id}（{stage.name} 階段）: {str(e)}")
+                logger.error(traceback.format_exc())
+                with stage.lock:
+                    stage.failed += 1
+                self._finish(job, JOB_FAILED, str(e))
+                continue
+            finally:
+                with stage.lock:
+                    stage.busy -= 1
+                    stage.processed += 1
+                    stage.busy_seconds += time.perf_counter() - started
+
+            if is_last:
+                job.result = output
+                self._finish(job, JOB_DONE)
+            else:
+                # 下一階段的佇列已滿時在此等待，避免上游無限制地超前
+                next_stage = self.stages[index + 1]
+                with stage.lock:
+                    stage.blocked += 1
+                next_stage.queue.put((job, output))
+                with stage.lock:
+                    stage.blocked -= 1
+
+
+class ThroughputEstimate:
+    """以指數加權移動平均估計處理速度（每秒音頻所需的處理秒數），用於推估排隊任務的等待時間"""
+
+    def __init__(self, alpha=0.3):
+        """
+        Args:
+            alpha (float): 新量測值的權重
+        """
+        self.alpha = alpha
+        self.seconds_per_audio_second = None
+        self._lock = threading.Lock()
+
+    def observe(self, audio_seconds, elapsed_seconds):
+        if not audio_seconds or audio_seconds <= 0:
+            return
+        ratio = elapsed_seconds / audio_seconds
+        with self._lock:
+            if self.seconds_per_audio_second is None:
+                self.seconds_per_audio_second = ratio
+            else:
+                self.seconds_per_audio_second += self.alpha * (ratio - self.seconds_per_audio_second)
+
+    def eta(self, audio_seconds, workers=1):
+        """處理 audio_seconds 秒音頻的預估秒數，尚無量測值時為 None"""
+        if self.seconds_per_audio_second is None or audio_seconds is None:
+            return None
+        return audio_seconds * self.seconds_per_audio_second / max(1, workers)
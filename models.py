@@ -0,0 +1,287 @@
+import gc
+import os
+import time
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+
+try:
+    import psutil
+except ImportError:  # psutil 為選用依賴，沒有時只依模型估計大小控管
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# 可供選擇的 Whisper 模型
+AVAILABLE_MODELS = ('tiny', 'base', 'small', 'medium')
+
+# 各模型載入後約佔用的記憶體（MB，fp32 權重）
+MODEL_MEMORY_MB = {
+    'tiny': 150,
+    'base': 300,
+    'small': 1000,
+    'medium': 3000,
+}
+
+# 模型精度：fp32 為 Whisper 原始權重；int8 以動態量化執行 Linear 層（僅限 CPU）
+PRECISION_FP32 = 'fp32'
+PRECISION_INT8 = 'int8'
+PRECISIONS = (PRECISION_FP32, PRECISION_INT8)
+
+# int8 模型佔用的記憶體約為 fp32 的比例（詞嵌入與卷積層仍為 fp32）
+INT8_MEMORY_RATIO = 0.4
+
+# 系統可用記憶體低於此值時，載入新模型前先卸載最久未用的模型
+MIN_AVAILABLE_MEMORY_MB = 1024
+
+
+_torch_configured = False
+_torch_config_lock = threading.Lock()
+
+
+def configure_torch_threads(threads=None, interop_threads=None):
+    """設定 torch 的運算子內與運算子間執行緒數（整個行程只設定一次）
+
+    Args:
+        threads (int): 單個運算使用的執行緒數，None 或 0 使用 torch 預設值（CPU 核心數）
+        interop_threads (int): 可同時執行的運算數，None 或 0 使用 torch 預設值
+    """
+    global _torch_configured
+    with _torch_config_lock:
+        if _torch_configured:
+            return
+        _torch_configured = True
+        import torch
+
+        if threads:
+            torch.set_num_threads(int(threads))
+        if interop_threads:
+            try:
+                torch.set_num_interop_threads(int(interop_threads))
+            except RuntimeError as e:
+                # 已經執行過平行運算後就不能再更改
+                logger.warning(f"無法設定 torch 運算子間執行緒數: {str(e)}")
+        logger.info(f"torch 執行緒數: {torch.get_num_threads()}，運算子間執行緒數: {torch.get_num_interop_threads()}")
+
+
+def quantize_model(model):
+    """以動態 int8 量化模型中的 Linear 層
+
+    Whisper 的 Linear 是 torch.nn.Linear 的子類別（為了在 fp16 時轉換權重型別），
+    quantize_dynamic 只比對確切的類別，因此先換回一般的 nn.Linear 再量化。
+
+    Args:
+        model: 在 CPU 上的 fp32 Whisper 模型
+
+    Returns:
+        量化後的模型
+    """
+    import torch
+
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(parent, child_name, linear)
+
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_cache_path(cache_dir, name):
+    """量化模型快取文件的路徑（依 torch 與 whisper 版本區分，版本更新後自動重新量化）"""
+    import torch
+    import whisper
+
+    version = f"torch{torch.__version__}-whisper{getattr(whisper, '__version__', 'unknown')}"
+    safe_version = ''.join(c if c.isalnum() or c in '.-' else '_' for c in version)
+    return os.path.join(cache_dir, f'whisper-{name}-int8-{safe_version}.pt')
+
+
+def load_whisper_model(name, precision=PRECISION_FP32, download_root=None, cache_dir=None):
+    """載入 Whisper 模型
+
+    int8 模型量化一次後存入 cache_dir，之後直接載入量化後的權重，不需要每次啟動都重新量化。
+
+    Args:
+        name (str): 模型名稱
+        precision (str): fp32 或 int8
+        download_root (str): 原始模型下載目錄，None 使用 Whisper 預設位置
+        cache_dir (str): 量化模型的快取目錄，None 表示不快取
+
+    Returns:
+        Whisper 模型
+    """
+    import torch
+    import whisper  # 延遲匯入，避免啟動時載入 torch
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"不支援的模型精度: {precision}")
+    if precision == PRECISION_FP32:
+        return whisper.load_model(name, download_root=download_root)
+
+    cache_path = quantized_cache_path(cache_dir, name) if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            try:
+                model = torch.load(cache_path, map_location='cpu', weights_only=False)
+            except TypeError:  # 舊版 torch 沒有 weights_only 參數
+                model = torch.load(cache_path, map_location='cpu')
+            logger.info(f"已從快取載入 int8 模型: {cache_path}")
+            return model
+        except Exception as e:
+            logger.warning(f"讀取量化模型快取失敗，重新量化: {str(e)}")
+
+    start = time.perf_counter()
+    model = quantize_model(whisper.load_model(name, device='cpu', download_root=download_root))
+    logger.info(f"Whisper 模型 {name} 已量化為 int8，耗時 {time.perf_counter() - start:.1f} 秒")
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f'{cache_path}.{os.getpid()}.tmp'
+            torch.save(model, temp_path)
+            os.replace(temp_path, cache_path)
+            logger.info(f"量化模型已寫入快取: {cache_path}")
+        except Exception as e:
+            logger.warning(f"寫入量化模型快取失敗: {str(e)}")
+    return model
+
+
+class LoadedModel:
+    """已載入的模型與其解碼鎖（Whisper 模型不支援多執行緒同時解碼）"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.lock = threading.Lock()
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """延遲載入的 Whisper 模型池
+
+    模型在第一次使用時才載入；同時保留的模型數量與估計記憶體有上限，
+    超過上限或系統記憶體不足時，依最近使用順序卸載最舊的模型（LRU）。
+    """
+
+    def __init__(self, max_models=2, memory_budget_mb=None, download_root=None,
+                 precision=PRECISION_FP32, cache_dir=None, torch_threads=None, interop_threads=None):
+        """
+        Args:
+            max_models (int): 同時保留的模型數量上限
+            memory_budget_mb (int): 所有已載入模型的估計記憶體上限，None 表示不限制
+            download_root (str): 模型下載目錄，None 使用 Whisper 預設位置
+            precision (str): 模型精度，fp32 或 int8（CPU 動態量化）
+            cache_dir (str): 量化模型的快取目錄
+            torch_threads (int): torch 運算子內執行緒數，None 使用預設值
+            interop_threads (int): torch 運算子間執行緒數，None 使用預設值
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"不支援的模型精度: {precision}")
+        self.max_models = max(1, int(max_models))
+        self.memory_budget_mb = memory_budget_mb
+        self.download_root = download_root
+        self.precision = precision
+        self.cache_dir = cache_dir
+        self.torch_threads = torch_threads
+        self.interop_threads = interop_threads
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def loaded(self):
+        """返回目前已載入的模型名稱（由舊到新）"""
+        with self._lock:
+            return list(self._models.keys())
+
+    def get(self, name):
+        """取得模型，必要時載入
+
+        Args:
+            name (str): 模型名稱
+
+        Returns:
+            LoadedModel: 已載入的模型
+        """
+        if name not in AVAILABLE_MODELS:
+            raise ValueError(f"不支援的模型: {name}")
+
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                return entry
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # 每個模型各自一把載入鎖，避免同時重複載入同一個模型
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    return entry
+                self._make_room(name)
+
+            entry = LoadedModel(name, self._load(name))
+            with self._lock:
+                self._models[name] = entry
+            return entry
+
+    def _load(self, name):
+        configure_torch_threads(self.torch_threads, self.interop_threads)
+        logger.info(f"正在載入 Whisper 模型 {name}（{self.precision}）...")
+        start = time.perf_counter()
+        model = load_whisper_model(name, self.precision, self.download_root, self.cache_dir)
+        logger.info(f"Whisper 模型 {name} 載入成功，耗時 {time.perf_counter() - start:.1f} 秒")
+        return model
+
+    def _make_room(self, name):
+        """在載入新模型前依 LRU 卸載舊模型（呼叫時需持有 self._lock）"""
+        needed_mb = self._model_memory_mb(name)
+        while self._models and (
+            len(self._models) >= self.max_models
+            or (self.memory_budget_mb is not None
+                and self._estimated_memory_mb() + needed_mb > self.memory_budget_mb)
+        ):
+            oldest, _ = self._models.popitem(last=False)
+            logger.info(f"為載入 {name} 卸載最久未用的 Whisper 模型 {oldest}")
+
+        # 系統記憶體吃緊時再多卸載一個（實際釋放要等使用中的轉錄結束）
+        if self._models and psutil is not None:
+            available_mb = psutil.virtual_memory().available / (1024 * 1024)
+            if available_mb < needed_mb + MIN_AVAILABLE_MEMORY_MB:
+                oldest, _ = self._models.popitem(last=False)
+                gc.collect()
+                logger.info(f"系統可用記憶體僅 {available_mb:.0f} MB，已卸載 Whisper 模型 {oldest}")
+
+    def _model_memory_mb(self, name):
+        ratio = INT8_MEMORY_RATIO if self.precision == PRECISION_INT8 else 1.0
+        return MODEL_MEMORY_MB.get(name, 0) * ratio
+
+    def _estimated_memory_mb(self):
+        return sum(self._model_memory_mb(name) for name in self._models)
+
+    def prewarm(self, names, wait_until=None):
+        """在背景執行緒中預先載入模型
+
+        Args:
+            names (list): 要預先載入的模型名稱
+            wait_until (callable): 開始載入前先呼叫（例如等待伺服器開始監聽）
+        """
+        def run():
+            if wait_until is not None:
+                wait_until()
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error(f"預先載入模型 {name} 失敗: {str(e)}")
+                    logger.error(traceback.format_exc())
+
+        thread = threading.Thread(target=run, name='model-prewarm', daemon=True)
+        thread.start()
+        return thread
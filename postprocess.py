@@ -0,0 +1,238 @@
+import re
+import time
+import random
+import logging
+import threading
+import traceback
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from text_rules import proper_nouns, context_rules
+from resources import get_converter
+
+logger = logging.getLogger(__name__)
+
+# 提示詞中包住待校正文本的標記（FakeGenerativeModel 依此取回原文）
+PROMPT_TEXT_MARKER = "以下是需要校正的文本："
+PROMPT_NOTES_MARKER = "請注意："
+
+
+class TokenBucket:
+    """執行緒安全的權杖桶限流器"""
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): 每秒補充的權杖數
+            capacity (float): 權杖桶容量（允許的瞬間突發量），預設為 max(1, rate)
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個權杖，不足時阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """指數退避加上完全隨機抖動（full jitter）的等待秒數"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class FakeGenerativeModel:
+    """模擬 Gemini 的本地替身，供離線測試與基準測試使用
+
+    generate_content 等待固定延遲後原樣返回提示詞中的待校正文本，
+    可設定失敗率以測試重試流程。
+    """
+
+    def __init__(self, latency=0.2, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+        time.sleep(self.latency)
+        if failed:
+            raise RuntimeError("模擬的 API 錯誤")
+        text = prompt.split(PROMPT_TEXT_MARKER, 1)[-1].split(PROMPT_NOTES_MARKER, 1)[0].strip()
+        return SimpleNamespace(text=text)
+
+
+def split_text(text, chunk_size):
+    """將文本分割成較小的塊，確保不會切斷句子"""
+    # 首先按句號分割
+    sentences = text.split('。')
+    chunks = []
+    current_chunk = []
+    current_size = 0
+
+    for sentence in sentences:
+        # 確保句子結尾有句號
+        sentence = sentence.strip() + '。' if sentence.strip() else ''
+        sentence_size = len(sentence)
+
+        if current_size + sentence_size > chunk_size and current_chunk:
+            # 當前塊已滿，保存並開始新的塊
+            chunks.append(''.join(current_chunk))
+            current_chunk = [sentence]
+            current_size = sentence_size
+        else:
+            current_chunk.append(sentence)
+            current_size += sentence_size
+
+    # 添加最後一個塊
+    if current_chunk:
+        chunks.append(''.join(current_chunk))
+
+    return chunks
+
+
+def build_prompt(chunk):
+    """建立校對用的提示詞"""
+    return f"""
+                    作為一個文字校對專家，請幫我修正以下繁體中文文本。你需要：
+
+                    1. 基本要求：
+                       - 修正所有錯別字
+                       - 改善文字的通順度
+                       - 保持原意不變
+                       - 維持繁體中文輸出
+
+                    2. 特別注意：
+                       - "觀西花園" 應該是 "關係花園"
+                       - "關西花園" 應該是 "關係花園"
+                       - "慧青" 應該是 "慧卿"
+                       - "關西聊天室" 應該是 "關係聊天室"
+                       - "心靈補夢網" 應該是 "心靈捕夢網"
+                       - 這些是特定名詞，請務必正確使用
+
+                    3. 格式要求：
+                       - 根據語意適當添加標點符號（逗號、句號、分號等）
+                       - 按照內容邏輯分段，每段表達一個完整的思想
+                       - 使用適當的段落間距來提高可讀性
+                       - 重要觀點可以使用破折號來強調
+                       - 對話或引述內容使用引號標示
+
+                    {PROMPT_TEXT_MARKER}
+                    {chunk}
+
+                    {PROMPT_NOTES_MARKER}
+                    1. 保持原文的語氣和風格
+                    2. 分段時要考慮上下文的連貫性
+                    3. 標點符號的使用要自然，不要過度
+                    4. 確保所有專有名詞的正確性
+                    5. 段落長度要適中，避免過長或過短
+                    """
+
+
+def apply_term_corrections(text):
+    """套用專有名詞與上下文相關詞彙的替換"""
+    # 檢查並修正特定名詞（單次掃描、最長匹配優先）
+    text = proper_nouns.replace(text)
+
+    # 處理上下文相關詞彙替換（單次掃描）
+    text = context_rules.apply(text)
+
+    return text
+
+
+def improve_chunk(model, chunk, index, total, max_retries=3, rate_limiter=None):
+    """以 LLM 校正單個文本塊，失敗時以指數退避重試，全部失敗則返回原文
+
+    繁簡轉換與詞彙替換留到合併後對全文做一次即可。
+    """
+    logger.info(f"處理第 {index + 1}/{total} 個文本塊")
+
+    for attempt in range(max_retries):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            response = model.generate_content(build_prompt(chunk))
+            if response.text:
+                return response.text
+            logger.warning(f"文本塊 {index + 1} 的 API 回應為空，嘗試重試 ({attempt + 1}/{max_retries})")
+        except Exception as e:
+            logger.error(f"處理文本塊 {index + 1} 時發生錯誤: {str(e)}")
+
+        if attempt < max_retries - 1:
+            time.sleep(backoff_delay(attempt))
+
+    logger.error(f"文本塊 {index + 1} 已達到最大重試次數，使用原始文本")
+    return chunk
+
+
+def improve_text_quality(text, model, max_retries=3, chunk_size=1500, max_concurrency=4, rate_limiter=None):
+    """使用 LLM 改善文字品質
+
+    各文本塊在執行緒池中並行送出，受 max_concurrency 與 rate_limiter 限制，
+    結果依原始順序合併。
+
+    Args:
+        text (str): 要改善的文字
+        model: 具有 generate_content(prompt) 方法的模型（如 genai.GenerativeModel）
+        max_retries (int): API 調用失敗時的最大重試次數
+        chunk_size (int): 每個文本塊的最大字符數
+        max_concurrency (int): 同時進行的請求數上限
+        rate_limiter (TokenBucket): 所有請求共用的限流器
+
+    Returns:
+        str: 改善後的文字
+    """
+    try:
+        logger.info("開始改善文字品質")
+
+        # 共用的繁簡轉換器
+        converter = get_converter('s2t')  # 簡體轉繁體
+
+        # 如果文本為空，直接返回
+        if not text.strip():
+            logger.warning("收到空文本，直接返回")
+            return text
+
+        # 分割文本為較小的塊
+        text_chunks = split_text(text, chunk_size)
+        total = len(text_chunks)
+
+        # 並行處理每個文本塊，executor.map 會保持原始順序
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, total))) as executor:
+            improved_chunks = list(executor.map(
+                lambda item: improve_chunk(model, item[1], item[0], total, max_retries, rate_limiter),
+                enumerate(text_chunks)
+            ))
+
+        # 合併所有改善後的文本塊
+        improved_text = ''.join(improved_chunks)
+
+        # 最後的清理和確保繁體輸出
+        improved_text = re.sub(r'\n{3,}', '\n\n', improved_text)  # 移除過多的空行
+        improved_text = improved_text.strip()
+
+        # 最終確保輸出為繁體中文
+        improved_text = converter.convert(improved_text)
+        improved_text = apply_term_corrections(improved_text)
+
+        logger.info("文字品質改善完成")
+        return improved_text
+
+    except Exception as e:
+        logger.error(f"改善文字品質時發生錯誤: {str(e)}")
+        logger.error(traceback.format_exc())
+        return text  # 如果發生錯誤，返回原始文字
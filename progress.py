@@ -0,0 +1,180 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 任務結束的狀態：推送後訂閱者即結束連線
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+# 每個任務最多保留的片段事件數，供斷線重連時補發
+MAX_EVENTS_PER_TASK = 5000
+
+
+class _Channel:
+    """單個任務的進度狀態、事件記錄與通知用的條件變數"""
+
+    def __init__(self):
+        self.state = {}
+        self.state_id = 0
+        self.events = deque(maxlen=MAX_EVENTS_PER_TASK)
+        self.finished_at = None
+        self.cond = threading.Condition()
+
+
+class ProgressHub:
+    """以發布/訂閱方式推送任務進度
+
+    每個任務有自己的條件變數，狀態改變時才喚醒該任務的訂閱者；
+    等待中的訂閱者不佔 CPU，只在心跳間隔到期時醒來一次。
+    事件帶有遞增編號，訂閱者可用 Last-Event-ID 從斷線處續傳。
+    """
+
+    def __init__(self, finished_ttl=600, cleanup_interval=60):
+        """
+        Args:
+            finished_ttl (float): 任務結束後保留進度的秒數
+            cleanup_interval (float): 清理過期任務的最短間隔（秒）
+        """
+        self.finished_ttl = finished_ttl
+        self.cleanup_interval = cleanup_interval
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._cleaned_at = time.monotonic()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """註冊狀態更新後呼叫的函數，接收 (task_id, 狀態複本)，如彙總批次進度"""
+        self._listeners.append(callback)
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def _channel(self, task_id, create=False):
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is None and create:
+                channel = self._channels[task_id] = _Channel()
+        if create:
+            self._cleanup()
+        return channel
+
+    def _cleanup(self):
+        """移除結束超過 finished_ttl 的任務"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._cleaned_at < self.cleanup_interval:
+                return
+            self._cleaned_at = now
+            expired = [
+                task_id for task_id, channel in self._channels.items()
+                if channel.finished_at is not None and now - channel.finished_at > self.finished_ttl
+            ]
+            for task_id in expired:
+                del self._channels[task_id]
+        if expired:
+            logger.info(f"已清理 {len(expired)} 個過期的任務進度")
+
+    def update(self, task_id, fields):
+        """更新任務狀態並通知訂閱者
+
+        Args:
+            task_id (str): 任務 ID
+            fields (dict): 要合併進狀態的欄位（status、progress、message 等）
+        """
+        channel = self._channel(task_id, create=True)
+        event_id = self._new_id()
+        with channel.cond:
+            channel.state.update(fields)
+            channel.state_id = event_id
+            if channel.state.get('status') in FINISHED_STATUSES:
+                channel.finished_at = time.monotonic()
+            state = dict(channel.state)
+            channel.cond.notify_all()
+        for callback in self._listeners:
+            try:
+                callback(task_id, state)
+            except Exception as e:
+                logger.error(f"進度監聽函數執行失敗: {str(e)}")
+
+    def create(self, task_id, fields):
+        """設定任務的初始狀態；若工作執行緒已先開始更新狀態則不覆寫"""
+        channel = self._channel(task_id, create=True)
+        event_id = self._new_id()
+        with channel.cond:
+            if channel.state:
+                return
+            channel.state.update(fields)
+            channel.state_id = event_id
+            channel.cond.notify_all()
+
+    def publish(self, task_id, event, data):
+        """發布一個附加事件（如逐段的部分轉錄結果），斷線重連時會依序補發"""
+        channel = self._channel(task_id, create=True)
+        event_id = self._new_id()
+        with channel.cond:
+            channel.events.append((event_id, event, data))
+            channel.cond.notify_all()
+
+    def get(self, task_id):
+        """取得任務目前狀態的複本，任務不存在時返回 None"""
+        channel = self._channel(task_id)
+        if channel is None:
+            return None
+        with channel.cond:
+            return dict(channel.state)
+
+    def subscribe(self, task_id, last_event_id=0, heartbeat=15, idle_timeout=600):
+        """依序產生任務的事件，任務結束或閒置過久時停止
+
+        每個產生的項目為 (事件編號, 事件名稱, 資料)；超過 heartbeat 秒沒有新事件時
+        產生 None，呼叫端可據此送出心跳。狀態以最新快照推送，中間的舊狀態不重送。
+
+        Args:
+            task_id (str): 任務 ID
+            last_event_id (int): 已收到的最後一個事件編號
+            heartbeat (float): 心跳間隔（秒）
+            idle_timeout (float): 沒有任何新事件時最多等待的秒數
+
+        Yields:
+            tuple: (事件編號, 事件名稱, 資料)，或心跳時為 None
+        """
+        channel = self._channel(task_id)
+        if channel is None:
+            return
+
+        last_id = last_event_id or 0
+        idle_since = time.monotonic()
+        while True:
+            with channel.cond:
+                pending = [item for item in channel.events if item[0] > last_id]
+                state = dict(channel.state) if channel.state_id > last_id else None
+                state_id = channel.state_id
+                if not pending and state is None:
+                    if channel.finished_at is not None:
+                        return  # 任務已結束且訂閱者已收到最後狀態
+                    channel.cond.wait(heartbeat)
+                    pending = [item for item in channel.events if item[0] > last_id]
+                    state = dict(channel.state) if channel.state_id > last_id else None
+                    state_id = channel.state_id
+
+            if not pending and state is None:
+                if time.monotonic() - idle_since > idle_timeout:
+                    logger.info(f"進度訂閱閒置過久，結束連線: {task_id}")
+                    return
+                yield None
+                continue
+
+            idle_since = time.monotonic()
+            for item in pending:
+                last_id = max(last_id, item[0])
+                yield item
+            if state is not None:
+                last_id = max(last_id, state_id)
+                yield state_id, 'progress', state
+                if state.get('status') in FINISHED_STATUSES:
+                    return
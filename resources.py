@@ -0,0 +1,165 @@
+import os
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# HTTP 連線池大小（每個主機保留的連線數，應不小於後處理的並行請求數）
+HTTP_POOL_SIZE = 16
+
+# 字典中的值以空白分隔多個候選時，取第一個
+_VALUE_SEPARATOR = ' '
+
+# trie 節點中存放轉換結果的鍵（單個字元不會與此衝突）
+_VALUE = ''
+
+_lock = threading.Lock()
+_converters = {}
+_http_session = None
+_gemini_configured_key = None
+_gemini_models = {}
+
+
+class TrieConverter:
+    """以 trie 做最長匹配的繁簡轉換器
+
+    讀取 opencc 套件內的設定與字典文件，與 OpenCC 相同地依轉換鏈逐段套用；
+    同一組（group）內的字典合併成一棵 trie，排在前面的字典優先。
+    整段文字由左至右掃描，每個位置取最長的詞條，不在任何詞條開頭的字元直接略過，
+    不需要像 opencc-python-reimplemented 一樣先切句再反覆嘗試各種長度的子字串。
+    """
+
+    def __init__(self, conversion='s2t'):
+        """
+        Args:
+            conversion (str): opencc 的轉換設定名稱（如 s2t、s2tw）
+        """
+        import opencc
+
+        package_dir = os.path.dirname(opencc.__file__)
+        with open(os.path.join(package_dir, 'config', f'{conversion}.json'), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        self.conversion = conversion
+        self._stages = []
+        for chain in config['conversion_chain']:
+            entry = chain['dict']
+            entries = entry['dicts'] if entry.get('type') == 'group' else [entry]
+            paths = [os.path.join(package_dir, 'dictionary', item['file']) for item in entries]
+            self._stages.append(self._build_trie(paths))
+
+    @staticmethod
+    def _build_trie(paths):
+        root = {}
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    key, _, value = line.rstrip('\n').partition('\t')
+                    if not key or not value:
+                        continue
+                    node = root
+                    for char in key:
+                        node = node.setdefault(char, {})
+                    # 同一組內排在前面的字典優先
+                    node.setdefault(_VALUE, value.split(_VALUE_SEPARATOR)[0])
+        return root
+
+    def convert(self, text):
+        for root in self._stages:
+            text = self._convert(text, root)
+        return text
+
+    @staticmethod
+    def _longest_match(text, index, root):
+        """從 index 開始的最長詞條，返回 (結束位置, 轉換結果)，沒有時結束位置為 0"""
+        node = root.get(text[index])
+        if node is None:
+            return 0, None
+        match_end = index + 1 if _VALUE in node else 0
+        match_value = node.get(_VALUE)
+        position = index + 1
+        length = len(text)
+        while position < length:
+            node = node.get(text[position])
+            if node is None:
+                break
+            position += 1
+            if _VALUE in node:
+                match_end = position
+                match_value = node[_VALUE]
+        return match_end, match_value
+
+    def _convert(self, text, root):
+        result = []
+        copied = 0
+        index = 0
+        length = len(text)
+        while index < length:
+            if text[index] not in root:
+                index += 1
+                continue
+            match_end, match_value = self._longest_match(text, index, root)
+            if not match_end:
+                index += 1
+                continue
+
+            # 詞條中間開始的另一個詞條更長時（如「那只」與「只不過」），改以較長的詞條為準，
+            # 與 OpenCC 優先採用最長詞條的結果一致；前面的字元逐字轉換
+            for start in range(index + 1, match_end):
+                end, _ = self._longest_match(text, start, root)
+                if end - start > match_end - index:
+                    node = root[text[index]]
+                    match_end, match_value = index + 1, node.get(_VALUE, text[index])
+                    break
+
+            result.append(text[copied:index])
+            result.append(match_value)
+            copied = index = match_end
+        result.append(text[copied:])
+        return ''.join(result)
+
+
+def get_converter(conversion='s2t'):
+    """取得共用的繁簡轉換器（第一次使用時才讀取字典，之後所有執行緒共用）"""
+    converter = _converters.get(conversion)
+    if converter is not None:
+        return converter
+    with _lock:
+        converter = _converters.get(conversion)
+        if converter is None:
+            converter = _converters[conversion] = TrieConverter(conversion)
+            logger.info(f"已載入繁簡轉換字典 {conversion}")
+        return converter
+
+
+def get_http_session():
+    """取得共用的 HTTP 連線池（requests.Session，keep-alive 連線可重複使用）"""
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_gemini_model(api_key, model_name='gemini-pro'):
+    """取得共用的 Gemini 模型物件（金鑰只設定一次，之後所有請求重用同一個用戶端）"""
+    global _gemini_configured_key
+    import google.generativeai as genai  # 延遲匯入，只有使用 Gemini 時才載入
+
+    with _lock:
+        if _gemini_configured_key != api_key:
+            genai.configure(api_key=api_key)
+            _gemini_configured_key = api_key
+            _gemini_models.clear()
+        model = _gemini_models.get(model_name)
+        if model is None:
+            model = _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return model
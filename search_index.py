@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""轉錄稿全文檢索索引
+
+以 SQLite FTS5 建立索引。FTS5 內建的 unicode61 分詞器會把一整段中文當成一個詞，
+因此寫入前先自行把中文切成重疊的二字詞（bigram），以空白分隔後交給 FTS5；
+查詢時以相同方式切分並組成片語查詢，任意長度的中文詞都能命中。
+全文也存放在索引中，搜尋與產生摘要都不需要讀取轉錄稿文件。
+
+用法：
+    python search_index.py --rebuild [--dir transcripts]
+    python search_index.py --query 關係花園
+"""
+
+import os
+import re
+import html
+import glob
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 中文（含擴充區與相容字）與其他文字的切分
+_CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+')
+_TOKEN_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[^\W_]+')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body UNINDEXED, title_tokens, body_tokens,
+    tokenize = 'unicode61'
+);
+"""
+
+# bm25 權重：title、body（不索引）、title_tokens、body_tokens
+BM25_WEIGHTS = (0.0, 0.0, 3.0, 1.0)
+
+# 摘要在命中位置前後保留的字數
+SNIPPET_RADIUS = 40
+
+
+def bigram_tokens(text):
+    """把文本切成 FTS5 可索引的詞：中文為重疊的二字詞，其他文字為小寫的單字
+
+    Returns:
+        list: 詞列表
+    """
+    tokens = []
+    for match in _TOKEN_RUN.finditer(text):
+        run = match.group()
+        if _CJK_RUN.fullmatch(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[index:index + 2] for index in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def build_match_query(query):
+    """把使用者輸入轉成 FTS5 查詢：每個詞組為一個片語，詞組之間為 AND
+
+    Returns:
+        str: FTS5 MATCH 查詢，輸入中沒有可搜尋的文字時為 None
+    """
+    phrases = []
+    terms = []
+    for term in query.split():
+        tokens = bigram_tokens(term)
+        if not tokens:
+            continue
+        terms.append(term)
+        if len(tokens) == 1 and len(tokens[0]) == 1 and _CJK_RUN.fullmatch(tokens[0]):
+            # 單個中文字：以前綴查詢比對所有以此字開頭的二字詞
+            phrases.append(f'"{tokens[0]}" *')
+        else:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    if not phrases:
+        return None
+    return ' AND '.join(phrases)
+
+
+def highlight_snippet(text, terms, radius=SNIPPET_RADIUS):
+    """從全文中取出第一個命中位置附近的摘要，並以 <mark> 標示所有命中的詞"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    center = min(positions) if positions else 0
+    start = max(0, center - radius)
+    end = min(len(text), center + radius * 2)
+    snippet = text[start:end].replace('\n', ' ')
+
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    parts = []
+    copied = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[copied:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        copied = match.end()
+    parts.append(html.escape(snippet[copied:]))
+    return ('…' if start > 0 else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+
+class SearchIndex:
+    """轉錄稿的全文檢索索引，依文件修改時間與大小增量更新"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): 索引資料庫路徑
+        """
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def add(self, path, text=None):
+        """加入或更新單個轉錄稿
+
+        Args:
+            path (str): 轉錄稿路徑（作為文件的唯一鍵）
+            text (str): 轉錄稿內容，未提供時從文件讀取
+        """
+        if text is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        stat = os.stat(path)
+        title = os.path.splitext(os.path.basename(path))[0]
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                row = connection.execute('SELECT id FROM documents WHERE path = ?', (path,)).fetchone()
+                if row is not None:
+                    connection.execute('DELETE FROM documents_fts WHERE rowid = ?', (row['id'],))
+                    connection.execute(
+                        'UPDATE documents SET mtime_ns = ?, size = ?, indexed_at = ? WHERE id = ?',
+                        (stat.st_mtime_ns, stat.st_size, time.time(), row['id'])
+                    )
+                    document_id = row['id']
+                else:
+                    document_id = connection.execute(
+                        'INSERT INTO documents (path, mtime_ns, size, indexed_at) VALUES (?, ?, ?, ?)',
+                        (path, stat.st_mtime_ns, stat.st_size, time.time())
+                    ).lastrowid
+                connection.execute(
+                    'INSERT INTO documents_fts (rowid, title, body, title_tokens, body_tokens) VALUES (?, ?, ?, ?, ?)',
+                    (document_id, title, text, ' '.join(bigram_tokens(title)), ' '.join(bigram_tokens(text)))
+                )
+
+    def remove(self, path):
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                row = connection.execute('SELECT id FROM documents WHERE path = ?', (path,)).fetchone()
+                if row is not None:
+                    connection.execute('DELETE FROM documents_fts WHERE rowid = ?', (row['id'],))
+                    connection.execute('DELETE FROM documents WHERE id = ?', (row['id'],))
+
+    def sync(self, directory):
+        """讓索引與目錄中的 .md 文件一致：只重新索引新增或修改過的文件，並移除已刪除的文件
+
+        Returns:
+            tuple: (重新索引數, 移除數)
+        """
+        files = glob.glob(os.path.join(directory, '**', '*.md'), recursive=True)
+        indexed = {
+            row['path']: (row['mtime_ns'], row['size'])
+            for row in self._connection().execute('SELECT path, mtime_ns, size FROM documents')
+        }
+
+        updated = 0
+        for path in files:
+            stat = os.stat(path)
+            if indexed.get(path) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            try:
+                self.add(path)
+                updated += 1
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error(f"索引文件失敗 {path}: {str(e)}")
+
+        existing = set(files)
+        removed = [path for path in indexed if path not in existing]
+        for path in removed:
+            self.remove(path)
+
+        logger.info(f"搜尋索引已同步：{len(files)} 個文件，重新索引 {updated} 個，移除 {len(removed)} 個")
+        return updated, len(removed)
+
+    def rebuild(self, directory):
+        """清空索引後重新索引整個目錄"""
+        with self._write_lock:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM documents_fts')
+                connection.execute('DELETE FROM documents')
+        return self.sync(directory)
+
+    def search(self, query, limit=20):
+        """搜尋轉錄稿
+
+        Args:
+            query (str): 搜尋字串，以空白分隔的多個詞組需全部命中
+            limit (int): 最多返回的結果數
+
+        Returns:
+            list: 依相關度排序的結果，每項包含 path、title、score 與標示命中詞的 snippet
+        """
+        match_query = build_match_query(query)
+        if match_query is None:
+            return []
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        rows = self._connection().execute(
+            f'SELECT documents.path, documents_fts.title, documents_fts.body, '
+            f'bm25(documents_fts, {weights}) AS score '
+            f'FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid '
+            f'WHERE documents_fts MATCH ? ORDER BY score LIMIT ?',
+            (match_query, limit)
+        ).fetchall()
+
+        terms = query.split()
+        return [{
+            'path': row['path'],
+            'title': row['title'],
+            'score': round(-row['score'], 4),  # bm25 越小越相關，轉為越大越相關
+            'snippet': highlight_snippet(row['body'], terms)
+        } for row in rows]
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description='轉錄稿全文檢索索引')
+    parser.add_argument('--index', default=os.getenv('SEARCH_INDEX_PATH', os.path.join('data', 'search.db')),
+                        help='索引資料庫路徑')
+    parser.add_argument('--dir', default='transcripts', help='轉錄稿目錄')
+    parser.add_argument('--rebuild', action='store_true', help='清空後重建整個索引')
+    parser.add_argument('--sync', action='store_true', help='只更新新增或修改過的文件')
+    parser.add_argument('--query', help='搜尋字串')
+    parser.add_argument('--limit', type=int, default=10, help='最多顯示的結果數')
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    if args.rebuild:
+        start = time.perf_counter()
+        index.rebuild(args.dir)
+        logger.info(f"索引重建完成，耗時 {time.perf_counter() - start:.2f} 秒")
+    elif args.sync:
+        index.sync(args.dir)
+
+    if args.query:
+        start = time.perf_counter()
+        results = index.search(args.query, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"找到 {len(results)} 筆結果（{elapsed:.1f} 毫秒）")
+        for result in results:
+            print(f"[{result['score']:.2f}] {result['path']}")
+            print(f"    {result['snippet']}")
+
+
+if __name__ == '__main__':
+    main()
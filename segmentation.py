@@ -0,0 +1,178 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 能量計算的幀長（秒）
+FRAME_SECONDS = 0.02
+# 平滑能量曲線的視窗（秒），短於此長度的停頓不視為靜音
+SMOOTHING_SECONDS = 0.3
+# 每次計算能量的幀數，避免一次建立整段音頻大小的暫存陣列
+ENERGY_BLOCK_FRAMES = 50000
+
+
+def frame_energy_db(audio, sr, frame_seconds=FRAME_SECONDS):
+    """計算每一幀的平均能量（dBFS）
+
+    Args:
+        audio (np.ndarray): float32 單聲道音頻
+        sr (int): 採樣率
+        frame_seconds (float): 幀長（秒）
+
+    Returns:
+        np.ndarray: 每幀能量（dB）
+    """
+    frame_length = max(1, int(sr * frame_seconds))
+    n_frames = len(audio) // frame_length
+    if len(audio) % frame_length:
+        n_frames += 1
+
+    power = np.empty(n_frames, dtype=np.float64)
+    for block_start in range(0, n_frames, ENERGY_BLOCK_FRAMES):
+        block_end = min(block_start + ENERGY_BLOCK_FRAMES, n_frames)
+        block = np.asarray(audio[block_start * frame_length:block_end * frame_length], dtype=np.float32)
+        full = len(block) // frame_length
+        if full:
+            frames = block[:full * frame_length].reshape(full, frame_length)
+            power[block_start:block_start + full] = np.einsum('ij,ij->i', frames, frames) / frame_length
+        if block_start + full < block_end:
+            tail = block[full * frame_length:]
+            power[block_start + full] = float(np.dot(tail, tail)) / len(tail)
+
+    return 10 * np.log10(power + 1e-10)
+
+
+def smooth_energy_db(energy_db, window_frames):
+    """以移動平均平滑能量曲線（在線性功率上平均）"""
+    if window_frames <= 1 or len(energy_db) <= window_frames:
+        return energy_db
+    power = np.power(10.0, energy_db / 10)
+    kernel = np.ones(window_frames) / window_frames
+    smoothed = np.convolve(power, kernel, mode='same')
+    return 10 * np.log10(smoothed + 1e-10)
+
+
+def silence_threshold_db(energy_db, margin_db=30.0, floor_db=-60.0):
+    """依音量分布決定靜音門檻：比較大聲的部分低 margin_db 即視為靜音"""
+    if len(energy_db) == 0:
+        return floor_db
+    loud_db = float(np.percentile(energy_db, 95))
+    return max(floor_db, loud_db - margin_db)
+
+
+def split_audio(audio, sr, max_chunk_seconds=30.0, min_chunk_seconds=10.0, overlap_seconds=1.0, margin_db=30.0):
+    """在靜音處將音頻切分成可平行轉錄的片段
+
+    在每個片段的 [min, max] 長度範圍內尋找能量最低的位置作為切點。
+    若切點確實是靜音則直接切開；若整段都在說話，則在最安靜處硬切，
+    並讓下一段往前重疊 overlap_seconds，交由 stitch_chunks 去除重複。
+
+    Args:
+        audio (np.ndarray): float32 單聲道音頻
+        sr (int): 採樣率
+        max_chunk_seconds (float): 片段最大長度
+        min_chunk_seconds (float): 片段最小長度
+        overlap_seconds (float): 硬切時的重疊長度
+        margin_db (float): 靜音門檻相對於大聲部分的差距
+
+    Returns:
+        list: 片段列表，每項包含 start/end（樣本索引）、overlap（樣本數）與 has_speech
+    """
+    total = len(audio)
+    if total == 0:
+        return []
+
+    frame_length = max(1, int(sr * FRAME_SECONDS))
+    energy = smooth_energy_db(
+        frame_energy_db(audio, sr),
+        int(SMOOTHING_SECONDS / FRAME_SECONDS)
+    )
+    threshold = silence_threshold_db(energy, margin_db)
+
+    max_len = int(max_chunk_seconds * sr)
+    min_len = int(min_chunk_seconds * sr)
+    overlap_len = int(overlap_seconds * sr)
+
+    chunks = []
+    start = 0
+    start_overlap = 0
+    while start < total:
+        if total - start <= max_len:
+            end = total
+            next_start = total
+            next_overlap = 0
+        else:
+            lo = (start + min_len) // frame_length
+            hi = max(lo + 1, (start + max_len) // frame_length)
+            cut_frame = lo + int(np.argmin(energy[lo:hi]))
+            end = min(total, cut_frame * frame_length + frame_length // 2)
+            if energy[cut_frame] <= threshold:
+                next_start = end
+                next_overlap = 0
+            else:
+                next_start = max(start + 1, end - overlap_len)
+                next_overlap = end - next_start
+
+        first_frame = start // frame_length
+        last_frame = max(first_frame + 1, -(-end // frame_length))
+        has_speech = bool(np.max(energy[first_frame:last_frame]) > threshold)
+
+        chunks.append({
+            'start': start,
+            'end': end,
+            'overlap': start_overlap,
+            'has_speech': has_speech
+        })
+        start = next_start
+        start_overlap = next_overlap
+
+    logger.info(
+        f"音頻切分完成：{len(chunks)} 個片段，"
+        f"其中 {sum(1 for c in chunks if not c['has_speech'])} 個為靜音（門檻 {threshold:.1f} dB）"
+    )
+    return chunks
+
+
+def _text_overlap_length(previous, current, max_length=50, min_length=2):
+    """返回 previous 結尾與 current 開頭重複的最長字數"""
+    limit = min(len(previous), len(current), max_length)
+    for length in range(limit, min_length - 1, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
+
+def stitch_chunks(chunk_results, tolerance=0.1):
+    """將各片段的轉錄結果依時間合併，並去除重疊區的重複內容
+
+    Args:
+        chunk_results (list): 每項包含 start/end/overlap（秒）與
+            segments（已換算為絕對時間的 Whisper 片段）
+        tolerance (float): 判斷片段落在重疊區內的時間容差（秒）
+
+    Returns:
+        dict: 與 model.transcribe 相同格式的結果（text、segments）
+    """
+    merged = []
+    for chunk in sorted(chunk_results, key=lambda c: c['start']):
+        segments = [dict(segment) for segment in chunk['segments']]
+        if chunk.get('overlap') and merged:
+            last = merged[-1]
+            # 完全落在前一片段已涵蓋範圍內的句子直接丟棄
+            segments = [s for s in segments if s['end'] > last['end'] + tolerance]
+            if segments:
+                first = segments[0]
+                duplicate = _text_overlap_length(last['text'], first['text'])
+                if duplicate:
+                    first['text'] = first['text'][duplicate:]
+                first['start'] = max(first['start'], last['end'])
+                segments = [s for s in segments if s['text'].strip()]
+        merged.extend(segments)
+
+    for index, segment in enumerate(merged):
+        segment['id'] = index
+
+    return {
+        'text': ''.join(segment['text'] for segment in merged),
+        'segments': merged
+    }
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    params TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    audio_hash TEXT,
+    audio_seconds REAL,
+    cache_status TEXT,
+    timings TEXT NOT NULL DEFAULT '{}',
+    transcript_path TEXT,
+    probe TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_filename ON jobs (filename);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    path TEXT PRIMARY KEY,
+    job_id TEXT,
+    filename TEXT NOT NULL,
+    base_name TEXT NOT NULL,
+    audio_hash TEXT,
+    model TEXT,
+    backend TEXT,
+    chars INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_job ON transcripts (job_id);
+CREATE INDEX IF NOT EXISTS transcripts_filename ON transcripts (filename);
+CREATE INDEX IF NOT EXISTS transcripts_base_name ON transcripts (base_name);
+"""
+
+# 可用 update_job 更新的欄位
+JOB_FIELDS = (
+    'state', 'error', 'started_at', 'finished_at', 'audio_hash',
+    'audio_seconds', 'cache_status', 'transcript_path', 'probe'
+)
+
+# 以 JSON 保存的欄位
+JSON_FIELDS = ('probe',)
+
+# 舊版資料庫缺少時補上的欄位
+ADDED_COLUMNS = {
+    'jobs': (('probe', 'TEXT'),),
+}
+
+
+class JobStore:
+    """以 SQLite（WAL 模式）保存任務、狀態、各階段耗時與轉錄稿資訊
+
+    轉錄全文留在磁碟上的 .md 文件，資料庫只記錄路徑與字數，
+    因此長時間運行時記憶體不會隨任務數增加；重新啟動後可找回未完成的任務。
+    每個執行緒使用自己的連線，WAL 模式下讀取不會被寫入阻塞。
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): 資料庫文件路徑
+        """
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._write_lock:
+            connection = self._connection()
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            self._add_missing_columns(connection)
+            connection.commit()
+
+    @staticmethod
+    def _add_missing_columns(connection):
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row['name'] for row in connection.execute(f'PRAGMA table_info({table})')}
+            for name, column_type in columns:
+                if name not in existing:
+                    connection.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+                    logger.info(f"資料庫已新增欄位 {table}.{name}")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, sql, parameters=()):
+        with self._write_lock:
+            connection = self._connection()
+            cursor = connection.execute(sql, parameters)
+            connection.commit()
+            return cursor
+
+    def _query(self, sql, parameters=()):
+        return self._connection().execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _job_row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['timings'] = json.loads(job['timings'])
+        for name in JSON_FIELDS:
+            if job.get(name) is not None:
+                job[name] = json.loads(job[name])
+        return job
+
+    def add_job(self, job):
+        """記錄新任務（重新提交既有的任務時保留原本的資料）
+
+        Args:
+            job (Job): 佇列中的任務
+        """
+        self._execute(
+            'INSERT OR IGNORE INTO jobs (id, filename, params, state, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job.id, job.filename, json.dumps(job.params), job.state, job.created_at)
+        )
+
+    def update_job(self, job_id, **fields):
+        """更新任務欄位，欄位名稱需在 JOB_FIELDS 之內"""
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的任務欄位: {', '.join(sorted(unknown))}")
+        if not fields:
+            return
+        for name in JSON_FIELDS:
+            if fields.get(name) is not None:
+                fields[name] = json.dumps(fields[name], ensure_ascii=False)
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        self._execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    def record_timing(self, job_id, stage, seconds):
+        """記錄任務某個處理階段的耗時（秒）"""
+        with self._write_lock:
+            connection = self._connection()
+            row = connection.execute('SELECT timings FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            timings = json.loads(row['timings'])
+            timings[stage] = round(seconds, 3)
+            connection.execute('UPDATE jobs SET timings = ? WHERE id = ?', (json.dumps(timings), job_id))
+            connection.commit()
+
+    def get_job(self, job_id):
+        rows = self._query('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        return self._job_row(rows[0] if rows else None)
+
+    def list_jobs(self, state=None, filename=None, limit=100):
+        """依建立時間由新到舊列出任務，可依狀態與檔名篩選"""
+        conditions = []
+        parameters = []
+        if state:
+            conditions.append('state = ?')
+            parameters.append(state)
+        if filename:
+            conditions.append('filename = ?')
+            parameters.append(filename)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self._query(
+            f'SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?',
+            (*parameters, limit)
+        )
+        return [self._job_row(row) for row in rows]
+
+    def unfinished_jobs(self, states):
+        """依建立順序列出指定狀態的任務（供重新啟動後恢復）"""
+        placeholders = ', '.join('?' for _ in states)
+        rows = self._query(
+            f'SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY created_at',
+            tuple(states)
+        )
+        return [self._job_row(row) for row in rows]
+
+    def add_transcript(self, path, job_id, filename, base_name, text, audio_hash=None, model=None, backend=None):
+        """記錄已寫入磁碟的轉錄稿（全文不存入資料庫）"""
+        self._execute(
+            'INSERT OR REPLACE INTO transcripts '
+            '(path, job_id, filename, base_name, audio_hash, model, backend, chars, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, job_id, filename, base_name, audio_hash, model, backend, len(text), time.time())
+        )
+
+    def transcript_names(self, base_name):
+        """同一個基本檔名已使用過的所有輸出路徑"""
+        rows = self._query('SELECT path FROM transcripts WHERE base_name = ?', (base_name,))
+        return {row['path'] for row in rows}
@@ -0,0 +1,184 @@
+import os
+import json
+import difflib
+
+# 時間軸記錄存放在轉錄稿旁，檔名為轉錄稿主檔名加上此副檔名
+SEGMENTS_SUFFIX = '.segments.json'
+
+RECORD_VERSION = 1
+
+# 對齊改善後文字時每次比對的原文字數
+ALIGN_WINDOW = 1000
+
+# 可匯出的格式與對應的 MIME 類型
+EXPORT_FORMATS = {
+    'srt': 'application/x-subrip; charset=utf-8',
+    'vtt': 'text/vtt; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+
+def segments_path(transcript_path):
+    """轉錄稿對應的時間軸記錄路徑"""
+    return os.path.splitext(transcript_path)[0] + SEGMENTS_SUFFIX
+
+
+def _map_offset(opcodes, offset):
+    """把原文中的字元位置換算為改善後文字中的位置"""
+    for tag, i1, i2, j1, j2 in opcodes:
+        if offset > i2 or (offset == i2 and tag != 'insert'):
+            continue
+        if tag == 'insert':
+            # 插入在段落邊界上的文字（多為補上的標點）歸給前一段
+            return j2
+        if tag == 'equal':
+            return j1 + (offset - i1)
+        if offset == i1:
+            return j1
+        # 被改寫的區段依長度比例分配
+        return j1 + round((offset - i1) * (j2 - j1) / (i2 - i1))
+    return opcodes[-1][4] if opcodes else 0
+
+
+def align_corrections(segment_texts, improved_text, window=ALIGN_WINDOW):
+    """把文字改善後的全文依原本的 segment 邊界切回各段
+
+    先把各段原文（已轉為繁體）接成一串並記錄每段的邊界位置，
+    再以 difflib 比對原文與改善後的全文，把邊界換算到改善後的文字上；
+    改寫、增刪的區段依長度比例分配，時間戳維持 Whisper 原本的值。
+    difflib 的比對時間約與長度平方成正比，因此以約 window 字的視窗逐段比對，
+    每個視窗只採用前半部的邊界，後半部作為下一個視窗的起點，避免視窗邊緣對齊不準。
+
+    Args:
+        segment_texts (list): 各段原文
+        improved_text (str): 改善後的全文
+        window (int): 每次比對的原文字數
+
+    Returns:
+        list: 與 segment_texts 等長的改善後文字
+    """
+    raw_text = ''.join(segment_texts)
+    # 改善後的文字會加入換行分段，比對前先移除，切完後各段再去除首尾空白
+    target = improved_text.replace('\r', '').replace('\n', '')
+    scale = len(target) / max(1, len(raw_text))
+
+    boundaries = [0]
+    for text in segment_texts:
+        boundaries.append(boundaries[-1] + len(text))
+    positions = [0] * len(boundaries)
+    positions[-1] = len(target)
+
+    index = 0
+    count = len(segment_texts)
+    while index < count:
+        end = index + 1
+        while end < count and boundaries[end] - boundaries[index] < window:
+            end += 1
+        raw_start, raw_end = boundaries[index], boundaries[end]
+        target_start = positions[index]
+        if end == count:
+            target_end = len(target)
+            commit = end
+        else:
+            # 改善後的文字可能比原文長，多取一些避免視窗內對不到
+            target_end = min(len(target), target_start + int((raw_end - raw_start) * scale * 1.5) + 50)
+            commit = max(index + 1, (index + end) // 2)
+
+        matcher = difflib.SequenceMatcher(
+            None, raw_text[raw_start:raw_end], target[target_start:target_end], autojunk=False
+        )
+        opcodes = matcher.get_opcodes()
+        for boundary in range(index + 1, min(commit + 1, count)):
+            mapped = target_start + _map_offset(opcodes, boundaries[boundary] - raw_start)
+            positions[boundary] = max(positions[boundary - 1], min(mapped, len(target)))
+        index = commit
+
+    return [target[start:end].strip() for start, end in zip(positions, positions[1:])]
+
+
+def build_record(segments, improved_text, language=None, converter=None):
+    """建立精簡的時間軸記錄
+
+    Args:
+        segments (list): Whisper 的 segments（含 start、end、text）
+        improved_text (str): 改善後的全文
+        language (str): 轉錄語言
+        converter: 套用在各段原文上的轉換器（如 OpenCC s2t），使原文與改善後的文字可比對
+
+    Returns:
+        dict: {'version', 'language', 'segments': [[start, end, text], ...]}
+    """
+    texts = [segment['text'] for segment in segments]
+    if converter is not None:
+        texts = [converter.convert(text) for text in texts]
+    aligned = align_corrections(texts, improved_text)
+    return {
+        'version': RECORD_VERSION,
+        'language': language,
+        'segments': [
+            [round(segment['start'], 3), round(segment['end'], 3), text]
+            for segment, text in zip(segments, aligned)
+        ]
+    }
+
+
+def write_record(path, record):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+
+
+def read_record(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}'
+
+
+def _cues(record):
+    """有文字的字幕段落（改寫後可能有段落被併入前後段而變成空白）"""
+    return [(start, end, text) for start, end, text in record['segments'] if text]
+
+
+def render_srt(record):
+    lines = []
+    for index, (start, end, text) in enumerate(_cues(record), 1):
+        lines.append(str(index))
+        lines.append(f"{_timestamp(start, ',')} --> {_timestamp(end, ',')}")
+        lines.append(text)
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def render_vtt(record):
+    lines = ['WEBVTT', '']
+    for start, end, text in _cues(record):
+        lines.append(f"{_timestamp(start, '.')} --> {_timestamp(end, '.')}")
+        lines.append(text)
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def render_json(record):
+    return json.dumps({
+        'language': record.get('language'),
+        'segments': [
+            {'start': start, 'end': end, 'text': text}
+            for start, end, text in record['segments']
+        ]
+    }, ensure_ascii=False, indent=2)
+
+
+def render(record, export_format):
+    """依格式輸出字幕或 JSON 文字"""
+    renderers = {'srt': render_srt, 'vtt': render_vtt, 'json': render_json}
+    if export_format not in renderers:
+        raise ValueError(f"不支援的匯出格式: {export_format}")
+    return renderers[export_format](record)
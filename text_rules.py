@@ -0,0 +1,361 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dictionaries')
+PROPER_NOUNS_PATH = os.path.join(DICTIONARY_FOLDER, 'proper_nouns.json')
+
+
+class DictionaryReplacer:
+    """編譯後的詞典替換引擎：一次掃描文本，在每個位置套用最長匹配
+
+    詞典在建立時編譯成字典樹，另以所有詞的首字組成字元集正規表示式。
+    掃描時由正規表示式（C 實作）直接跳到可能的起點，再沿字典樹找出最長的詞，
+    因此成本與文本長度成正比，不隨詞條數量增加，
+    也不會有「關西」先於「關西聊天室」被替換的順序問題。
+    """
+
+    def __init__(self, mapping):
+        """
+        Args:
+            mapping (dict): 錯誤詞對應正確詞
+        """
+        self.mapping = {wrong: correct for wrong, correct in mapping.items() if wrong}
+        self._trie = {}
+        for wrong, correct in self.mapping.items():
+            node = self._trie
+            for char in wrong:
+                node = node.setdefault(char, {})
+            node[''] = correct  # 詞尾存放替換詞
+        if self._trie:
+            self._first_chars = re.compile('[' + ''.join(re.escape(char) for char in self._trie) + ']')
+        else:
+            self._first_chars = None
+
+    def replace(self, text):
+        if self._first_chars is None:
+            return text
+
+        search = self._first_chars.search
+        trie = self._trie
+        length = len(text)
+        output = []
+        copied = 0
+        position = 0
+        while True:
+            match = search(text, position)
+            if match is None:
+                break
+            start = match.start()
+
+            # 沿字典樹往下走，記住最後一個完整詞的結尾
+            node = trie
+            index = start
+            matched_end = -1
+            replacement = None
+            while index < length:
+                node = node.get(text[index])
+                if node is None:
+                    break
+                index += 1
+                if '' in node:
+                    matched_end = index
+                    replacement = node['']
+
+            if matched_end > 0:
+                output.append(text[copied:start])
+                output.append(replacement)
+                copied = position = matched_end
+            else:
+                position = start + 1
+
+        if not output:
+            return text
+        output.append(text[copied:])
+        return ''.join(output)
+
+
+# 定義上下文相關詞彙替換（基於上下文的複雜替換）
+CONTEXT_SPECIFIC_TERMS = [
+    {
+        "pattern": r"關照",  # 比對模式
+        "replacement": "觀照",  # 替換詞
+        "context_before": ["心靈", "靈性", "自己", "內在", "意識"],  # 前文關鍵詞
+        "context_distance": 20,  # 關鍵詞與目標詞的最大距離（字元數）
+        "exceptions": ["關照家人", "關照朋友", "關照他人"]  # 例外情況，這些短語不替換
+    }
+]
+
+
+def _find_spans(words, text):
+    """一次掃描找出所有詞出現的位置
+
+    Returns:
+        tuple: (依結尾排序的結尾列表, 對應的開頭列表, 最長詞的長度)
+    """
+    if not words:
+        return [], [], 0
+    regex = re.compile('|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+    spans = sorted((match.end(), match.start()) for match in regex.finditer(text))
+    return [end for end, _ in spans], [start for _, start in spans], max(len(word) for word in words)
+
+
+class ContextRuleEngine:
+    """上下文相關詞彙替換引擎
+
+    所有規則的比對模式合併成一個正規表示式，只掃描文本一次；
+    前文關鍵詞與例外短語的位置預先找出並排序，每個匹配以二分搜尋檢查，
+    最後以 list/join 一次組出結果，整體成本與文本長度成正比。
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): 規則列表，每條規則包含 pattern、replacement、
+                context_before、context_distance 與 exceptions
+        """
+        self.rules = [dict(rule) for rule in rules]
+        if self.rules:
+            self._regex = re.compile('|'.join(
+                f'(?P<rule{index}>{rule["pattern"]})' for index, rule in enumerate(self.rules)
+            ))
+        else:
+            self._regex = None
+
+    @staticmethod
+    def _has_context(ends, starts, position, distance):
+        """是否有關鍵詞完整落在 [position - distance, position) 之內"""
+        window_start = max(0, position - distance)
+        index = bisect_right(ends, position) - 1
+        while index >= 0 and ends[index] > window_start:
+            if starts[index] >= window_start:
+                return True
+            index -= 1
+        return False
+
+    @staticmethod
+    def _is_exception(ends, starts, max_length, start, end):
+        """是否有例外短語涵蓋 [start, end)"""
+        index = bisect_left(ends, end)
+        # 涵蓋此匹配的短語，結尾不會超過 start + max_length
+        while index < len(ends) and ends[index] <= start + max_length:
+            if starts[index] <= start:
+                return True
+            index += 1
+        return False
+
+    def apply(self, text):
+        if self._regex is None:
+            return text
+
+        # 只有文本中出現比對模式時才需要找關鍵詞與例外
+        matches = list(self._regex.finditer(text))
+        if not matches:
+            return text
+
+        contexts = [_find_spans(rule['context_before'], text) for rule in self.rules]
+        exceptions = [_find_spans(rule.get('exceptions', []), text) for rule in self.rules]
+
+        output = []
+        copied = 0
+        for match in matches:
+            index = int(match.lastgroup[len('rule'):])
+            rule = self.rules[index]
+            start, end = match.span()
+            context_ends, context_starts, _ = contexts[index]
+            if not self._has_context(context_ends, context_starts, start, rule['context_distance']):
+                continue
+            if self._is_exception(*exceptions[index], start, end):
+                continue
+            output.append(text[copied:start])
+            output.append(rule['replacement'])
+            copied = end
+
+        if not output:
+            return text
+        output.append(text[copied:])
+        return ''.join(output)
+
+
+# 重複偵測用的分隔符號：空白、分句標點與句末標點
+_DELIMITERS = r'\s，、；：。！？'
+_SENTENCE_END = re.compile('[。！？]')
+_PHRASE_TOKEN = re.compile(f'([^{_DELIMITERS}]*)([{_DELIMITERS}]*)')
+
+
+def _collapse_periodic(content, min_repeats, min_length):
+    """若整個詞組由同一短語重複組成（如「謝謝大家謝謝大家謝謝大家」），只保留一次"""
+    if len(content) < min_length * min_repeats:
+        return content
+    # s 在 (s + s)[1:] 中第一次出現的位置就是 s 的最小週期（C 實作的線性搜尋）
+    period = (content + content).find(content, 1)
+    if period < len(content) and period < min_length:
+        period *= -(-min_length // period)  # 取不短於 min_length 的週期倍數
+    if period < len(content) and len(content) % period == 0 and len(content) // period >= min_repeats:
+        return content[:period]
+    return content
+
+
+def collapse_repetitions(text, min_repeats=3, min_length=3, max_period=8):
+    """一次掃描移除連續重複的短語與相鄰重複的句子（Whisper 幻覺迴圈常見的輸出）
+
+    文本先以空白與標點切成短語序列（每個短語帶著其後的分隔符號），
+    之後在短語序列上單向掃描：
+
+    - 句子開頭處若下一句與本句完全相同，只保留一句；
+    - 否則檢查由 1 至 max_period 個短語組成的單位是否連續重複 min_repeats 次以上，
+      若是則只保留一次，並沿用最後一次重複後的分隔符號。
+
+    每個位置只做常數次比較，整體成本與文本長度成正比。
+
+    Args:
+        text (str): 要處理的文本
+        min_repeats (int): 短語至少連續重複幾次才合併
+        min_length (int): 參與合併的短語單位最少字數
+        max_period (int): 重複單位最多包含幾個短語
+
+    Returns:
+        str: 處理後的文本
+    """
+    contents = []
+    delimiters = []
+    for match in _PHRASE_TOKEN.finditer(text):
+        content, delimiter = match.groups()
+        if content or delimiter:
+            contents.append(_collapse_periodic(content, min_repeats, min_length))
+            delimiters.append(delimiter)
+
+    count = len(contents)
+    # 句子比較時忽略分隔符號前後的空白
+    keys = [(content, delimiter.strip()) for content, delimiter in zip(contents, delimiters)]
+    is_sentence_end = [bool(_SENTENCE_END.search(delimiter)) for delimiter in delimiters]
+
+    # sentence_end[i]：從 i 開始的句子結尾（不含）；之後沒有句末標點時為 0
+    sentence_end = [0] * count
+    end = 0
+    for index in range(count - 1, -1, -1):
+        if is_sentence_end[index]:
+            end = index + 1
+        sentence_end[index] = end
+
+    output = []
+    index = 0
+    at_sentence_start = True
+    while index < count:
+        end = sentence_end[index]
+        if at_sentence_start and end:
+            length = end - index
+            if keys[index:end] == keys[end:end + length]:
+                following = end + length
+                while keys[index:end] == keys[following:following + length]:
+                    following += length
+                output.extend(range(index, end))
+                index = following
+                continue
+
+        collapsed = False
+        if contents[index]:
+            for period in range(1, max_period + 1):
+                if index + period * min_repeats > count:
+                    break
+                if sum(len(content) for content in contents[index:index + period]) < min_length:
+                    continue
+                scan = index + period
+                while scan < count and contents[scan] == contents[scan - period]:
+                    scan += 1
+                repeats = (scan - index) // period
+                if repeats >= min_repeats:
+                    last = index + repeats * period - 1
+                    output.extend(range(index, index + period - 1))
+                    # 保留單位內容，分隔符號取最後一次重複之後的
+                    output.append((index + period - 1, last))
+                    index = last + 1
+                    collapsed = True
+                    break
+
+        if not collapsed:
+            output.append(index)
+            index += 1
+        at_sentence_start = is_sentence_end[index - 1]
+
+    parts = []
+    for item in output:
+        if isinstance(item, tuple):
+            parts.append(contents[item[0]])
+            parts.append(delimiters[item[1]])
+        else:
+            parts.append(contents[item])
+            parts.append(delimiters[item])
+    return ''.join(parts)
+
+
+class ReloadingDictionary:
+    """從 JSON 文件載入的替換詞典，文件修改後自動重新編譯
+
+    Attributes:
+        version (str): 詞典內容的雜湊，可作為快取鍵的一部分
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        """
+        Args:
+            path (str): 詞典 JSON 文件路徑（物件格式：{"錯誤詞": "正確詞"}）
+            check_interval (float): 檢查文件是否變更的最短間隔（秒）
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self.version = None
+        self._replacer = DictionaryReplacer({})
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_if_changed(force=True)
+
+    def _reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError as e:
+                logger.error(f"無法讀取詞典文件 {self.path}: {str(e)}")
+                return
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return
+            try:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                replacer = DictionaryReplacer(json.loads(raw.decode('utf-8')))
+            except (OSError, ValueError) as e:
+                # 文件寫到一半或格式錯誤時沿用舊的詞典
+                logger.error(f"載入詞典文件失敗 {self.path}: {str(e)}")
+                return
+            self._replacer = replacer
+            self._signature = signature
+            self.version = hashlib.sha256(raw).hexdigest()[:12]
+            logger.info(f"已載入詞典 {os.path.basename(self.path)}：{len(replacer.mapping)} 個詞條")
+
+    def mapping(self):
+        self._reload_if_changed()
+        return dict(self._replacer.mapping)
+
+    def replace(self, text):
+        self._reload_if_changed()
+        return self._replacer.replace(text)
+
+
+# 專有名詞對照表（app.py 與 fix_transcripts.py 共用）
+proper_nouns = ReloadingDictionary(PROPER_NOUNS_PATH)
+
+# 上下文相關詞彙替換引擎（app.py 與 fix_transcripts.py 共用）
+context_rules = ContextRuleEngine(CONTEXT_SPECIFIC_TERMS)
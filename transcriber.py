@@ -0,0 +1,291 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audio import SAMPLE_RATE
+from models import PRECISION_FP32, load_whisper_model
+from segmentation import split_audio, stitch_chunks
+
+logger = logging.getLogger(__name__)
+
+# 依序轉錄時，傳給下一片段作為提示的前文字數（超過 Whisper 保留的提示 token 數時再從開頭截短）
+PROMPT_TAIL_CHARS = 200
+
+# 解碼設定檔：beam 大小、取樣候選數、溫度回退序列、是否以前文為條件、無語音門檻
+# balanced 與 model.transcribe 的預設值相同（因此沿用加入設定檔前的快取鍵）；fast 不做溫度回退，accurate 使用 beam search
+DECODE_PROFILES = {
+    'fast': {
+        'beam_size': None,
+        'best_of': None,
+        'temperature': (0.0,),
+        'condition_on_previous_text': False,
+        'no_speech_threshold': 0.6,
+    },
+    'balanced': {
+        'beam_size': None,
+        'best_of': None,
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'condition_on_previous_text': True,
+        'no_speech_threshold': 0.6,
+    },
+    'accurate': {
+        'beam_size': 5,
+        'best_of': 5,
+        'temperature': (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        'condition_on_previous_text': True,
+        'no_speech_threshold': 0.5,
+    },
+}
+DEFAULT_DECODE_PROFILE = 'balanced'
+
+# 每個工作行程內載入的模型（由 _init_worker 設定）
+_worker_model = None
+
+
+def decode_options(profile):
+    """取得解碼設定檔對應的 model.transcribe 參數"""
+    if profile not in DECODE_PROFILES:
+        raise ValueError(f"不支援的解碼設定檔: {profile}")
+    return {name: value for name, value in DECODE_PROFILES[profile].items() if value is not None}
+
+
+def _transcribe_counting_fallbacks(model, audio, options):
+    """執行 model.transcribe，並統計溫度回退造成的重新解碼次數與耗時
+
+    Whisper 每個 30 秒視窗先以第一個溫度解碼，壓縮率或平均對數機率不合格時
+    改用下一個溫度重新解碼；這裡暫時包裝 model.decode 記錄每次解碼的溫度與耗時。
+    呼叫端需確保同一時間只有一個執行緒使用此模型（本行程以 model_lock 保護）。
+    """
+    temperatures = options.get('temperature', 0.0)
+    first_temperature = temperatures[0] if isinstance(temperatures, (list, tuple)) else temperatures
+    stats = {'decodes': 0, 'fallbacks': 0, 'decode_seconds': 0.0, 'fallback_seconds': 0.0}
+    original_decode = model.decode
+
+    def counting_decode(mel, decode_options, **kwargs):
+        start = time.perf_counter()
+        result = original_decode(mel, decode_options, **kwargs)
+        elapsed = time.perf_counter() - start
+        stats['decodes'] += 1
+        stats['decode_seconds'] += elapsed
+        if decode_options.temperature != first_temperature:
+            stats['fallbacks'] += 1
+            stats['fallback_seconds'] += elapsed
+        return result
+
+    model.decode = counting_decode
+    try:
+        result = model.transcribe(audio, **options)
+    finally:
+        del model.decode
+    return result, stats
+
+
+def transcribe_chunk(model, audio, chunk, options, sr=SAMPLE_RATE):
+    """轉錄單個片段，並將時間戳換算為整段音頻的絕對時間
+
+    Args:
+        model: Whisper 模型
+        audio (np.ndarray): 片段音頻
+        chunk (dict): split_audio 產生的片段資訊
+        options (dict): 傳給 model.transcribe 的參數
+
+    Returns:
+        dict: 片段的起訖時間（秒）、重疊長度、segments 與解碼統計
+    """
+    offset = chunk['start'] / sr
+    result, stats = _transcribe_counting_fallbacks(model, audio, options)
+    segments = []
+    for segment in result.get('segments', []):
+        segment = dict(segment)
+        segment['start'] = round(segment['start'] + offset, 3)
+        segment['end'] = round(segment['end'] + offset, 3)
+        segments.append(segment)
+    return {
+        'start': offset,
+        'end': chunk['end'] / sr,
+        'overlap': chunk['overlap'] / sr,
+        'segments': segments,
+        'text': result.get('text', ''),
+        'decode_stats': stats
+    }
+
+
+def _prompt_token_counter(model):
+    """返回 (計算提示 token 數的函數, Whisper 保留的提示 token 上限)
+
+    model.transcribe 以 " " + initial_prompt.strip() 編碼提示，只保留最後 n_text_ctx // 2 - 1 個 token；
+    中文每個字常佔一個以上的 byte-BPE token，因此以模型的分詞器實際計算。
+    """
+    from whisper.tokenizer import get_tokenizer
+
+    tokenizer = get_tokenizer(model.is_multilingual)
+    return (lambda text: len(tokenizer.encode(' ' + text.strip()))), model.dims.n_text_ctx // 2 - 1
+
+
+def build_chunk_prompt(vocabulary_prompt, previous_text, count_tokens, max_tokens):
+    """詞彙提示加上前一片段的結尾文字
+
+    Whisper 從提示的開頭截掉超出的 token，為了讓詞彙提示總是完整保留，
+    超過上限時從前文的開頭逐步截短。
+
+    Args:
+        vocabulary_prompt (str): 詞彙提示
+        previous_text (str): 前一片段的文字（不使用前文時為空字串）
+        count_tokens (callable): 計算提示 token 數的函數
+        max_tokens (int): 提示 token 上限
+
+    Returns:
+        str: 提示文字
+    """
+    tail = previous_text[-PROMPT_TAIL_CHARS:]
+    while tail and count_tokens(vocabulary_prompt + tail) > max_tokens:
+        tail = tail[max(1, len(tail) // 8):]
+    return vocabulary_prompt + tail
+
+
+def _init_worker(model_name, torch_threads, precision, cache_dir):
+    """工作行程初始化：每個行程只載入一次模型"""
+    global _worker_model
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker_model = load_whisper_model(model_name, precision, cache_dir=cache_dir)
+    logger.info(f"工作行程 {os.getpid()} 已載入 Whisper 模型 {model_name}（{precision}）")
+
+
+def _transcribe_chunk_in_worker(audio, chunk, options):
+    return transcribe_chunk(_worker_model, audio, chunk, options)
+
+
+class TranscriberPool:
+    """在多個行程間平行轉錄音頻片段，每個行程共用一個已載入的模型"""
+
+    def __init__(self, model_name, num_processes, precision=PRECISION_FP32, cache_dir=None):
+        """
+        Args:
+            model_name (str): Whisper 模型名稱
+            num_processes (int): 工作行程數量
+            precision (str): 模型精度，fp32 或 int8
+            cache_dir (str): 量化模型的快取目錄
+        """
+        self.model_name = model_name
+        self.num_processes = max(1, int(num_processes))
+        self.precision = precision
+        self.cache_dir = cache_dir
+        # 平分 CPU 核心，避免每個行程的 torch 執行緒互相搶佔
+        self.torch_threads = max(1, (os.cpu_count() or 1) // self.num_processes)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                logger.info(f"啟動 {self.num_processes} 個轉錄行程，每個行程 {self.torch_threads} 個執行緒")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_processes,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.torch_threads, self.precision, self.cache_dir)
+                )
+            return self._executor
+
+    def map_chunks(self, audio, chunks, options, cancel_check=None):
+        """平行轉錄所有片段，依完成順序產生結果"""
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_transcribe_chunk_in_worker, audio[chunk['start']:chunk['end']], chunk, options)
+            for chunk in chunks
+        ]
+        try:
+            for future in as_completed(futures):
+                if cancel_check:
+                    cancel_check()
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+def transcribe_audio(audio, model=None, model_lock=None, pool=None, cancel_check=None, on_chunk=None, **options):
+    """以靜音切分後分段轉錄整段音頻
+
+    有 pool 時各片段平行送往工作行程；否則在本行程依序轉錄，
+    並把前一片段的結尾文字接在 initial_prompt（詞彙提示）之後，保留上下文。
+
+    Args:
+        audio (np.ndarray): 16kHz 單聲道 float32 音頻
+        model: 本行程的 Whisper 模型（未提供 pool 時使用）
+        model_lock (threading.Lock): 保護本行程模型的鎖
+        pool (TranscriberPool): 平行轉錄用的行程池
+        cancel_check (callable): 每個片段完成後呼叫，可拋出例外中止轉錄
+        on_chunk (callable): 每個片段完成後以 (片段結果, 已解碼秒數, 需解碼總秒數) 呼叫，
+            平行轉錄時依完成順序呼叫
+        **options: 傳給 model.transcribe 的參數
+
+    Returns:
+        dict: 包含 text 與帶絕對時間戳 segments 的轉錄結果
+    """
+    start_time = time.perf_counter()
+    chunks = [chunk for chunk in split_audio(audio, SAMPLE_RATE) if chunk['has_speech']]
+    total_seconds = sum(chunk['end'] - chunk['start'] for chunk in chunks) / SAMPLE_RATE
+    decoded_seconds = 0.0
+
+    results = []
+    if pool is not None:
+        for chunk_result in pool.map_chunks(audio, chunks, options, cancel_check):
+            results.append(chunk_result)
+            decoded_seconds += chunk_result['end'] - chunk_result['start']
+            if on_chunk:
+                on_chunk(chunk_result, decoded_seconds, total_seconds)
+    else:
+        vocabulary_prompt = options.pop('initial_prompt', None) or ''
+        # 片段不超過 30 秒，Whisper 自己的 condition_on_previous_text 幾乎不起作用，
+        # 跨片段的前文提示才是實際的前文條件；設定檔關閉前文條件時（fast）一併略過
+        use_previous_text = options.get('condition_on_previous_text') is not False
+        count_tokens, max_prompt_tokens = _prompt_token_counter(model) if use_previous_text else (None, 0)
+        previous_text = ''
+        for chunk in chunks:
+            chunk_options = dict(options)
+            prompt = vocabulary_prompt
+            if use_previous_text and previous_text:
+                prompt = build_chunk_prompt(vocabulary_prompt, previous_text, count_tokens, max_prompt_tokens)
+            if prompt:
+                chunk_options['initial_prompt'] = prompt
+            if model_lock is not None:
+                with model_lock:
+                    chunk_result = transcribe_chunk(model, audio[chunk['start']:chunk['end']], chunk, chunk_options)
+            else:
+                chunk_result = transcribe_chunk(model, audio[chunk['start']:chunk['end']], chunk, chunk_options)
+            results.append(chunk_result)
+            previous_text = chunk_result['text'] or previous_text
+            decoded_seconds += chunk_result['end'] - chunk_result['start']
+            if on_chunk:
+                on_chunk(chunk_result, decoded_seconds, total_seconds)
+            if cancel_check:
+                cancel_check()
+
+    result = stitch_chunks(results)
+    result['language'] = options.get('language')
+
+    # 合計各片段的解碼統計（平行轉錄時為各行程耗時的總和）
+    stats = {'decodes': 0, 'fallbacks': 0, 'decode_seconds': 0.0, 'fallback_seconds': 0.0}
+    for chunk_result in results:
+        for name, value in chunk_result.get('decode_stats', {}).items():
+            stats[name] += value
+    result['decode_stats'] = stats
+
+    elapsed = time.perf_counter() - start_time
+    duration = len(audio) / SAMPLE_RATE
+    logger.info(
+        f"分段轉錄完成：{len(chunks)} 個片段，音頻 {duration:.1f} 秒，"
+        f"耗時 {elapsed:.1f} 秒（即時率 {elapsed / max(duration, 1e-6):.2f}）；"
+        f"解碼 {stats['decodes']} 次，其中溫度回退重新解碼 {stats['fallbacks']} 次，"
+        f"耗時 {stats['fallback_seconds']:.1f} 秒"
+    )
+    return result
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+
+from cache import HASH_CHUNK_SIZE, hash_file
+
+logger = logging.getLogger(__name__)
+
+# 未完成的上傳保存在上傳目錄下的這個子目錄
+PARTIAL_FOLDER = '.partial'
+
+# 上傳完成後，文件旁記錄其 SHA-256 的附屬文件副檔名
+HASH_SUFFIX = '.sha256'
+
+
+class UploadError(Exception):
+    """上傳請求不合法；status 為對應的 HTTP 狀態碼"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class _Upload:
+    def __init__(self, upload_id, filename, size, offset=0, created_at=None):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.offset = offset
+        self.created_at = created_at or time.time()
+        self.updated_at = time.time()
+        self.digest = None  # 已接收資料的 SHA-256（邊收邊算）
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'created_at': self.created_at
+        }
+
+
+class UploadManager:
+    """可續傳的分塊上傳（概念與 tus 相同）
+
+    每個分塊直接串流寫入磁碟上的暫存文件，記憶體用量只有一個讀取緩衝區；
+    SHA-256 在資料到達時同步計算，完成時即可用來查詢快取、判斷是否重複。
+    上傳狀態寫在暫存文件旁的 JSON 中，連線中斷或伺服器重新啟動後都能從已寫入的位置續傳。
+    """
+
+    def __init__(self, directory, max_bytes, expire_seconds=24 * 3600):
+        """
+        Args:
+            directory (str): 上傳完成的文件存放目錄
+            max_bytes (int): 單個文件的大小上限
+            expire_seconds (float): 未完成的上傳超過此時間未更新即刪除
+        """
+        self.directory = directory
+        self.partial_directory = os.path.join(directory, PARTIAL_FOLDER)
+        self.max_bytes = max_bytes
+        self.expire_seconds = expire_seconds
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.partial_directory, f'{upload_id}.part')
+
+    def _info_path(self, upload_id):
+        return os.path.join(self.partial_directory, f'{upload_id}.json')
+
+    def _save_info(self, upload):
+        info_path = self._info_path(upload.id)
+        temp_path = info_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(upload.to_dict(), f, ensure_ascii=False)
+        os.replace(temp_path, info_path)
+
+    def _get(self, upload_id):
+        """取得上傳狀態；伺服器重新啟動過時從磁碟恢復"""
+        if not upload_id or not upload_id.isalnum():
+            raise UploadError('無效的上傳 ID', 404)
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+            try:
+                with open(self._info_path(upload_id), 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                raise UploadError('找不到此上傳', 404)
+            # 以實際寫入磁碟的長度為準（中斷時狀態文件可能落後）
+            offset = os.path.getsize(self._data_path(upload_id)) if os.path.exists(self._data_path(upload_id)) else 0
+            upload = _Upload(upload_id, info['filename'], info['size'], min(offset, info['size']), info['created_at'])
+            self._uploads[upload_id] = upload
+            return upload
+
+    def _cleanup_expired(self):
+        if not os.path.isdir(self.partial_directory):
+            return
+        now = time.time()
+        for name in os.listdir(self.partial_directory):
+            path = os.path.join(self.partial_directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.expire_seconds:
+                    os.remove(path)
+                    with self._lock:
+                        self._uploads.pop(name.split('.', 1)[0], None)
+            except OSError:
+                pass
+
+    def create(self, filename, size):
+        """建立新的上傳
+
+        Args:
+            filename (str): 已正規化的目標檔名
+            size (int): 文件總位元組數
+
+        Returns:
+            dict: 上傳狀態（包含 upload_id 與 offset）
+        """
+        if size <= 0:
+            raise UploadError('檔案大小無效')
+        if size > self.max_bytes:
+            raise UploadError(f'檔案大小不能超過 {self.max_bytes // (1024 * 1024)} MB', 413)
+        self._cleanup_expired()
+        os.makedirs(self.partial_directory, exist_ok=True)
+
+        upload = _Upload(uuid.uuid4().hex, filename, size)
+        upload.digest = hashlib.sha256()
+        open(self._data_path(upload.id), 'wb').close()
+        self._save_info(upload)
+        with self._lock:
+            self._uploads[upload.id] = upload
+        logger.info(f"建立上傳 {upload.id}: {filename}（{size} 位元組）")
+        return upload.to_dict()
+
+    def status(self, upload_id):
+        return self._get(upload_id).to_dict()
+
+    def append(self, upload_id, offset, stream, length=None):
+        """把一個分塊串流寫入暫存文件
+
+        Args:
+            upload_id (str): 上傳 ID
+            offset (int): 此分塊在文件中的起始位置，必須等於已接收的長度
+            stream: 可 read(n) 的請求內容
+            length (int): 分塊長度（未知時讀到串流結束）
+
+        Returns:
+            dict: 更新後的上傳狀態；完成時另含 sha256 與最終檔名
+        """
+        upload = self._get(upload_id)
+        with upload.lock:
+            if offset != upload.offset:
+                raise UploadError('上傳位置不符，請以目前位置續傳', 409, upload.offset)
+
+            if upload.digest is None:
+                # 伺服器重新啟動後雜湊狀態遺失，先重新計算已接收的部分
+                upload.digest = hashlib.sha256()
+                with open(self._data_path(upload.id), 'rb') as f:
+                    remaining = upload.offset
+                    while remaining > 0:
+                        block = f.read(min(HASH_CHUNK_SIZE, remaining))
+                        if not block:
+                            break
+                        upload.digest.update(block)
+                        remaining -= len(block)
+
+            remaining = upload.size - upload.offset if length is None else length
+            if upload.offset + remaining > upload.size:
+                raise UploadError('分塊超過宣告的檔案大小', 413, upload.offset)
+
+            with open(self._data_path(upload.id), 'r+b') as f:
+                f.seek(upload.offset)
+                f.truncate()
+                try:
+                    while remaining > 0:
+                        block = stream.read(min(HASH_CHUNK_SIZE, remaining))
+                        if not block:
+                            break
+                        f.write(block)
+                        upload.digest.update(block)
+                        upload.offset += len(block)
+                        remaining -= len(block)
+                finally:
+                    # 連線中斷時保留已寫入的部分，下次從 offset 續傳
+                    upload.updated_at = time.time()
+                    f.flush()
+                    self._save_info(upload)
+
+            result = upload.to_dict()
+            if upload.offset == upload.size:
+                result.update(self._finish(upload))
+            return result
+
+    def _finish(self, upload):
+        """上傳完成：移到上傳目錄並記錄 SHA-256"""
+        os.makedirs(self.directory, exist_ok=True)
+        file_hash = upload.digest.hexdigest()
+        final_path = os.path.join(self.directory, upload.filename)
+        os.replace(self._data_path(upload.id), final_path)
+        write_hash(final_path, file_hash)
+        os.remove(self._info_path(upload.id))
+        with self._lock:
+            self._uploads.pop(upload.id, None)
+        logger.info(f"上傳完成 {upload.id}: {upload.filename}，SHA-256 {file_hash[:12]}")
+        return {'completed': True, 'sha256': file_hash}
+
+    def cancel(self, upload_id):
+        upload = self._get(upload_id)
+        with upload.lock:
+            for path in (self._data_path(upload.id), self._info_path(upload.id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            with self._lock:
+                self._uploads.pop(upload.id, None)
+
+
+def write_hash(file_path, file_hash):
+    """在文件旁記錄其 SHA-256、大小與修改時間"""
+    stat = os.stat(file_path)
+    with open(file_path + HASH_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(f'{file_hash} {stat.st_size} {stat.st_mtime_ns}\n')
+
+
+def file_sha256(file_path):
+    """取得文件的 SHA-256：上傳時已計算且文件未變動就直接使用，否則重新計算"""
+    try:
+        with open(file_path + HASH_SUFFIX, 'r', encoding='utf-8') as f:
+            file_hash, size, mtime_ns = f.read().split()
+        stat = os.stat(file_path)
+        if int(size) == stat.st_size and int(mtime_ns) == stat.st_mtime_ns:
+            return file_hash
+    except (OSError, ValueError):
+        pass
+    return hash_file(file_path)
@@ -0,0 +1,120 @@
+import os
+import glob
+import hashlib
+import logging
+import threading
+
+from text_rules import DICTIONARY_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# 各系列的詞彙表：<系列名稱>.txt，每行一個詞，# 開頭為註解
+GLOSSARY_FOLDER = os.path.join(DICTIONARY_FOLDER, 'glossaries')
+
+# initial_prompt 的字數上限（Whisper 的提示最多約 224 個 token，需保留空間給前一片段的結尾文字）
+PROMPT_MAX_CHARS = 100
+
+
+def read_glossary(path):
+    terms = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            term = line.strip()
+            if term and not term.startswith('#'):
+                terms.append(term)
+    return terms
+
+
+def build_prompt(terms, max_chars=PROMPT_MAX_CHARS):
+    """以詞彙建立 initial_prompt
+
+    被其他詞包含的短詞（如「關係」之於「關係花園」）略過以節省長度，
+    詞彙依順序加入直到超過字數上限。
+
+    Returns:
+        str: 以「、」分隔的詞彙，沒有詞彙時為空字串
+    """
+    unique_terms = list(dict.fromkeys(terms))
+    selected = []
+    length = 0
+    for term in unique_terms:
+        if any(term != other and term in other for other in unique_terms):
+            continue
+        if length + len(term) + 1 > max_chars:
+            break
+        selected.append(term)
+        length += len(term) + 1
+    return '、'.join(selected) + '。' if selected else ''
+
+
+class VocabularyPrompts:
+    """依系列建立 Whisper 的 initial_prompt：系列詞彙表加上專有名詞詞典的正確詞
+
+    讓 Whisper 在轉錄時就寫出正確的專有名詞，減少後處理要修正的內容。
+    建好的提示依系列快取，詞彙表或專有名詞詞典修改後才重新建立。
+    """
+
+    def __init__(self, proper_nouns, folder=GLOSSARY_FOLDER, max_chars=PROMPT_MAX_CHARS):
+        """
+        Args:
+            proper_nouns (ReloadingDictionary): 專有名詞詞典（{"錯誤詞": "正確詞"}）
+            folder (str): 系列詞彙表目錄
+            max_chars (int): 提示的字數上限
+        """
+        self.proper_nouns = proper_nouns
+        self.folder = folder
+        self.max_chars = max_chars
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def series_names(self):
+        paths = glob.glob(os.path.join(self.folder, '*.txt'))
+        return [os.path.splitext(os.path.basename(path))[0] for path in paths]
+
+    def detect_series(self, filename):
+        """以檔名（含上傳時的資料夾名稱）判斷所屬系列，名稱較長的系列優先"""
+        for name in sorted(self.series_names(), key=len, reverse=True):
+            if name in filename:
+                return name
+        return None
+
+    def _glossary_signature(self, series):
+        if not series:
+            return None
+        path = os.path.join(self.folder, f'{series}.txt')
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def prompt(self, series=None):
+        """取得系列的 initial_prompt
+
+        Args:
+            series (str): 系列名稱，None 時只使用專有名詞詞典
+
+        Returns:
+            str: 提示文字（可能為空字串）
+        """
+        mapping = self.proper_nouns.mapping()
+        key = (series, self.proper_nouns.version, self._glossary_signature(series))
+        with self._lock:
+            prompt = self._cache.get(series)
+            if prompt is not None and prompt[0] == key:
+                return prompt[1]
+
+        terms = []
+        if key[2] is not None:
+            terms.extend(read_glossary(os.path.join(self.folder, f'{series}.txt')))
+        terms.extend(mapping.values())
+        text = build_prompt(terms, self.max_chars)
+        with self._lock:
+            self._cache[series] = (key, text)
+        logger.info(f"已建立{'系列「' + series + '」的' if series else ''}詞彙提示：{text}")
+        return text
+
+
+def prompt_version(prompt):
+    """提示內容的短雜湊，作為轉錄快取鍵的一部分"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]